@@ -0,0 +1,158 @@
+import pandas as pd
+import os
+import sys
+import json
+import time
+import platform
+import subprocess
+import argparse
+
+CODE_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCH_DIR = os.path.join('data', 'benchmark')
+BASELINE_PATH = os.path.join('report', 'benchmark_baseline.json')
+RESULTS_PATH = os.path.join('report', 'benchmark_results.json')
+
+SCALES = {'1M': 1_000_000, '10M': 10_000_000, '36M': 36_000_000}
+STAGES = ['ingest', 'construct', 'metrics', 'usd_valuation', 'net_flow']
+TOLERANCE = 0.2  # A stage regresses when its wall time or peak RSS grows by more than this fraction.
+
+
+def stage_commands(stage, workers=None):
+    """The pipeline scripts (and arguments) a benchmark stage runs, in order."""
+    parallel = ['--workers', str(workers)] if workers else []
+    return {
+        'ingest': [['load.py', '--stream']],
+        'construct': [['construct.py', '--force'] + parallel],
+        'metrics': [['dailyMetrics.py', '--force'] + parallel],
+        'usd_valuation': [['fixTokensToUSD.py']],
+        'net_flow': [['flowIndex.py', 'build'] + parallel, ['flowIndex.py', 'top', '--k', '20']],
+    }[stage]
+
+def machine_info():
+    """What the numbers were measured on; results from different machines are not comparable."""
+    return {'platform': platform.platform(), 'processor': platform.processor() or platform.machine(),
+            'cpus': os.cpu_count(), 'python': platform.python_version()}
+
+def prepare_scale(scale, rows, bench_dir=BENCH_DIR, seed=0, regenerate=False):
+    """Working directory of one scale, with synthetic inputs generated once and reused while unchanged."""
+    work_dir = os.path.join(bench_dir, scale)
+    params_path = os.path.join(work_dir, 'data', 'synthetic_params.json')
+    if not regenerate and os.path.exists(params_path):
+        with open(params_path) as f:
+            params = json.load(f)
+        if params['rows'] == rows and params['seed'] == seed:
+            return work_dir
+    print(f"Generating {rows:,} synthetic transfers in {work_dir}...")
+    os.makedirs(work_dir, exist_ok=True)
+    # Generated in a child process: a child inherits the RSS high-water mark of the
+    # process it is forked from, so the benchmark process itself must stay small.
+    with open(os.path.join(work_dir, 'generate.log'), 'w') as log:
+        wall, _, _ = run_command(['synthetic.py', '--rows', str(rows), '--seed', str(seed), '--output-dir', '.'],
+                                 work_dir, log)
+    print(f"  -> done ({wall:.2f} seconds)")
+    return work_dir
+
+def run_command(command, work_dir, log):
+    """
+    Runs one pipeline script in work_dir as a child process. Returns its wall
+    time, CPU time and peak RSS in bytes, taken from os.wait4 so the peak
+    covers the script and the worker processes it waited for.
+    """
+    start_time = time.perf_counter()
+    process = subprocess.Popen([sys.executable, os.path.join(CODE_DIR, command[0])] + command[1:],
+                               cwd=work_dir, stdout=log, stderr=subprocess.STDOUT)
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    wall = time.perf_counter() - start_time
+    if process.returncode != 0:
+        raise RuntimeError(f"{' '.join(command)} failed with exit code {process.returncode}; see {log.name}")
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    rss = usage.ru_maxrss if sys.platform == 'darwin' else usage.ru_maxrss * 1024
+    return wall, usage.ru_utime + usage.ru_stime, rss
+
+def run_stage(stage, work_dir, workers=None):
+    """Runs every command of a stage; wall and CPU times add up, peak RSS is the largest of the commands."""
+    log_dir = os.path.join(work_dir, 'benchmark_logs')
+    os.makedirs(log_dir, exist_ok=True)
+    os.makedirs(os.path.join(work_dir, 'report'), exist_ok=True)
+    result = {'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'peak_rss_mb': 0.0}
+    with open(os.path.join(log_dir, f'{stage}.log'), 'w') as log:
+        for command in stage_commands(stage, workers):
+            wall, cpu, rss = run_command(command, work_dir, log)
+            result['wall_seconds'] += wall
+            result['cpu_seconds'] += cpu
+            result['peak_rss_mb'] = max(result['peak_rss_mb'], rss / 2**20)
+    return result
+
+def run_benchmarks(scales, stages=STAGES, bench_dir=BENCH_DIR, seed=0, regenerate=False, workers=None):
+    """Runs the stages in pipeline order at every scale; later stages read what earlier ones wrote."""
+    results = {'machine': machine_info(), 'created': pd.Timestamp.now().isoformat(timespec='seconds'),
+               'seed': seed, 'results': {}}
+    for scale in scales:
+        work_dir = prepare_scale(scale, SCALES[scale], bench_dir, seed, regenerate)
+        results['results'][scale] = {}
+        for stage in stages:
+            print(f"[{scale}] {stage}...", end=' ', flush=True)
+            result = run_stage(stage, work_dir, workers)
+            results['results'][scale][stage] = result
+            print(f"{result['wall_seconds']:.2f} s, {result['peak_rss_mb']:.0f} MB peak RSS")
+    return results
+
+def compare_to_baseline(results, baseline, tolerance=TOLERANCE):
+    """Per (scale, stage): current and baseline wall time and peak RSS, their ratios and a status."""
+    rows = []
+    for scale, stages in results['results'].items():
+        for stage, current in stages.items():
+            base = baseline['results'].get(scale, {}).get(stage)
+            row = {'scale': scale, 'stage': stage, 'wall_seconds': current['wall_seconds'],
+                   'peak_rss_mb': current['peak_rss_mb']}
+            if base is None:
+                row['status'] = 'no baseline'
+            else:
+                row['baseline_wall_seconds'] = base['wall_seconds']
+                row['baseline_peak_rss_mb'] = base['peak_rss_mb']
+                row['wall_ratio'] = current['wall_seconds'] / base['wall_seconds']
+                row['rss_ratio'] = current['peak_rss_mb'] / base['peak_rss_mb']
+                regressed = row['wall_ratio'] > 1 + tolerance or row['rss_ratio'] > 1 + tolerance
+                row['status'] = 'REGRESSION' if regressed else 'ok'
+            rows.append(row)
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic data at several scales.")
+    parser.add_argument('--scales', nargs='+', choices=list(SCALES), default=['1M'])
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES,
+                        help="Stages to run, in pipeline order; each reads the outputs of the ones before it.")
+    parser.add_argument('--workers', type=int, default=None, help="Workers for the parallel stages (default: all cores).")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--bench-dir', default=BENCH_DIR)
+    parser.add_argument('--regenerate', action='store_true', help="Regenerate the synthetic inputs.")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help="Store this run as the new baseline.")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    parser.add_argument('--output', default=RESULTS_PATH)
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.scales, args.stages, args.bench_dir, args.seed, args.regenerate, args.workers)
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults saved to {args.output}")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or '.', exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    elif not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; rerun with --save-baseline to store one.")
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['machine'] != results['machine']:
+            print("Warning: the baseline was measured on a different machine; ratios may not be meaningful.")
+        comparison = compare_to_baseline(results, baseline, args.tolerance)
+        print(comparison.to_string(index=False, float_format=lambda x: f"{x:.2f}"))
+        if (comparison['status'] == 'REGRESSION').any():
+            sys.exit(1)
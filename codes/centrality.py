@@ -0,0 +1,154 @@
+import pandas as pd
+import numpy as np
+import scipy.sparse as sp
+import os
+import time
+import argparse
+from tqdm import tqdm
+
+from dataset import load_address_table
+from graphStore import STORE_DIR, list_store_dates, load_manifest, load_graph
+from construct import run_tasks
+from prices import PRICE_FILES, load_candles, price_table, price_at
+
+CENTRALITY_PATH = os.path.join('data', 'processed', 'centrality_top.parquet')
+MEASURES = ['pagerank', 'in_degree', 'out_degree', 'in_strength_usd', 'out_strength_usd']
+TOP_N = 100
+PAGERANK_ALPHA = 0.85
+PAGERANK_TOL = 1e-6
+PAGERANK_MAX_ITER = 100
+
+
+def pagerank(matrix, alpha=PAGERANK_ALPHA, tol=PAGERANK_TOL, max_iter=PAGERANK_MAX_ITER):
+    """
+    PageRank by sparse power iteration on a (weighted) adjacency matrix,
+    rows being senders. Dangling nodes spread their rank uniformly and the
+    stopping rule is NetworkX's (L1 change < n * tol), so the result matches
+    nx.pagerank on the same graph.
+    """
+    n = matrix.shape[0]
+    if n == 0:
+        return np.zeros(0)
+    out_weight = np.asarray(matrix.sum(axis=1)).ravel()
+    dangling = out_weight == 0
+    inverse_out = np.divide(1.0, out_weight, out=np.zeros(n), where=~dangling)
+    transposed = matrix.T.tocsr()
+
+    x = np.full(n, 1.0 / n)
+    for _ in range(max_iter):
+        x_last = x
+        x = alpha * (transposed @ (x_last * inverse_out))
+        x += (alpha * x_last[dangling].sum() + 1 - alpha) / n
+        if np.abs(x - x_last).sum() < n * tol:
+            return x
+    raise RuntimeError(f"PageRank did not converge in {max_iter} iterations")
+
+def usd_matrix(graph, token_prices):
+    """Sum of the day's per-token value matrices, each valued at its USD price."""
+    n = len(graph['nodes'])
+    total = sp.csr_matrix((n, n))
+    for token, matrix in graph['tokens'].items():
+        total = total + matrix * token_prices.get(token, 1.0)
+    return total.tocsr()
+
+def node_centrality(graph, token_prices):
+    """
+    Per-node centrality arrays of one sparse daily graph: in/out degree
+    (distinct neighbours), in/out strength in USD, and unweighted PageRank.
+    """
+    combined = graph['combined']
+    usd = usd_matrix(graph, token_prices)
+    binary = combined.copy()
+    binary.data[:] = 1.0
+    return {
+        'pagerank': pagerank(binary),
+        'in_degree': combined.getnnz(axis=0).astype(np.float64),
+        'out_degree': combined.getnnz(axis=1).astype(np.float64),
+        'in_strength_usd': np.asarray(usd.sum(axis=0)).ravel(),
+        'out_strength_usd': np.asarray(usd.sum(axis=1)).ravel(),
+    }
+
+def top_n(scores, n):
+    """Positions of the n largest scores, largest first (partial selection, then a small sort)."""
+    n = min(n, len(scores))
+    if n == 0:
+        return np.array([], dtype=np.int64)
+    top = np.argpartition(-scores, n - 1)[:n]
+    return top[np.lexsort((top, -scores[top]))]
+
+def day_centrality(date_str, store_dir, token_prices, n=TOP_N):
+    """
+    Worker task: computes every measure for one stored day and keeps the
+    top-n nodes of each. Returns a long DataFrame (date, measure, rank, address, score).
+    """
+    graph = load_graph(date_str, store_dir=store_dir)
+    scores = node_centrality(graph, token_prices)
+    parts = []
+    for measure in MEASURES:
+        top = top_n(scores[measure], n)
+        parts.append(pd.DataFrame({
+            'date': pd.Timestamp(date_str),
+            'measure': measure,
+            'rank': np.arange(1, len(top) + 1, dtype=np.int32),
+            'address': graph['nodes'][top],
+            'score': scores[measure][top],
+        }))
+    return pd.concat(parts, ignore_index=True)
+
+def compute_centrality(store_dir=STORE_DIR, n=TOP_N, workers=None, prices=None):
+    """Runs day_centrality for every day in the graph store in parallel and concatenates the results."""
+    tokens = load_manifest(store_dir)['tokens']
+    if prices is None:
+        prices = price_table(load_candles(PRICE_FILES), 'D')
+    dates = list_store_dates(store_dir)
+    tasks = [(date_str, store_dir, {token: price_at(prices, date_str, token) for token in tokens}, n)
+             for date_str in dates]
+    results = run_tasks(day_centrality, tasks, workers or os.cpu_count())
+    parts = list(tqdm(results, total=len(tasks), desc="Computing daily centrality"))
+    if not parts:
+        return pd.DataFrame(columns=['date', 'measure', 'rank', 'address', 'score'])
+    table = pd.concat(parts, ignore_index=True)
+    table['measure'] = table['measure'].astype('category')
+    return table
+
+def rank_hubs(table, measure='pagerank', k=20, start_date=None, end_date=None):
+    """
+    Ranks hubs across a period from the stored daily top-N lists: days spent
+    in the top-N, best and mean daily rank, and summed score.
+    """
+    rows = table[table['measure'] == measure]
+    if start_date is not None:
+        rows = rows[rows['date'] >= pd.Timestamp(start_date)]
+    if end_date is not None:
+        rows = rows[rows['date'] <= pd.Timestamp(end_date)]
+    hubs = rows.groupby('address').agg(days_in_top=('rank', 'size'), best_rank=('rank', 'min'),
+                                       mean_rank=('rank', 'mean'), total_score=('score', 'sum'))
+    return hubs.sort_values(['days_in_top', 'total_score'], ascending=False).head(k)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Daily centrality of every stored graph, and hub rankings.")
+    parser.add_argument('--top-n', type=int, default=TOP_N, help="Nodes kept per day and measure.")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--rank', choices=MEASURES, default=None,
+                        help="Only rank hubs from the stored results by this measure.")
+    parser.add_argument('--k', type=int, default=20, help="Hubs to show when ranking.")
+    parser.add_argument('--start', default=None)
+    parser.add_argument('--end', default=None)
+    args = parser.parse_args()
+
+    if args.rank is None:
+        start_time = time.time()
+        table = compute_centrality(n=args.top_n, workers=args.workers)
+        os.makedirs(os.path.dirname(CENTRALITY_PATH), exist_ok=True)
+        table.to_parquet(CENTRALITY_PATH, index=False)
+        print(f"Top-{args.top_n} centrality of {table['date'].nunique()} days saved to {CENTRALITY_PATH} "
+              f"({time.time() - start_time:.2f} seconds)")
+        args.rank = 'pagerank'
+    else:
+        table = pd.read_parquet(CENTRALITY_PATH)
+
+    hubs = rank_hubs(table, args.rank, args.k, args.start, args.end)
+    hubs.index = load_address_table()[hubs.index.to_numpy()]
+    print(f"\nTop {len(hubs)} hubs by {args.rank}:")
+    print(hubs.to_string())
@@ -0,0 +1,113 @@
+import pandas as pd
+import numpy as np
+import os
+import time
+import argparse
+from tqdm import tqdm
+
+from graphStore import STORE_DIR, list_store_dates, load_manifest, load_edges
+from construct import run_tasks
+from prices import PRICE_FILES, load_candles, price_table, price_at
+
+CHURN_CSV = os.path.join('report', 'edge_churn.csv')
+WEIGHTS = ['transfers', 'usd']
+REWEIGHT_FACTOR = 2.0  # A persisting edge is reweighted when its weight grows or shrinks by this factor.
+
+
+def day_pairs(edges, token_names, token_prices):
+    """
+    Collapses a day's (src, dst, token) edge rows into sorted unique
+    (src << 32 | dst) keys with their transfer count and USD value, plus the
+    sorted ids of the day's active nodes.
+    """
+    src, dst = edges['src'], edges['dst']
+    keys = src.astype(np.int64) << 32 | dst.astype(np.int64)
+    if len(keys) == 0:
+        return {'keys': keys, 'transfers': edges['transfers'], 'usd': edges['value'], 'nodes': keys}
+    prices = np.array([token_prices.get(token, 1.0) for token in token_names])
+    usd = edges['value'] * prices[edges['token']]
+    # Edge rows are sorted by (src, dst, token), so the keys are sorted and each pair is a run.
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    return {
+        'keys': keys[starts],
+        'transfers': np.add.reduceat(edges['transfers'], starts),
+        'usd': np.add.reduceat(usd, starts),
+        'nodes': np.unique(np.concatenate([src, dst])),
+    }
+
+def diff_pairs(previous, current, weight='transfers', factor=REWEIGHT_FACTOR):
+    """
+    Churn between two days of pairs from day_pairs: edges that are new,
+    vanished, persisting and reweighted (weight changed by at least `factor`
+    either way), the USD carried by new and vanished edges, edge Jaccard
+    similarity, and nodes that entered or left the network. Both key arrays
+    are sorted, so the set operations are one searchsorted merge.
+    """
+    pos = np.searchsorted(previous['keys'], current['keys'])
+    persisting = pos < len(previous['keys'])
+    persisting[persisting] = previous['keys'][pos[persisting]] == current['keys'][persisting]
+    kept = np.zeros(len(previous['keys']), dtype=bool)
+    kept[pos[persisting]] = True
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = current[weight][persisting] / previous[weight][pos[persisting]]
+    reweighted = (ratio >= factor) | (ratio <= 1 / factor)
+    n_persisting = int(np.count_nonzero(persisting))
+    union = len(previous['keys']) + len(current['keys']) - n_persisting
+
+    node_kept = np.isin(current['nodes'], previous['nodes'], assume_unique=True)
+    return {
+        'nodes': len(current['nodes']),
+        'entered_nodes': int(np.count_nonzero(~node_kept)),
+        'exited_nodes': len(previous['nodes']) - int(np.count_nonzero(node_kept)),
+        'edges': len(current['keys']),
+        'new_edges': len(current['keys']) - n_persisting,
+        'vanished_edges': len(previous['keys']) - n_persisting,
+        'persisting_edges': n_persisting,
+        'reweighted_edges': int(np.count_nonzero(reweighted)),
+        'edge_jaccard': n_persisting / union if union else 0.0,
+        'new_edge_usd': float(current['usd'][~persisting].sum()),
+        'vanished_edge_usd': float(previous['usd'][~kept].sum()),
+    }
+
+def day_churn(previous_date, date_str, store_dir, token_names, previous_prices, token_prices,
+              weight='transfers', factor=REWEIGHT_FACTOR):
+    """Worker task: churn of one stored day against the previous stored day. Returns (date, churn dict)."""
+    previous = day_pairs(load_edges(previous_date, store_dir=store_dir), token_names, previous_prices)
+    current = day_pairs(load_edges(date_str, store_dir=store_dir), token_names, token_prices)
+    churn = diff_pairs(previous, current, weight, factor)
+    churn['previous_date'] = previous_date
+    return date_str, churn
+
+def compute_churn(store_dir=STORE_DIR, weight='transfers', factor=REWEIGHT_FACTOR, workers=None, prices=None):
+    """Diffs every stored day against the one before it in parallel; returns the churn time series."""
+    tokens = load_manifest(store_dir)['tokens']
+    if prices is None:
+        prices = price_table(load_candles(PRICE_FILES), 'D')
+    dates = list_store_dates(store_dir)
+    day_prices = {date_str: {token: price_at(prices, date_str, token) for token in tokens} for date_str in dates}
+    tasks = [(previous_date, date_str, store_dir, tokens, day_prices[previous_date], day_prices[date_str],
+              weight, factor) for previous_date, date_str in zip(dates[:-1], dates[1:])]
+    rows, churn_dates = [], []
+    for date_str, churn in tqdm(run_tasks(day_churn, tasks, workers or os.cpu_count()),
+                                total=len(tasks), desc="Diffing consecutive days"):
+        rows.append(churn)
+        churn_dates.append(pd.Timestamp(date_str))
+    return pd.DataFrame(rows, index=pd.DatetimeIndex(churn_dates))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Day-over-day edge and node churn of the stored daily graphs.")
+    parser.add_argument('--weight', choices=WEIGHTS, default='transfers',
+                        help="Edge weight used to detect reweighted edges.")
+    parser.add_argument('--factor', type=float, default=REWEIGHT_FACTOR,
+                        help="Minimum change factor of a reweighted edge (either direction).")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--output', default=CHURN_CSV)
+    args = parser.parse_args()
+
+    start_time = time.time()
+    churn_df = compute_churn(weight=args.weight, factor=args.factor, workers=args.workers)
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    churn_df.to_csv(args.output)
+    print(f"Saved churn of {len(churn_df)} days to {args.output} ({time.time() - start_time:.2f} seconds)")
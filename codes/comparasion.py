@@ -1,72 +1,67 @@
 import pandas as pd
-import networkx as nx
 import os
 import matplotlib.pyplot as plt
-import numpy as np
 import time
+import argparse
+
+from dataset import lookup_address_ids, decode_addresses
+from graphStore import STORE_DIR, load_graph
+from sparseGraph import degree_arrays
+from degreeDistribution import log_binned_density
+from flowIndex import load_flow_index, net_flow, top_hubs, batch_net_flow
+from profiling import add_profile_argument, enable_run_log, stage
 
 DATA_DIR = 'data'
-GRAPH_DIR = os.path.join(DATA_DIR, 'processed', 'daily_graphs')
+GRAPH_DIR = STORE_DIR
 OUTPUT_DIR = os.path.join('report', 'figures', 'deep_dive_corrected')
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
 DATE_NORMAL = '2022-05-04'
 DATE_PANIC = '2022-05-09'
+CRISIS_START = '2022-05-01'
+CRISIS_END = '2022-05-20'
+HUB_TOKENS = ['WLUNA', 'USTC', 'USDC', 'USDT']
+TOP_HUBS = 20
 
-MASTER_DF = pd.read_parquet(os.path.join(DATA_DIR, 'master_transfers.parquet'))
-MASTER_DF['date'] = pd.to_datetime(MASTER_DF['time_stamp']).dt.date
-
-PRICE_DF_WLUNA = pd.read_csv(os.path.join(DATA_DIR, 'price_data', 'wluna_price_data.csv'))
-PRICE_DF_WLUNA['date'] = pd.to_datetime(PRICE_DF_WLUNA['timestamp'], unit='s').dt.date
 
-
-def analyze_hub_net_flow_corrected(hub_address, date_str):
+def analyze_hub_net_flow_corrected(hub_address, date_str, index):
     """
-    Calculates the USD net flow for a hub on a specific day by
-    querying the master dataframe directly and applying price correction for WLUNA.
+    Calculates the USD net flow for a hub on a specific day from the
+    per-address flow index, with every token valued at that day's price.
     """
     print(f"  -> Analyzing net flow for {hub_address[:10]}... on {date_str}")
     
-    target_date = pd.to_datetime(date_str).date()
-    day_df = MASTER_DF[MASTER_DF['date'] == target_date]
-    
-    try:
-        day_price_wluna = PRICE_DF_WLUNA[PRICE_DF_WLUNA['date'] == target_date]['close'].iloc[0]
-    except IndexError:
-        print(f"    Warning: No price found for WLUNA on {date_str}. Using 0.")
-        day_price_wluna = 0
+    hub_id = lookup_address_ids([hub_address])[0]
+    day_flow = net_flow(index, hub_id, date_str, date_str, tokens=HUB_TOKENS)
+    day_flow = day_flow.reindex(columns=HUB_TOKENS, fill_value=0)
+    return day_flow.iloc[0].to_dict() if len(day_flow) else dict.fromkeys(HUB_TOKENS, 0)
 
-    net_flow = {'WLUNA': 0, 'USTC': 0, 'USDC': 0, 'USDT': 0}
-    
-    in_df = day_df[day_df['to_address'] == hub_address]
-    out_df = day_df[day_df['from_address'] == hub_address]
-    
-    for token in net_flow:
-        in_value = in_df[in_df['token_name'] == token]['value'].sum()
-        out_value = out_df[out_df['token_name'] == token]['value'].sum()
-        
-        if token == 'WLUNA':
-            in_value *= day_price_wluna
-            out_value *= day_price_wluna
-        
-        net_flow[token] = in_value - out_value
-        
-    return net_flow
-
-def plot_degree_distribution(G, date_str, ax):
-    """Plots the log-log degree distribution."""
-    degrees = [d for n, d in G.degree() if d > 0]
-    if not degrees: return
-    
-    max_deg = max(degrees)
-    if max_deg < 2: return
-    bins = np.logspace(np.log10(1), np.log10(max_deg), 30)
-    
-    hist, bin_edges = np.histogram(degrees, bins=bins, density=True)
-    bin_centers = (bin_edges[:-1] + bin_edges[1:]) / 2
+def plot_top_hub_net_flows(index, k, start_date, end_date, filename):
+    """Plots the daily USD net flow of the k largest hubs (by USD volume) over a date range."""
+    hubs, _ = top_hubs(index, k, start_date, end_date)
+    flows = batch_net_flow(index, hubs, start_date, end_date)
+    flows.columns = [f"{address[:10]}..." for address in decode_addresses(hubs)]
+
+    fig, ax = plt.subplots(figsize=(15, 8))
+    flows.plot(ax=ax, linewidth=1, legend=False)
+    ax.axhline(0, color='black', linewidth=0.8)
+    ax.set_title(f'Daily Net Flow of the Top {len(hubs)} Hubs ({start_date} to {end_date})', fontsize=16)
+    ax.set_ylabel('Net Volume (USD, positive = net in-flow)')
+    ax.get_yaxis().set_major_formatter(plt.FuncFormatter(lambda x, p: format(int(x), ',')))
+    ax.legend(loc='center left', bbox_to_anchor=(1.0, 0.5), fontsize=8)
+    plt.tight_layout()
+    plt.savefig(filename, dpi=300)
+    print(f"Saved plot: {filename}")
+    plt.close(fig)
+    return flows
+
+def plot_degree_distribution(graph, date_str, ax):
+    """Plots the log-log degree distribution of a sparse daily graph."""
+    in_degree, out_degree = degree_arrays(graph)
+    bin_centers, density = log_binned_density(in_degree + out_degree)
+    if len(density) == 0: return
     
-    non_zero = hist > 0
-    ax.loglog(bin_centers[non_zero], hist[non_zero], 'o', alpha=0.7, label=f'Degree Dist ({date_str})')
+    ax.loglog(bin_centers, density, 'o', alpha=0.7, label=f'Degree Dist ({date_str})')
     ax.set_xlabel("Degree (k)")
     ax.set_ylabel("Probability Density P(k)")
     ax.set_title("Degree Distribution Comparison")
@@ -78,19 +73,22 @@ def plot_degree_distribution(G, date_str, ax):
 def main():
     print("===== Final Deep Dive Comparison (Corrected) =====")
     
-    G_normal_path = os.path.join(GRAPH_DIR, f"graph_{DATE_NORMAL}.gexf")
-    G_panic_path = os.path.join(GRAPH_DIR, f"graph_{DATE_PANIC}.gexf")
-    
     print(f"Loading NORMAL day graph for structural analysis: {DATE_NORMAL}")
-    G_normal = nx.read_gexf(G_normal_path)
+    with stage('load_graph', date=DATE_NORMAL):
+        G_normal = load_graph(DATE_NORMAL, store_dir=GRAPH_DIR)
     print(f"Loading PANIC day graph for structural analysis: {DATE_PANIC}")
-    G_panic = nx.read_gexf(G_panic_path)
+    with stage('load_graph', date=DATE_PANIC):
+        G_panic = load_graph(DATE_PANIC, store_dir=GRAPH_DIR)
     
     hub_to_analyze = '0x56178a0d5f301baf6cf3e1cd53d9863437345bf9' # Binance 8 Wallet
     print(f"\n>>> Analyzing Net Flow for Key CEX Wallet: {hub_to_analyze}")
 
-    flow_normal = analyze_hub_net_flow_corrected(hub_to_analyze, DATE_NORMAL)
-    flow_panic = analyze_hub_net_flow_corrected(hub_to_analyze, DATE_PANIC)
+    with stage('load_flow_index') as record:
+        index = load_flow_index()
+        record['rows_out'] = len(index['address'])
+    with stage('hub_net_flow'):
+        flow_normal = analyze_hub_net_flow_corrected(hub_to_analyze, DATE_NORMAL, index)
+        flow_panic = analyze_hub_net_flow_corrected(hub_to_analyze, DATE_PANIC, index)
 
     df_flow = pd.DataFrame([flow_normal, flow_panic], index=[DATE_NORMAL, DATE_PANIC])
     print("\nNet Flow Table (Positive = Net In-flow)")
@@ -108,10 +106,16 @@ def main():
     print(f"\nSaved plot: {plot_path}")
     plt.close(fig)
 
+    print(f"\n>>> Net Flow of the Top {TOP_HUBS} Hubs through the Crisis")
+    with stage('top_hub_net_flows', k=TOP_HUBS):
+        plot_top_hub_net_flows(index, TOP_HUBS, CRISIS_START, CRISIS_END,
+                               os.path.join(OUTPUT_DIR, 'top_hubs_net_flow.png'))
+
     print("\n--- Comparing Degree Distributions ---")
     fig, ax = plt.subplots(figsize=(10, 7))
-    plot_degree_distribution(G_normal, DATE_NORMAL, ax)
-    plot_degree_distribution(G_panic, DATE_PANIC, ax)
+    with stage('degree_distributions'):
+        plot_degree_distribution(G_normal, DATE_NORMAL, ax)
+        plot_degree_distribution(G_panic, DATE_PANIC, ax)
     plot_path = os.path.join(OUTPUT_DIR, 'degree_distribution_comparison_corrected.png')
     plt.savefig(plot_path, dpi=300)
     print(f"Saved plot: {plot_path}")
@@ -120,4 +124,9 @@ def main():
     print("\n===== Project Analysis Complete! =====")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Compare a normal day with a crisis day: hub flows and degree distributions.")
+    add_profile_argument(parser)
+    if parser.parse_args().profile:
+        enable_run_log()
+    with stage('comparison'):
+        main()
\ No newline at end of file
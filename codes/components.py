@@ -0,0 +1,118 @@
+import pandas as pd
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse import csgraph
+import argparse
+
+from dataset import load_address_table
+from graphStore import load_graph
+
+BOW_TIE_PARTS = ['in', 'scc', 'out', 'tubes', 'in_tendrils', 'out_tendrils', 'other', 'disconnected']
+
+
+def reachable_from(matrix, sources):
+    """
+    Boolean mask of the nodes reachable from any of the sources (sources
+    included), by one breadth-first search from a virtual super-source
+    linked to all of them.
+    """
+    n = matrix.shape[0]
+    mask = np.zeros(n, dtype=bool)
+    if len(sources) == 0:
+        return mask
+    link = sp.csr_matrix((np.ones(len(sources)), (np.zeros(len(sources), dtype=np.int64), sources)), shape=(1, n))
+    extended = sp.vstack([sp.hstack([matrix, sp.csr_matrix((n, 1))]), sp.hstack([link, sp.csr_matrix((1, 1))])]).tocsr()
+    order = csgraph.breadth_first_order(extended, n, directed=True, return_predecessors=False)
+    mask[order[order < n]] = True
+    return mask
+
+def bow_tie(matrix, strong=None, weak=None):
+    """
+    Bow-tie decomposition of a directed graph around its largest strongly
+    connected component. Returns an int8 array with the position in
+    BOW_TIE_PARTS of every node:
+    IN reaches the core SCC, OUT is reached from it; tubes go from IN to OUT
+    and tendrils hang off IN or OUT without touching the core; 'other' is
+    the rest of the core's weak component, and 'disconnected' lies outside it.
+    Component labels computed by the caller can be passed in as strong/weak.
+    """
+    n = matrix.shape[0]
+    parts = np.full(n, BOW_TIE_PARTS.index('disconnected'), dtype=np.int8)
+    if n == 0:
+        return parts
+    matrix = (matrix != 0).astype(np.int8).tocsr()
+
+    if strong is None:
+        _, strong = csgraph.connected_components(matrix, directed=True, connection='strong')
+    if weak is None:
+        _, weak = csgraph.connected_components(matrix, directed=True, connection='weak')
+    core = np.flatnonzero(strong == np.argmax(np.bincount(strong)))
+    in_core_wcc = weak == weak[core[0]]
+
+    # Everything reachable from one core node is reachable from the whole core.
+    out_mask = reachable_from(matrix, core[:1])
+    in_mask = reachable_from(matrix.T.tocsr(), core[:1])
+    scc_mask = out_mask & in_mask
+    out_mask &= ~scc_mask
+    in_mask &= ~scc_mask
+
+    # Tendrils and tubes: reachability that avoids the core.
+    keep = sp.diags((~scc_mask).astype(np.int8))
+    outside = (keep @ matrix @ keep).tocsr()
+    from_in = reachable_from(outside, np.flatnonzero(in_mask)) & ~in_mask
+    to_out = reachable_from(outside.T.tocsr(), np.flatnonzero(out_mask)) & ~out_mask
+
+    rest = in_core_wcc & ~(scc_mask | in_mask | out_mask)
+    parts[rest] = BOW_TIE_PARTS.index('other')
+    parts[rest & from_in & ~to_out] = BOW_TIE_PARTS.index('in_tendrils')
+    parts[rest & to_out & ~from_in] = BOW_TIE_PARTS.index('out_tendrils')
+    parts[rest & from_in & to_out] = BOW_TIE_PARTS.index('tubes')
+    parts[in_mask] = BOW_TIE_PARTS.index('in')
+    parts[out_mask] = BOW_TIE_PARTS.index('out')
+    parts[scc_mask] = BOW_TIE_PARTS.index('scc')
+    return parts
+
+def component_stats(matrix):
+    """
+    Per-day component statistics of a directed adjacency matrix: weakly and
+    strongly connected component counts and largest sizes, and the size of
+    every bow-tie part.
+    """
+    n = matrix.shape[0]
+    stats = {'wcc_count': 0, 'wcc_largest': 0, 'wcc_largest_frac': 0.0,
+             'scc_count': 0, 'scc_nontrivial': 0, 'scc_largest': 0, 'scc_largest_frac': 0.0}
+    stats.update({f'bowtie_{part}': 0 for part in BOW_TIE_PARTS})
+    if n == 0:
+        return stats
+
+    wcc_count, weak = csgraph.connected_components(matrix, directed=True, connection='weak')
+    scc_count, strong = csgraph.connected_components(matrix, directed=True, connection='strong')
+    wcc_sizes, scc_sizes = np.bincount(weak), np.bincount(strong)
+    stats.update({
+        'wcc_count': int(wcc_count),
+        'wcc_largest': int(wcc_sizes.max()),
+        'wcc_largest_frac': float(wcc_sizes.max() / n),
+        'scc_count': int(scc_count),
+        'scc_nontrivial': int(np.count_nonzero(scc_sizes > 1)),
+        'scc_largest': int(scc_sizes.max()),
+        'scc_largest_frac': float(scc_sizes.max() / n),
+    })
+    part_sizes = np.bincount(bow_tie(matrix, strong, weak), minlength=len(BOW_TIE_PARTS))
+    stats.update({f'bowtie_{part}': int(size) for part, size in zip(BOW_TIE_PARTS, part_sizes)})
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Component and bow-tie structure of a stored daily graph.")
+    parser.add_argument('date', help="Date (YYYY-MM-DD) to analyze.")
+    parser.add_argument('--output', default=None, help="Write every node's bow-tie part to this CSV file.")
+    args = parser.parse_args()
+
+    graph = load_graph(args.date)
+    for name, value in component_stats(graph['combined']).items():
+        print(f"{name:>22}: {value:,}" if isinstance(value, int) else f"{name:>22}: {value:.4f}")
+    if args.output:
+        parts = bow_tie(graph['combined'])
+        pd.DataFrame({'address': load_address_table()[graph['nodes']],
+                      'part': np.array(BOW_TIE_PARTS)[parts]}).to_csv(args.output, index=False)
+        print(f"Saved bow-tie membership to {args.output}")
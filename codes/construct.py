@@ -1,43 +1,123 @@
-import pandas as pd
+import numpy as np
 import networkx as nx
 import os
 import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 from tqdm import tqdm
 
+from dataset import (is_partitioned, list_dates, read_transfers, to_datetime,
+                     date_partition_files, stat_signature, content_hash, frame_hash)
+from sparseGraph import build_daily_graph, to_networkx
+from graphStore import STORE_VERSION, load_manifest, save_manifest, token_code, write_day
+from load import TOKEN_NAMES
+from profiling import add_profile_argument, enable_run_log, stage
+
 DATA_DIR = 'data'
 OUTPUT_DIR = os.path.join(DATA_DIR, 'processed', 'daily_graphs')
 INPUT_FILENAME = 'master_transfers.parquet'
+GRAPH_COLUMNS = ['from_id', 'to_id', 'token_name', 'value']
+GRAPH_BUILDER_VERSION = 1  # Bump whenever the way a day's edge table is built changes.
 
 
 def create_rich_graph(df_slice):
     """
     Builds a single rich, weighted, directed graph from a DataFrame slice.
-    Edge attributes are dictionaries of token-value pairs.
+    Nodes are integer address ids; edge attributes are dictionaries of token-value pairs.
     Example edge data: { 'USDT': 500.0, 'WLUNA': 10000.0 }
+    The aggregation runs on sparse matrices (see sparseGraph.build_daily_graph);
+    only the final conversion to NetworkX touches individual edges.
     """
     if df_slice.empty:
         return nx.DiGraph()
 
-    edge_list = df_slice.groupby(['from_address', 'to_address', 'token_name'])['value'].sum().reset_index()
-    
-    G = nx.DiGraph()
-    
-    for _, row in edge_list.iterrows():
-        source = row['from_address']
-        target = row['to_address']
-        token = row['token_name']
-        weight = row['value']
-        
-        if G.has_edge(source, target):
-            G[source][target][token] = G[source][target].get(token, 0) + weight
+    return to_networkx(build_daily_graph(df_slice))
+
+def store_day(date_str, daily_df, token_names, output_dir=OUTPUT_DIR):
+    """
+    Builds and writes one day's edge table. Errors are caught so one bad day
+    cannot stop the others. Returns (date_str, manifest entry, error message).
+    """
+    try:
+        manifest = {'tokens': list(token_names), 'days': {}}
+        with stage('build_day', rows_in=len(daily_df), date=date_str) as record:
+            entry = write_day(daily_df, date_str, manifest, output_dir)
+            record['rows_out'] = entry['edges']
+        if manifest['tokens'] != list(token_names):
+            raise ValueError(f"unexpected tokens {manifest['tokens'][len(token_names):]}")
+        return date_str, entry, None
+    except Exception as e:
+        return date_str, None, f"{type(e).__name__}: {e}"
+
+def build_day_from_partitions(date_str, input_path, token_names, output_dir=OUTPUT_DIR):
+    """Worker task: reads only one day's partitions of the master data and stores its graph."""
+    try:
+        with stage('read_day', date=date_str) as record:
+            daily_df = read_transfers(date_str, date_str, columns=GRAPH_COLUMNS, path=input_path)
+            record['rows_out'] = len(daily_df)
+    except Exception as e:
+        return date_str, None, f"{type(e).__name__}: {e}"
+    return store_day(date_str, daily_df, token_names, output_dir)
+
+def split_by_day(df, columns=GRAPH_COLUMNS):
+    """
+    Splits a (legacy, unpartitioned) transfer frame into per-day slices of the
+    given columns in a single pass: one stable sort on the day key, then
+    contiguous cuts.
+    """
+    days = to_datetime(df['time_stamp']).to_numpy().astype('datetime64[D]')
+    order = np.argsort(days, kind='stable')
+    sorted_days = days[order]
+    boundaries = np.flatnonzero(sorted_days[1:] != sorted_days[:-1]) + 1
+    for chunk in np.split(order, boundaries):
+        if len(chunk) == 0:
+            continue
+        yield str(days[chunk[0]]), df.iloc[chunk][columns]
+
+def builder_version(token_names):
+    """Identifies the code and configuration a stored graph was built with."""
+    return f"{GRAPH_BUILDER_VERSION}/{STORE_VERSION}/{','.join(token_names)}"
+
+def partition_hashes(dates, input_path, manifest):
+    """
+    Returns {date: (content hash, stat signature)} of each date partition.
+    File contents are only re-hashed when the cheap stat signature changed.
+    """
+    hashes = {}
+    for date_str in dates:
+        files = date_partition_files(date_str, input_path)
+        stat = stat_signature(files)
+        entry = manifest['days'].get(date_str) or {}
+        if entry.get('input_stat') == stat and 'input_hash' in entry:
+            hashes[date_str] = (entry['input_hash'], stat)
         else:
-            G.add_edge(source, target, **{token: weight})
-            
-    return G
+            hashes[date_str] = (content_hash(files), stat)
+    return hashes
 
-def main():
+def is_fresh(entry, input_hash, version, output_dir=OUTPUT_DIR):
+    """True if a stored day was built from the same input with the same builder version."""
+    return (entry is not None and entry.get('input_hash') == input_hash
+            and entry.get('builder') == version
+            and os.path.exists(os.path.join(output_dir, entry['file'])))
+
+def run_tasks(function, args_list, workers):
+    """
+    Runs the day tasks on a process pool (or inline with one worker) and yields
+    the results in date order, so progress is reported in order.
     """
-    Main execution function to loop through days and generate a graph for each.
+    if workers <= 1:
+        for args in args_list:
+            yield function(*args)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(function, *zip(*args_list), chunksize=1)
+
+def main(workers=None, force=False):
+    """
+    Main execution function: splits the master data by day and builds each
+    day's graph on a pool of worker processes, each writing its own output file.
+    Days whose input and builder version are unchanged since the last run are
+    skipped unless force is set.
     """
     start_time = time.time()
     print("===== Phase 2 (Dynamic): High-Frequency Network Construction =====")
@@ -48,44 +128,78 @@ def main():
         print("Please run '01_data_preprocessing.py' first.")
         return
         
-    print(f"Loading master data from {input_path}...")
-    df = pd.read_parquet(input_path)
-    
-    df['time_stamp'] = pd.to_datetime(df['time_stamp'])
-    df.set_index('time_stamp', inplace=True)
-    
+    workers = workers or os.cpu_count()
     os.makedirs(OUTPUT_DIR, exist_ok=True)
-    print(f"Daily graphs will be saved to: {OUTPUT_DIR}")
+    print(f"Daily graphs will be saved to: {OUTPUT_DIR} (using {workers} worker processes)")
 
-    start_date = df.index.min().date()
-    end_date = df.index.max().date()
-    date_range = pd.date_range(start=start_date, end=end_date, freq='D')
-    
-    print(f"Generating daily graphs from {start_date} to {end_date}...")
+    manifest = load_manifest(OUTPUT_DIR)
+    for token in TOKEN_NAMES:
+        token_code(manifest, token)
+    token_names = list(manifest['tokens'])
+    version = builder_version(token_names)
 
-    for current_date in tqdm(date_range, desc="Processing Days"):
-        date_str = current_date.strftime('%Y-%m-%d')
-        
-        daily_df = df.loc[date_str]
-        
-        if daily_df.empty:
-            continue
-            
-        G_daily = create_rich_graph(daily_df)
-        
-        output_filename = f"graph_{date_str}.gexf"
-        output_path = os.path.join(OUTPUT_DIR, output_filename)
-        
-        try:
-            nx.write_gexf(G_daily, output_path)
-        except Exception as e:
-            print(f"\nError saving graph for {date_str}: {e}")
+    if is_partitioned(input_path):
+        dates = list_dates(input_path)
+        print(f"Checking input partitions from {dates[0]} to {dates[-1]}...")
+        with stage('partition_hashes', rows_in=len(dates)):
+            hashes = partition_hashes(dates, input_path, manifest)
+        tasks = [(date_str, input_path, token_names, OUTPUT_DIR) for date_str in dates
+                 if force or not is_fresh(manifest['days'].get(date_str), hashes[date_str][0], version)]
+        task_function = build_day_from_partitions
+    else:
+        print(f"Loading master data from {input_path} and splitting it by day...")
+        with stage('read_master') as record:
+            df = read_transfers(columns=GRAPH_COLUMNS + ['time_stamp'], path=input_path)
+            record['rows_out'] = len(df)
+        dates, hashes, tasks = [], {}, []
+        for date_str, daily_df in split_by_day(df):
+            dates.append(date_str)
+            hashes[date_str] = (frame_hash(daily_df), None)
+            if force or not is_fresh(manifest['days'].get(date_str), hashes[date_str][0], version):
+                tasks.append((date_str, daily_df, token_names, OUTPUT_DIR))
+        del df
+        task_function = store_day
+
+    for date_str in set(manifest['days']) - set(dates):
+        stale_path = os.path.join(OUTPUT_DIR, manifest['days'].pop(date_str)['file'])
+        if os.path.exists(stale_path):
+            os.remove(stale_path)
+
+    print(f"{len(dates) - len(tasks)} of {len(dates)} days are up to date; building {len(tasks)}.")
+    results = run_tasks(task_function, tasks, workers)
+
+    failed = []
+    with stage('build_days', rows_in=len(tasks), workers=workers):
+        for date_str, entry, error in tqdm(results, total=len(tasks), desc="Processing Days"):
+            if error is None:
+                entry['input_hash'], entry['input_stat'] = hashes[date_str]
+                entry['builder'] = version
+                manifest['days'][date_str] = entry
+            else:
+                manifest['days'].pop(date_str, None)
+                failed.append(date_str)
+                tqdm.write(f"Error building graph for {date_str}: {error}")
+
+    save_manifest(manifest, OUTPUT_DIR)
 
     end_time = time.time()
     print("\n===== Dynamic Network Construction Complete! =====")
-    print(f"All daily graphs have been built and saved.")
+    if failed:
+        print(f"{len(failed)} day(s) failed and were left out of the manifest: {', '.join(failed)}")
+    else:
+        print(f"All daily graphs have been built and saved.")
     print(f"Total execution time: {time.strftime('%H:%M:%S', time.gmtime(end_time - start_time))}")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Build the daily transaction graphs.")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Worker processes for the day builds (default: all cores).")
+    parser.add_argument('--force', action='store_true',
+                        help="Rebuild every day, even if its input is unchanged.")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    if args.profile:
+        enable_run_log()
+    with stage('construct', force=args.force):
+        main(workers=args.workers, force=args.force)
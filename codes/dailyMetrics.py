@@ -0,0 +1,208 @@
+import pandas as pd
+import numpy as np
+import os
+import json
+import time
+import argparse
+from tqdm import tqdm
+
+from dataset import MASTER_PATH, is_partitioned, list_dates, read_transfers
+from construct import split_by_day, run_tasks, partition_hashes
+from clustering import exact_clustering, transfers_matrix
+from components import component_stats
+from prices import PRICE_FILES, FREQ_SECONDS, load_candles, bucket_volumes, combine_bucket_volumes, daily_usd_volumes
+from load import TOKEN_NAMES
+from profiling import add_profile_argument, enable_run_log, stage
+
+REPORT_DIR = 'report'
+DAILY_METRICS_CSV = os.path.join(REPORT_DIR, 'daily_metrics.csv')
+CORRECTED_CSV = os.path.join(REPORT_DIR, 'daily_network_metrics_corrected.csv')  # Only written here.
+METRICS_MANIFEST = os.path.join('data', 'processed', 'daily_metrics_manifest.json')
+BUCKET_VOLUMES_PATH = os.path.join('data', 'processed', 'daily_bucket_volumes.parquet')
+METRICS_VERSION = 1  # Bump whenever day_metrics changes.
+METRIC_COLUMNS = ['from_id', 'to_id', 'token_name', 'value', 'time_stamp']
+SAFE_STABLES = ['USDC', 'USDT']
+
+
+def day_metrics(daily_df, token_names=TOKEN_NAMES, topology=True):
+    """
+    Computes every metric of one day from its transfer columns (from_id, to_id,
+    token_name, value) with array operations only. The edge set is the one of
+    the graph store: transfers of unmapped tokens are left out. A day-local
+    adjacency matrix is only built when topology metrics are requested.
+    """
+    codes = pd.Categorical(daily_df['token_name'], categories=token_names).codes
+    keep = codes >= 0
+    codes = codes[keep]
+    src = daily_df['from_id'].to_numpy()[keep]
+    dst = daily_df['to_id'].to_numpy()[keep]
+    values = daily_df['value'].to_numpy(dtype=np.float64)[keep]
+
+    metrics = {
+        'nodes': len(np.unique(np.concatenate([src, dst]))),
+        'edges': len(np.unique(src.astype(np.int64) << 32 | dst.astype(np.int64))),
+        'transfers': len(src),
+        'senders': len(np.unique(src)),
+        'receivers': len(np.unique(dst)),
+    }
+
+    counts = np.bincount(codes, minlength=len(token_names))
+    volumes = np.bincount(codes, weights=values, minlength=len(token_names))
+    for i, token in enumerate(token_names):
+        metrics[f'transfers_{token.lower()}'] = int(counts[i])
+        metrics[f'raw_volume_{token.lower()}'] = volumes[i]
+
+    if topology:
+        matrix = transfers_matrix(src, dst)
+        clustering = exact_clustering(matrix) if len(src) else {'average': 0.0, 'transitivity': 0.0}
+        metrics['avg_clustering'] = clustering['average']
+        metrics['transitivity'] = clustering['transitivity']
+        metrics.update(component_stats(matrix))
+    return metrics
+
+def day_task(date_str, daily_df, token_names, topology, price_seconds):
+    """
+    Worker task for one day slice: its metrics plus its raw volume per
+    (price bucket, token), which is valued in USD once all days are in.
+    """
+    with stage('day_metrics', rows_in=len(daily_df), date=date_str):
+        volumes = bucket_volumes(daily_df['time_stamp'], daily_df['token_name'], daily_df['value'], price_seconds)
+        return date_str, day_metrics(daily_df, token_names, topology), volumes
+
+def day_task_from_partitions(date_str, input_path, token_names, topology, price_seconds):
+    """Worker task: reads one day's partitions of the master data and runs day_task on it."""
+    daily_df = read_transfers(date_str, date_str, columns=METRIC_COLUMNS, path=input_path)
+    return day_task(date_str, daily_df, token_names, topology, price_seconds)
+
+def add_usd_volumes(metrics_df, usd_volumes, token_names=TOKEN_NAMES):
+    """Adds the USD volume columns from a (date x token) table of USD volumes."""
+    metrics_df = metrics_df.copy()
+    usd_volumes = usd_volumes.reindex(metrics_df.index).fillna(0)
+    for token in token_names:
+        metrics_df[f'volume_{token.lower()}'] = usd_volumes[token] if token in usd_volumes else 0.0
+    metrics_df['volume_total'] = sum(metrics_df[f'volume_{t.lower()}'] for t in token_names)
+    metrics_df['volume_safe_stables'] = sum(metrics_df[f'volume_{t.lower()}'] for t in SAFE_STABLES)
+    return metrics_df
+
+def compute_daily_metrics(input_path=MASTER_PATH, token_names=TOKEN_NAMES, topology=True, workers=None,
+                          price_seconds=FREQ_SECONDS['D'], dates=None):
+    """
+    Computes the raw daily metrics table (index: day) in a single pass over the
+    master data, together with the raw volume per (price bucket, token) for
+    the USD valuation. On the partitioned layout each day (of `dates`, default
+    all) is read once by a worker process; a single-file master is read once
+    and split by day.
+    """
+    workers = workers or os.cpu_count()
+    if is_partitioned(input_path):
+        dates = list_dates(input_path) if dates is None else dates
+        tasks = [(date_str, input_path, token_names, topology, price_seconds) for date_str in dates]
+        task_function = day_task_from_partitions
+    else:
+        df = read_transfers(columns=METRIC_COLUMNS, path=input_path)
+        tasks = [(date_str, daily_df, token_names, topology, price_seconds)
+                 for date_str, daily_df in split_by_day(df, METRIC_COLUMNS)]
+        del df
+        task_function = day_task
+
+    dates, rows, volumes = [], [], []
+    for date_str, metrics, day_volumes in tqdm(run_tasks(task_function, tasks, workers), total=len(tasks), desc="Computing daily metrics"):
+        dates.append(pd.Timestamp(date_str))
+        rows.append(metrics)
+        volumes.append(day_volumes)
+    return pd.DataFrame(rows, index=pd.DatetimeIndex(dates)), combine_bucket_volumes(volumes)
+
+def corrected_view(metrics_df, token_names=TOKEN_NAMES):
+    """The columns of daily_network_metrics_corrected.csv (USD volumes), as read by the plotting scripts."""
+    volume_columns = sorted(f'volume_{t.lower()}' for t in token_names)
+    columns = [c for c in ['nodes', 'edges', 'avg_clustering'] if c in metrics_df] + volume_columns
+    return metrics_df[columns]
+
+def metrics_version(token_names, topology, price_seconds):
+    """Identifies the code and settings a day's metrics row and bucket volumes were computed with."""
+    return f"{METRICS_VERSION}/{int(topology)}/{price_seconds}/{','.join(token_names)}"
+
+def load_metrics_state(version, csv_path=DAILY_METRICS_CSV, manifest_path=METRICS_MANIFEST,
+                       volumes_path=BUCKET_VOLUMES_PATH):
+    """
+    Returns the raw columns of the existing metrics table, its bucket volumes
+    and its manifest ({'version', 'days': {date: input hash and stat}}); all
+    empty if missing or computed with another version.
+    """
+    empty = (pd.DataFrame(), combine_bucket_volumes([]), {'version': version, 'days': {}})
+    if not all(os.path.exists(p) for p in (csv_path, manifest_path, volumes_path)):
+        return empty
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if manifest.get('version') != version:
+        return empty
+    metrics_df = pd.read_csv(csv_path, index_col=0, parse_dates=True, float_precision='round_trip')
+    metrics_df = metrics_df.drop(columns=[c for c in metrics_df if c.startswith('volume_')])
+    return metrics_df, pd.read_parquet(volumes_path), manifest
+
+def main(workers=None, topology=True, price_freq='D', force=False):
+    start_time = time.time()
+    print("===== Daily Metrics: Single-Pass Columnar Engine =====")
+
+    if not os.path.exists(MASTER_PATH):
+        print(f"Error: Master data file not found at {MASTER_PATH}. Please run 'codes/load.py' first.")
+        return
+
+    # Days whose partitions are unchanged keep their row and bucket volumes;
+    # the USD valuation below always covers every day, as prices may change.
+    price_seconds = FREQ_SECONDS[price_freq]
+    version = metrics_version(TOKEN_NAMES, topology, price_seconds)
+    old_df, old_volumes, manifest = load_metrics_state(version)
+    if force:
+        old_df, manifest['days'] = pd.DataFrame(), {}
+    stale, hashes = None, {}
+    if is_partitioned(MASTER_PATH):
+        dates = list_dates(MASTER_PATH)
+        with stage('partition_hashes', rows_in=len(dates)):
+            hashes = partition_hashes(dates, MASTER_PATH, manifest)
+        stale = [d for d in dates if (manifest['days'].get(d) or {}).get('input_hash') != hashes[d][0]
+                 or pd.Timestamp(d) not in old_df.index]
+        print(f"{len(dates) - len(stale)} of {len(dates)} days are up to date; computing {len(stale)}.")
+
+    new_df, new_volumes = compute_daily_metrics(MASTER_PATH, TOKEN_NAMES, topology, workers, price_seconds, stale)
+    if stale is None:
+        metrics_df, volumes = new_df, new_volumes
+    else:
+        kept = pd.DatetimeIndex(sorted(set(dates) - set(stale)))
+        metrics_df = pd.concat([old_df.loc[old_df.index.isin(kept)], new_df]).sort_index()
+        volumes = combine_bucket_volumes([old_volumes[pd.to_datetime(old_volumes['time']).dt.normalize().isin(kept)], new_volumes])
+    if metrics_df.empty:
+        print("No transfers found in the master data.")
+        return
+
+    metrics_df = add_usd_volumes(metrics_df, daily_usd_volumes(volumes, load_candles(PRICE_FILES)))
+
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    metrics_df.to_csv(DAILY_METRICS_CSV)
+    corrected_view(metrics_df).to_csv(CORRECTED_CSV)
+    os.makedirs(os.path.dirname(METRICS_MANIFEST), exist_ok=True)
+    volumes.to_parquet(BUCKET_VOLUMES_PATH, index=False)
+    manifest['days'] = {d: {'input_hash': h, 'input_stat': s} for d, (h, s) in hashes.items()}
+    with open(METRICS_MANIFEST, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    print(f"\nDaily metrics for {len(metrics_df)} days saved to {DAILY_METRICS_CSV}")
+    print(f"USD-corrected summary saved to {CORRECTED_CSV}")
+    print(f"Total execution time: {time.time() - start_time:.2f} seconds.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compute all daily metrics in one pass over the master data.")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Worker processes, one day per task (default: all cores).")
+    parser.add_argument('--no-topology', action='store_true',
+                        help="Skip the metrics that need a graph (clustering, components).")
+    parser.add_argument('--price-freq', choices=list(FREQ_SECONDS), default='D',
+                        help="USD valuation granularity; use 'h' or 'min' with hourly or minute candles.")
+    parser.add_argument('--force', action='store_true',
+                        help="Recompute every day, even if its partitions are unchanged.")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    if args.profile:
+        enable_run_log()
+    with stage('daily_metrics', force=args.force):
+        main(workers=args.workers, topology=not args.no_topology, price_freq=args.price_freq, force=args.force)
@@ -0,0 +1,184 @@
+import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pyarrow.dataset as ds
+import pyarrow.compute as pc
+import os
+import glob
+import hashlib
+
+DATA_DIR = 'data'
+MASTER_PATH = os.path.join(DATA_DIR, 'master_transfers.parquet')
+ADDRESS_DICT_PATH = os.path.join(DATA_DIR, 'address_dictionary.parquet')
+
+PARTITION_SCHEMA = pa.schema([('date', pa.string()), ('token', pa.string())])
+UNMAPPED_TOKEN = '__HIVE_DEFAULT_PARTITION__'
+
+
+def is_partitioned(path=MASTER_PATH):
+    """True if the master data is a hive-partitioned (date=/token=) dataset directory."""
+    return os.path.isdir(path) and any(name.startswith('date=') for name in os.listdir(path))
+
+def open_master(path=MASTER_PATH):
+    """Opens the master data as a pyarrow dataset, whatever its layout."""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Master data file not found at {path}. Please run 'codes/load.py' first.")
+    if is_partitioned(path):
+        return ds.dataset(path, format='parquet', partitioning=ds.partitioning(PARTITION_SCHEMA, flavor='hive'))
+    return ds.dataset(path, format='parquet')
+
+def is_compact(path=MASTER_PATH):
+    """True if the master data uses the integer-encoded schema (from_id/to_id, epoch seconds)."""
+    return os.path.exists(path) and 'from_id' in open_master(path).schema.names
+
+def to_datetime(time_stamps):
+    """Converts a time_stamp column to datetimes, whether stored as epoch seconds or timestamps."""
+    if pd.api.types.is_integer_dtype(time_stamps):
+        return pd.to_datetime(time_stamps, unit='s')
+    return pd.to_datetime(time_stamps)
+
+def load_address_table(path=ADDRESS_DICT_PATH):
+    """
+    Loads the reverse lookup table of the address dictionary: position i
+    holds the hex address whose id is i.
+    """
+    if not os.path.exists(path):
+        return np.array([], dtype=object)
+    return pq.read_table(path).column('address').to_numpy(zero_copy_only=False)
+
+def save_address_table(address_table, path=ADDRESS_DICT_PATH):
+    """Persists the reverse lookup table (id -> hex address)."""
+    pq.write_table(pa.table({'address': pa.array(address_table, type=pa.string())}), path)
+
+def build_address_index(address_table):
+    """Builds the forward dictionary (hex address -> id) from the reverse lookup table."""
+    return {address: i for i, address in enumerate(address_table)}
+
+def encode_addresses(addresses, address_index):
+    """
+    Encodes hex addresses as int32 ids, assigning the next free id to every
+    unseen address. Only the distinct addresses of the batch touch Python.
+    """
+    codes, uniques = pd.factorize(addresses)
+    ids = np.fromiter((address_index.setdefault(a, len(address_index)) for a in uniques),
+                      dtype=np.int32, count=len(uniques))
+    return ids[codes]
+
+def map_tokens(contract_addresses, token_map):
+    """
+    Token name of each contract address, matched case-insensitively (NaN if
+    unmapped or missing). Shared by ingest, validation and the monitor so
+    they count the same rows per token.
+    """
+    return contract_addresses.astype('string').str.lower().map(token_map)
+
+def decode_addresses(ids, address_table=None):
+    """Decodes int32 ids back to hex addresses; meant for output time only."""
+    if address_table is None:
+        address_table = load_address_table()
+    return address_table[np.asarray(ids)]
+
+def lookup_address_ids(addresses, address_table=None):
+    """Returns the ids of the given hex addresses (-1 for addresses never seen)."""
+    if address_table is None:
+        address_table = load_address_table()
+    return pd.Index(address_table).get_indexer(list(addresses))
+
+def list_dates(path=MASTER_PATH):
+    """Returns the sorted 'YYYY-MM-DD' dates that have at least one transfer."""
+    if is_partitioned(path):
+        return sorted(name[len('date='):] for name in os.listdir(path) if name.startswith('date='))
+
+    time_stamps = open_master(path).to_table(columns=['time_stamp']).column('time_stamp')
+    if len(time_stamps) == 0:
+        return []
+    if pa.types.is_integer(time_stamps.type):
+        days = pd.to_datetime(np.unique(time_stamps.to_numpy() // 86400) * 86400, unit='s')
+    else:
+        days = pd.DatetimeIndex(pc.unique(pc.floor_temporal(time_stamps, unit='day')).to_pandas())
+    return sorted(days.strftime('%Y-%m-%d'))
+
+def date_partition_files(date_str, path=MASTER_PATH):
+    """Returns the sorted Parquet files of one date partition (all tokens)."""
+    return sorted(glob.glob(os.path.join(path, f"date={date_str}", '*', '*.parquet')))
+
+def stat_signature(files):
+    """Cheap identity of a file set from names, sizes and modification times."""
+    digest = hashlib.sha1()
+    for f in files:
+        stat = os.stat(f)
+        digest.update(f"{os.path.basename(os.path.dirname(f))}/{os.path.basename(f)}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()
+
+def content_hash(files, block_size=1 << 20):
+    """SHA-1 over the bytes of a file set, read in fixed-size blocks."""
+    digest = hashlib.sha1()
+    for f in files:
+        digest.update(os.path.basename(os.path.dirname(f)).encode())
+        with open(f, 'rb') as fh:
+            for block in iter(lambda: fh.read(block_size), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+def frame_hash(df):
+    """Order-sensitive content hash of a DataFrame, for inputs that are not separate files."""
+    return hashlib.sha1(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes()).hexdigest()
+
+def build_filter(start_date=None, end_date=None, tokens=None, partitioned=True, epoch_seconds=True):
+    """
+    Builds a dataset filter for an inclusive date range and a token list.
+    On the partitioned layout it prunes whole partitions; on the single-file
+    layout it is pushed down to the row-group statistics of time_stamp.
+    """
+    expr = None
+
+    def add(term):
+        return term if expr is None else expr & term
+
+    if partitioned:
+        if start_date is not None:
+            expr = add(ds.field('date') >= pd.Timestamp(start_date).strftime('%Y-%m-%d'))
+        if end_date is not None:
+            expr = add(ds.field('date') <= pd.Timestamp(end_date).strftime('%Y-%m-%d'))
+        if tokens is not None:
+            expr = add(ds.field('token').isin(list(tokens)))
+    else:
+        def bound(date):
+            date = pd.Timestamp(date).normalize()
+            if epoch_seconds:
+                return pa.scalar(int(date.timestamp()), type=pa.int64())
+            return pa.scalar(date, type=pa.timestamp('ns'))
+
+        if start_date is not None:
+            expr = add(ds.field('time_stamp') >= bound(start_date))
+        if end_date is not None:
+            expr = add(ds.field('time_stamp') < bound(pd.Timestamp(end_date) + pd.Timedelta(days=1)))
+        if tokens is not None:
+            expr = add(ds.field('token_name').isin(list(tokens)))
+    return expr
+
+def read_transfers(start_date=None, end_date=None, tokens=None, columns=None, path=MASTER_PATH):
+    """
+    Reads the transfers between start_date and end_date (both inclusive) for
+    the given tokens, loading only the requested columns. Either bound may be
+    None to leave that side open. Works on both the partitioned dataset and
+    the legacy single-file layout. Raises ValueError if a requested column
+    is not in the master data.
+    """
+    dataset = open_master(path)
+    partitioned = is_partitioned(path)
+    if columns is not None:
+        missing = [c for c in columns if c not in dataset.schema.names]
+        if missing:
+            hint = ''
+            if 'from_address' in dataset.schema.names:
+                hint = " This is a legacy master with hex addresses; run 'codes/load.py --append' to migrate it."
+            raise ValueError(f"Master data at {path} has no column(s) {', '.join(missing)}.{hint}")
+    elif partitioned:
+        columns = [c for c in dataset.schema.names if c not in PARTITION_SCHEMA.names]
+
+    epoch_seconds = pa.types.is_integer(dataset.schema.field('time_stamp').type)
+    table = dataset.to_table(columns=columns,
+                             filter=build_filter(start_date, end_date, tokens, partitioned, epoch_seconds))
+    return table.to_pandas()
@@ -1,63 +1,60 @@
-import pandas as pd
+import pyarrow as pa
 import os
 import time
+import argparse
+
+from dataset import open_master
+from prices import PRICE_FILES, FREQ_SECONDS, load_candles, bucket_volumes, combine_bucket_volumes, daily_usd_volumes
+from profiling import add_profile_argument, enable_run_log, stage
 
 DATA_DIR = 'data'
 REPORT_DIR = 'report'
 MASTER_FILE = os.path.join(DATA_DIR, 'master_transfers.parquet')
-OUTPUT_CSV = os.path.join(REPORT_DIR, 'daily_network_metrics_corrected.csv')
+OUTPUT_CSV = os.path.join(REPORT_DIR, 'daily_usd_volumes.csv')  # daily_network_metrics_corrected.csv is written by dailyMetrics.py.
+
+SCAN_ROWS = 2_000_000  # Rows aggregated at a time; bounds memory whatever the data size.
 
-PRICE_FILES = {
-    'WLUNA': os.path.join(DATA_DIR, 'price_data', 'wluna_price_data.csv'),
-    'USDT': os.path.join(DATA_DIR, 'price_data', 'usdt_price_data.csv'),
-    'USDC': os.path.join(DATA_DIR, 'price_data', 'usdc_price_data.csv'),
-    'DAI': os.path.join(DATA_DIR, 'price_data', 'dai_price_data.csv'),
-    'USTC': os.path.join(DATA_DIR, 'price_data', 'ustc_price_data.csv'),
-    'PAX': os.path.join(DATA_DIR, 'price_data', 'pax_price_data.csv'),
-}
 
+def aggregate_batches(batches, seconds):
+    """Sums one chunk of record batches per (time bucket, token)."""
+    df = pa.Table.from_batches(batches).to_pandas()
+    return bucket_volumes(df['time_stamp'], df['token_name'], df['value'], seconds)
 
-def load_all_price_data(price_file_map):
-    """Loads all price data files and combines them into a single DataFrame."""
-    all_prices = []
-    print("Loading all price data files...")
-    for token_name, file_path in price_file_map.items():
-        try:
-            price_df = pd.read_csv(file_path)
-            price_df['token_name'] = token_name
-            all_prices.append(price_df)
-        except FileNotFoundError:
-            print(f"  -> Warning: Price file not found for {token_name} at {file_path}. Skipping.")
-            continue
-            
-    combined_prices = pd.concat(all_prices, ignore_index=True)
-    combined_prices['date'] = pd.to_datetime(combined_prices['timestamp'], unit='s').dt.date
-    return combined_prices[['date', 'token_name', 'close']].rename(columns={'close': 'price'})
+def scan_bucket_volumes(path=MASTER_FILE, seconds=FREQ_SECONDS['D']):
+    """
+    Streams the master data in bounded chunks and sums raw volume per
+    (time bucket, token). Only the small aggregate is kept across chunks.
+    """
+    parts, pending, pending_rows = [], [], 0
+    for batch in open_master(path).to_batches(columns=['time_stamp', 'token_name', 'value']):
+        pending.append(batch)
+        pending_rows += batch.num_rows
+        if pending_rows >= SCAN_ROWS:
+            parts = [combine_bucket_volumes(parts + [aggregate_batches(pending, seconds)])]
+            pending, pending_rows = [], 0
+    if pending_rows:
+        parts.append(aggregate_batches(pending, seconds))
+    return combine_bucket_volumes(parts)
 
-def main():
+def main(price_freq='D'):
     start_time = time.time()
     print("===== Recalculating Daily Volumes with Full Price Correction =====")
     
-    print("\nLoading master transaction data...")
-    df = pd.read_parquet(MASTER_FILE)
-    df['date'] = pd.to_datetime(df['time_stamp']).dt.date
-    
-    price_df = load_all_price_data(PRICE_FILES)
-
-    print("\nApplying price correction to all transactions...")
-    
-    merged_df = pd.merge(df, price_df, on=['date', 'token_name'], how='left')
+    print(f"\nAggregating raw volumes per token and {price_freq} bucket...")
+    with stage('scan_volumes', price_freq=price_freq) as record:
+        volumes = scan_bucket_volumes(MASTER_FILE, FREQ_SECONDS[price_freq])
+        record['rows_out'] = len(volumes)
     
-    merged_df['price'] = merged_df.groupby('token_name')['price'].ffill()
-    merged_df['price'].fillna(1.0, inplace=True) # As a final fallback, assume a price of 1.0 for any remaining NaNs
+    with stage('load_candles') as record:
+        candles = load_candles(PRICE_FILES)
+        record['rows_out'] = len(candles)
 
-    merged_df['usd_value'] = merged_df['value'] * merged_df['price']
-    
+    print("\nApplying price correction to the aggregated volumes...")
+    with stage('price_correction', rows_in=len(volumes)) as record:
+        daily_volumes = daily_usd_volumes(volumes, candles)
+        record['rows_out'] = len(daily_volumes)
     print("Price correction complete.")
     
-    print("\nAggregating daily volumes...")
-    daily_volumes = merged_df.groupby(['date', 'token_name'])['usd_value'].sum().unstack(fill_value=0)
-    
     daily_volumes = daily_volumes.rename(columns={
         'WLUNA': 'volume_wluna',
         'USTC': 'volume_ustc',
@@ -66,19 +63,21 @@ def main():
         'DAI': 'volume_dai',
         'PAX': 'volume_pax'
     })
-    
-    print("Combining with structural metrics from previous analysis...")
-    try:
-        old_metrics_df = pd.read_csv(os.path.join(REPORT_DIR, 'daily_network_metrics.csv'), index_col=0, parse_dates=True)
-        final_df = old_metrics_df[['nodes', 'edges', 'avg_clustering']].join(daily_volumes, how='left').fillna(0)
-    except FileNotFoundError:
-        print("  -> Warning: 'daily_network_metrics.csv' not found. Creating a new file with only volume data.")
-        final_df = daily_volumes
+    daily_volumes = daily_volumes[sorted(daily_volumes.columns)]
 
-    final_df.to_csv(OUTPUT_CSV)
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    daily_volumes.to_csv(OUTPUT_CSV)
     
-    print(f"\nFully corrected daily metrics saved to {OUTPUT_CSV}")
+    print(f"\nCorrected daily USD volumes saved to {OUTPUT_CSV}")
     print(f"Total execution time: {time.time() - start_time:.2f} seconds.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Recalculate daily USD volumes from the master data and price candles.")
+    parser.add_argument('--price-freq', choices=list(FREQ_SECONDS), default='D',
+                        help="Valuation granularity; use 'h' or 'min' with hourly or minute candles.")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    if args.profile:
+        enable_run_log()
+    with stage('fix_tokens_to_usd', price_freq=args.price_freq):
+        main(price_freq=args.price_freq)
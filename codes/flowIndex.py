@@ -0,0 +1,218 @@
+import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import os
+import json
+import time
+import argparse
+from tqdm import tqdm
+
+from dataset import load_address_table, lookup_address_ids
+from graphStore import STORE_DIR, list_store_dates, load_manifest, load_edges
+from construct import run_tasks
+from prices import PRICE_FILES, load_candles, price_table, price_at
+
+INDEX_PATH = os.path.join('data', 'processed', 'flow_index.arrow')
+
+# One row per (address, day, token) with any transfer, sorted by address, day, token.
+# 'day' counts days since 1970-01-01, so a date range is an integer range.
+FLOW_SCHEMA = pa.schema([
+    ('address', pa.int32()),
+    ('day', pa.int32()),
+    ('token', pa.int8()),
+    ('inflow', pa.float64()),
+    ('outflow', pa.float64()),
+    ('inflow_usd', pa.float64()),
+    ('outflow_usd', pa.float64()),
+    ('in_transfers', pa.int32()),
+    ('out_transfers', pa.int32()),
+])
+
+
+def to_day(date):
+    """Converts a date to the index's day number."""
+    return int(pd.Timestamp(date).normalize().value // 86_400_000_000_000)
+
+def day_flows(date_str, store_dir, token_prices):
+    """
+    Worker task: per-(address, token) inflow and outflow of one day, from
+    the day's edge table in the graph store. token_prices[code] is that
+    day's USD price of token code.
+    """
+    edges = load_edges(date_str, store_dir=store_dir)
+    n = len(edges['src'])
+    n_tokens = len(token_prices)
+    keys = np.concatenate([edges['src'].astype(np.int64) * n_tokens + edges['token'],
+                           edges['dst'].astype(np.int64) * n_tokens + edges['token']])
+    uniques, inverse = np.unique(keys, return_inverse=True)
+    values = edges['value'].astype(np.float64)
+    transfers = edges['transfers'].astype(np.float64)
+
+    outflow = np.bincount(inverse[:n], weights=values, minlength=len(uniques))
+    inflow = np.bincount(inverse[n:], weights=values, minlength=len(uniques))
+    out_transfers = np.bincount(inverse[:n], weights=transfers, minlength=len(uniques))
+    in_transfers = np.bincount(inverse[n:], weights=transfers, minlength=len(uniques))
+
+    tokens = (uniques % n_tokens).astype(np.int8)
+    prices = np.asarray(token_prices, dtype=np.float64)[tokens]
+    return {
+        'address': (uniques // n_tokens).astype(np.int32),
+        'day': np.full(len(uniques), to_day(date_str), dtype=np.int32),
+        'token': tokens,
+        'inflow': inflow,
+        'outflow': outflow,
+        'inflow_usd': inflow * prices,
+        'outflow_usd': outflow * prices,
+        'in_transfers': in_transfers.astype(np.int32),
+        'out_transfers': out_transfers.astype(np.int32),
+    }
+
+def build_flow_index(store_dir=STORE_DIR, prices=None, workers=None):
+    """
+    Builds the flow index table from every day in the graph store, in
+    parallel. USD values use each day's price from the shared daily price
+    table (tokens without any known price are valued at 1.0).
+    """
+    manifest = load_manifest(store_dir)
+    tokens = manifest['tokens']
+    if prices is None:
+        prices = price_table(load_candles(PRICE_FILES), 'D')
+    dates = list_store_dates(store_dir)
+    tasks = [(date_str, store_dir, [price_at(prices, date_str, token) for token in tokens]) for date_str in dates]
+
+    parts = list(tqdm(run_tasks(day_flows, tasks, workers or os.cpu_count()), total=len(tasks), desc="Indexing daily flows"))
+    columns = {name: np.concatenate([p[name] for p in parts]) if parts else np.array([], dtype=FLOW_SCHEMA.field(name).type.to_pandas_dtype())
+               for name in FLOW_SCHEMA.names}
+    order = np.lexsort((columns['token'], columns['day'], columns['address']))
+    table = pa.table({name: values[order] for name, values in columns.items()}, schema=FLOW_SCHEMA)
+    return table.replace_schema_metadata({'tokens': json.dumps(tokens)})
+
+def write_flow_index(table, path=INDEX_PATH):
+    """Writes the flow index as a single-batch uncompressed Arrow IPC file (memory-mappable)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table.combine_chunks(), max_chunksize=max(table.num_rows, 1))
+    os.replace(tmp_path, path)
+
+def load_flow_index(path=INDEX_PATH):
+    """
+    Memory-maps the flow index. Returns a dict of zero-copy numpy columns
+    plus 'tokens', the token names of the int8 token codes.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Flow index not found at {path}. Please run 'codes/flowIndex.py build' first.")
+    table = ipc.open_file(pa.memory_map(path, 'r')).read_all()
+    index = {name: table.column(name).to_numpy() for name in FLOW_SCHEMA.names}
+    index['tokens'] = json.loads(table.schema.metadata[b'tokens'])
+    return index
+
+def address_rows(index, address_id):
+    """Row range of one address in the index (binary search on the sorted address column)."""
+    start = np.searchsorted(index['address'], address_id, side='left')
+    stop = np.searchsorted(index['address'], address_id, side='right')
+    return start, stop
+
+def lookup_flows(index, address_id, start_date=None, end_date=None, tokens=None):
+    """
+    Returns the daily flow rows of one address id between start_date and
+    end_date (inclusive, either may be None) as a DataFrame with a 'date'
+    and a token name column.
+    """
+    start, stop = address_rows(index, address_id)
+    days = index['day'][start:stop]
+    lo = np.searchsorted(days, to_day(start_date)) if start_date is not None else 0
+    hi = np.searchsorted(days, to_day(end_date), side='right') if end_date is not None else len(days)
+    rows = slice(start + lo, start + hi)
+
+    flows = pd.DataFrame({name: index[name][rows] for name in FLOW_SCHEMA.names if name != 'address'})
+    flows['date'] = pd.to_datetime(flows.pop('day').astype(np.int64), unit='D')
+    flows['token_name'] = np.asarray(index['tokens'], dtype=object)[flows.pop('token')]
+    if tokens is not None:
+        flows = flows[flows['token_name'].isin(list(tokens))]
+    return flows
+
+def net_flow(index, address_id, start_date=None, end_date=None, usd=True, tokens=None):
+    """Net inflow (inflow - outflow) of one address per day and token: a (date x token) table."""
+    flows = lookup_flows(index, address_id, start_date, end_date, tokens)
+    suffix = '_usd' if usd else ''
+    flows['net'] = flows[f'inflow{suffix}'] - flows[f'outflow{suffix}']
+    table = flows.pivot_table(index='date', columns='token_name', values='net', aggfunc='sum', fill_value=0)
+    table.columns.name = None
+    return table
+
+def range_mask(index, start_date=None, end_date=None):
+    """Boolean mask of the index rows inside a date range."""
+    mask = np.ones(len(index['day']), dtype=bool)
+    if start_date is not None:
+        mask &= index['day'] >= to_day(start_date)
+    if end_date is not None:
+        mask &= index['day'] <= to_day(end_date)
+    return mask
+
+def top_hubs(index, k=20, start_date=None, end_date=None):
+    """
+    Returns the k address ids with the largest USD volume (inflow + outflow)
+    over a date range, with their volumes, largest first.
+    """
+    mask = range_mask(index, start_date, end_date)
+    volume = np.bincount(index['address'][mask], weights=(index['inflow_usd'] + index['outflow_usd'])[mask])
+    k = min(k, np.count_nonzero(volume))
+    top = np.argpartition(-volume, k - 1)[:k] if k else np.array([], dtype=np.int64)
+    top = top[np.argsort(-volume[top], kind='stable')]
+    return top.astype(np.int32), volume[top]
+
+def batch_net_flow(index, address_ids, start_date=None, end_date=None, usd=True):
+    """
+    Net-flow time series of many addresses at once: a (date x address id)
+    table of net inflow summed over tokens, built in one pass over the
+    selected rows.
+    """
+    address_ids = np.asarray(address_ids, dtype=np.int32)
+    mask = range_mask(index, start_date, end_date) & np.isin(index['address'], address_ids)
+    suffix = '_usd' if usd else ''
+    flows = pd.DataFrame({
+        'date': pd.to_datetime(index['day'][mask].astype(np.int64), unit='D'),
+        'address': index['address'][mask],
+        'net': index[f'inflow{suffix}'][mask] - index[f'outflow{suffix}'][mask],
+    })
+    table = flows.pivot_table(index='date', columns='address', values='net', aggfunc='sum', fill_value=0)
+    table = table.reindex(columns=address_ids, fill_value=0)
+    table.columns.name = None
+    return table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build and query the per-address daily flow index.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build', help="Rebuild the index from the graph store.")
+    build_parser.add_argument('--workers', type=int, default=None)
+    net_parser = subparsers.add_parser('net', help="Daily USD net flow per token of one address.")
+    net_parser.add_argument('address')
+    top_parser = subparsers.add_parser('top', help="Top-K hubs by USD volume and their daily net flow.")
+    top_parser.add_argument('--k', type=int, default=20)
+    for sub in (net_parser, top_parser):
+        sub.add_argument('--start', default=None, help="First date (inclusive).")
+        sub.add_argument('--end', default=None, help="Last date (inclusive).")
+        sub.add_argument('--output', default=None, help="Also write the table to this CSV file.")
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        start_time = time.time()
+        table = build_flow_index(workers=args.workers)
+        write_flow_index(table)
+        print(f"Flow index with {table.num_rows} rows saved to {INDEX_PATH} ({time.time() - start_time:.2f} seconds)")
+    else:
+        index = load_flow_index()
+        if args.command == 'net':
+            address_id = lookup_address_ids([args.address])[0]
+            result = net_flow(index, address_id, args.start, args.end)
+        else:
+            hubs, volumes = top_hubs(index, args.k, args.start, args.end)
+            result = batch_net_flow(index, hubs, args.start, args.end)
+            result.columns = load_address_table()[hubs]
+        print(result.to_string(float_format=lambda x: f"{x:,.0f}"))
+        if args.output:
+            result.to_csv(args.output)
@@ -0,0 +1,214 @@
+import pandas as pd
+import numpy as np
+import os
+import json
+import time
+import argparse
+from tqdm import tqdm
+
+from dataset import MASTER_PATH, is_partitioned, list_dates, read_transfers, load_address_table, lookup_address_ids
+from load import TOKEN_NAMES
+from prices import PRICE_FILES, load_candles, value_buckets
+
+TRACE_DIR = os.path.join('data', 'processed', 'trace_index')
+TRACE_COLUMNS = ['from_id', 'to_id', 'time_stamp', 'token_name', 'value']
+DIRECTIONS = ['out', 'in']
+
+# The index holds every transfer twice, once per direction, as .npy arrays
+# memory-mapped on load. Rows of the 'out' side are sorted by (from_id, time);
+# key = from_id << 32 | time_stamp, so one searchsorted finds the transfers of
+# an address inside a time range. The 'in' side is the same keyed on to_id.
+#   {direction}_key.npy   int64   address << 32 | epoch seconds
+#   {direction}_other.npy int32   counterparty id
+#   {direction}_token.npy int8    token code (position in meta.json 'tokens')
+#   {direction}_value.npy float64 raw value
+
+
+def index_chunks(path=MASTER_PATH):
+    """Yields the transfer columns of the master data one day (or the whole single file) at a time."""
+    if is_partitioned(path):
+        for date_str in list_dates(path):
+            yield read_transfers(date_str, date_str, columns=TRACE_COLUMNS, path=path)
+    else:
+        yield read_transfers(columns=TRACE_COLUMNS, path=path)
+
+def build_trace_index(path=MASTER_PATH, index_dir=TRACE_DIR, token_names=TOKEN_NAMES):
+    """Builds the time-sorted adjacency index of all transfers of mapped tokens."""
+    parts = []
+    for df in tqdm(index_chunks(path), desc="Reading transfers"):
+        token = pd.Categorical(df['token_name'], categories=token_names).codes
+        keep = token >= 0
+        times = df['time_stamp']
+        if not pd.api.types.is_integer_dtype(times):
+            times = pd.to_datetime(times).astype('datetime64[s]').astype(np.int64)
+        parts.append((df['from_id'].to_numpy()[keep], df['to_id'].to_numpy()[keep],
+                      times.to_numpy(dtype=np.int64)[keep], token[keep].astype(np.int8),
+                      df['value'].to_numpy(dtype=np.float64)[keep]))
+    src, dst, times, token, value = (np.concatenate(column) for column in zip(*parts))
+    del parts
+
+    os.makedirs(index_dir, exist_ok=True)
+    for direction, own, other in (('out', src, dst), ('in', dst, src)):
+        key = own.astype(np.int64) << 32 | times
+        order = np.argsort(key, kind='stable')
+        for name, values in (('key', key), ('other', other), ('token', token), ('value', value)):
+            np.save(os.path.join(index_dir, f'{direction}_{name}.npy'), values[order])
+    with open(os.path.join(index_dir, 'meta.json'), 'w') as f:
+        json.dump({'tokens': list(token_names), 'transfers': int(len(src))}, f, indent=2)
+    return len(src)
+
+def load_trace_index(index_dir=TRACE_DIR):
+    """Memory-maps the trace index: {'tokens': [...], 'out': {name: array}, 'in': {name: array}}."""
+    meta_path = os.path.join(index_dir, 'meta.json')
+    if not os.path.exists(meta_path):
+        raise FileNotFoundError(f"Trace index not found in {index_dir}. Please run 'codes/flowTrace.py build' first.")
+    with open(meta_path) as f:
+        index = json.load(f)
+    for direction in DIRECTIONS:
+        index[direction] = {name: np.load(os.path.join(index_dir, f'{direction}_{name}.npy'), mmap_mode='r')
+                            for name in ('key', 'other', 'token', 'value')}
+    return index
+
+def gather_ranges(lo, hi):
+    """Concatenated positions of the ranges [lo[i], hi[i]), plus the range number of each position."""
+    lengths = np.maximum(hi - lo, 0)
+    owner = np.repeat(np.arange(len(lo)), lengths)
+    positions = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths) + lo[owner]
+    return positions, owner
+
+def trace_flows(index, seed_id, start_time, direction='out', hops=3, budget='24h',
+                tokens=None, min_value=0.0, stop_at=(), candles=None):
+    """
+    Follows funds from (direction='out') or into (direction='in') a seed
+    address for up to `hops` hops under temporal ordering. Outward, the first
+    hop leaves the seed at or after start_time and each later hop leaves its
+    sender strictly after that sender was reached, all before start_time +
+    budget; inward, the same holds backwards in time from start_time. Every
+    address is expanded from its earliest (outward) or latest (inward)
+    arrival. Addresses in stop_at (e.g. exchange wallets) are reached but not
+    expanded. Only the index rows of frontier addresses inside the time window
+    are read.
+
+    Returns (edges, hop_totals): the traced transfers (hop, src, dst, time,
+    token_name, value, usd_value) and per-hop transfer counts, addresses
+    reached and USD totals.
+    """
+    side = index[direction]
+    forward = direction == 'out'
+    start = int(pd.Timestamp(start_time).timestamp())
+    budget = int(pd.Timedelta(budget).total_seconds())
+    limit = start + budget if forward else start - budget
+    token_names = index['tokens']
+    token_codes = None if tokens is None else [token_names.index(t) for t in tokens if t in token_names]
+    stop_at = np.asarray(list(stop_at), dtype=np.int64)
+
+    # Best known arrival per reached address (sorted ids); the seed counts as
+    # reached just before (outward) or after (inward) start_time.
+    frontier = np.array([seed_id], dtype=np.int64)
+    arrival = np.array([start - 1 if forward else start + 1], dtype=np.int64)
+    bound = np.array([limit], dtype=np.int64)
+    best_ids, best_times = frontier.copy(), arrival.copy()
+    hop_edges = []
+
+    for hop in range(1, hops + 1):
+        if len(frontier) == 0:
+            break
+        if forward:
+            lo = np.searchsorted(side['key'], frontier << 32 | (arrival + 1), side='left')
+            hi = np.searchsorted(side['key'], frontier << 32 | bound, side='right')
+        else:
+            lo = np.searchsorted(side['key'], frontier << 32 | bound, side='left')
+            hi = np.searchsorted(side['key'], frontier << 32 | (arrival - 1), side='right')
+        positions, owner = gather_ranges(lo, hi)
+
+        token = side['token'][positions]
+        value = side['value'][positions]
+        keep = value >= min_value
+        if token_codes is not None:
+            keep &= np.isin(token, token_codes)
+        positions, owner, token, value = positions[keep], owner[keep], token[keep], value[keep]
+        times = side['key'][positions] & 0xFFFFFFFF
+        reached = side['other'][positions].astype(np.int64)
+        hop_edges.append(pd.DataFrame({
+            'hop': hop,
+            'src': frontier[owner] if forward else reached,
+            'dst': reached if forward else frontier[owner],
+            'time': times,
+            'token': token,
+            'value': value,
+        }))
+
+        # Next frontier: reached addresses whose arrival improved, at their best arrival.
+        order = np.argsort(times if forward else -times, kind='stable')
+        nodes, first = np.unique(reached[order], return_index=True)
+        times_at = times[order][first]
+        pos = np.searchsorted(best_ids, nodes)
+        found = pos < len(best_ids)
+        found[found] = best_ids[pos[found]] == nodes[found]
+        improved = ~found
+        improved[found] = (times_at[found] < best_times[pos[found]]) if forward \
+            else (times_at[found] > best_times[pos[found]])
+        # An address reached again earlier (outward) or later (inward) only needs
+        # the part of its window it has not been expanded over yet.
+        bounds = np.full(len(nodes), limit, dtype=np.int64)
+        bounds[found] = best_times[pos[found]]
+        best_times[pos[found & improved]] = times_at[found & improved]
+        best_ids = np.insert(best_ids, pos[~found], nodes[~found])
+        best_times = np.insert(best_times, pos[~found], times_at[~found])
+        nodes, times_at, bounds = nodes[improved], times_at[improved], bounds[improved]
+        expand = ~np.isin(nodes, stop_at)
+        frontier, arrival, bound = nodes[expand], times_at[expand], bounds[expand]
+
+    edges = pd.concat(hop_edges, ignore_index=True) if hop_edges else pd.DataFrame(
+        columns=['hop', 'src', 'dst', 'time', 'token', 'value'])
+    edges['time'] = pd.to_datetime(edges['time'].astype(np.int64), unit='s')
+    edges['token_name'] = np.asarray(token_names, dtype=object)[edges.pop('token').astype(np.int64)]
+    if candles is None:
+        candles = load_candles(PRICE_FILES)
+    priced = value_buckets(edges[['time', 'token_name', 'value']].assign(row=np.arange(len(edges))), candles)
+    edges['usd_value'] = priced.sort_values('row')['usd_value'].to_numpy()
+    edges = edges[['hop', 'src', 'dst', 'time', 'token_name', 'value', 'usd_value']]
+
+    hop_totals = edges.groupby('hop').agg(
+        transfers=('value', 'size'),
+        addresses=('dst' if forward else 'src', 'nunique'),
+        value_usd=('usd_value', 'sum'))
+    return edges, hop_totals
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-hop temporal fund-flow tracing from an address.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('build', help="Build the time-sorted adjacency index from the master data.")
+    trace_parser = subparsers.add_parser('trace', help="Trace funds from or into an address.")
+    trace_parser.add_argument('address')
+    trace_parser.add_argument('--start', required=True, help="Start time, e.g. '2022-05-09' or '2022-05-09 14:00'.")
+    trace_parser.add_argument('--direction', choices=DIRECTIONS, default='out')
+    trace_parser.add_argument('--hops', type=int, default=3)
+    trace_parser.add_argument('--budget', default='24h', help="Time budget of the whole trace, e.g. '6h' or '3D'.")
+    trace_parser.add_argument('--token', action='append', default=None, help="Only follow this token (repeatable).")
+    trace_parser.add_argument('--min-value', type=float, default=0.0, help="Ignore transfers below this raw value.")
+    trace_parser.add_argument('--stop-at', action='append', default=[], help="Address reached but not expanded (repeatable).")
+    trace_parser.add_argument('--output', default=None, help="Write the traced transfers to this CSV file.")
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        start_time = time.time()
+        count = build_trace_index()
+        print(f"Indexed {count} transfers in {TRACE_DIR} ({time.time() - start_time:.2f} seconds)")
+    else:
+        address_table = load_address_table()
+        index = load_trace_index()
+        seed_id, *stop_ids = lookup_address_ids([args.address] + args.stop_at, address_table)
+        if seed_id < 0:
+            raise SystemExit(f"Unknown address {args.address}")
+        start_time = time.time()
+        edges, hop_totals = trace_flows(index, seed_id, args.start, args.direction, args.hops, args.budget,
+                                        args.token, args.min_value, stop_ids)
+        print(hop_totals.to_string(float_format=lambda x: f"{x:,.2f}"))
+        print(f"Traced {len(edges)} transfers in {time.time() - start_time:.3f} seconds")
+        if args.output:
+            edges['src'] = address_table[edges['src'].to_numpy()]
+            edges['dst'] = address_table[edges['dst'].to_numpy()]
+            edges.to_csv(args.output, index=False)
+            print(f"Saved traced transfers to {args.output}")
@@ -0,0 +1,173 @@
+import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import scipy.sparse as sp
+import networkx as nx
+import os
+import json
+import argparse
+
+from dataset import load_address_table
+from sparseGraph import to_networkx
+
+STORE_DIR = os.path.join('data', 'processed', 'daily_graphs')
+MANIFEST_FILENAME = 'manifest.json'
+STORE_VERSION = 1
+
+# One uncompressed Arrow IPC file per day, memory-mapped on read.
+# Rows are (src, dst, token) edges with global address ids, sorted by src, dst, token.
+EDGE_SCHEMA = pa.schema([
+    ('src', pa.int32()),
+    ('dst', pa.int32()),
+    ('token', pa.int8()),
+    ('value', pa.float64()),
+    ('transfers', pa.int32()),
+])
+
+
+def edge_filename(date_str):
+    """Returns the file name of a day's edge table."""
+    return f"edges_{date_str}.arrow"
+
+def load_manifest(store_dir=STORE_DIR):
+    """Returns the store manifest: the token code list and one entry per stored day."""
+    path = os.path.join(store_dir, MANIFEST_FILENAME)
+    if not os.path.exists(path):
+        return {'version': STORE_VERSION, 'tokens': [], 'days': {}}
+    with open(path) as f:
+        return json.load(f)
+
+def save_manifest(manifest, store_dir=STORE_DIR):
+    """Atomically writes the store manifest."""
+    path = os.path.join(store_dir, MANIFEST_FILENAME)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def token_code(manifest, token):
+    """Returns the int8 code of a token, registering it in the manifest if new."""
+    if token not in manifest['tokens']:
+        manifest['tokens'].append(token)
+    return manifest['tokens'].index(token)
+
+def build_edge_table(df_slice, manifest):
+    """
+    Aggregates a day's transfers (from_id, to_id, token_name, value) into the
+    store's edge table: summed value and transfer count per (src, dst, token).
+    Transfers of unmapped tokens are dropped, as in the graph builder.
+    """
+    tokens = df_slice['token_name'].astype('category')
+    lookup = np.array([token_code(manifest, str(t)) for t in tokens.cat.categories] + [-1], dtype=np.int8)
+    codes = lookup[tokens.cat.codes.to_numpy()]
+    keep = codes >= 0
+
+    edges = pd.DataFrame({
+        'src': df_slice['from_id'].to_numpy()[keep],
+        'dst': df_slice['to_id'].to_numpy()[keep],
+        'token': codes[keep],
+        'value': df_slice['value'].to_numpy(dtype=np.float64)[keep],
+    })
+    edges = edges.groupby(['src', 'dst', 'token'], sort=True).agg(
+        value=('value', 'sum'), transfers=('value', 'size')).reset_index()
+    return pa.Table.from_pandas(edges, schema=EDGE_SCHEMA, preserve_index=False, safe=False)
+
+def write_edge_table(edges, date_str, store_dir=STORE_DIR):
+    """Writes one day's edge table as an uncompressed Arrow IPC file and returns its manifest entry."""
+    os.makedirs(store_dir, exist_ok=True)
+    path = os.path.join(store_dir, edge_filename(date_str))
+    tmp_path = path + '.tmp'
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with ipc.new_file(sink, EDGE_SCHEMA) as writer:
+            writer.write_table(edges)
+    os.replace(tmp_path, path)
+
+    src = edges.column('src').to_numpy()
+    dst = edges.column('dst').to_numpy()
+    pairs = np.unique(src.astype(np.int64) << 32 | dst.astype(np.int64)) if len(src) else []
+    return {
+        'file': edge_filename(date_str),
+        'nodes': int(len(np.unique(np.concatenate([src, dst])))),
+        'edges': int(len(pairs)),
+        'rows': edges.num_rows,
+    }
+
+def write_day(df_slice, date_str, manifest, store_dir=STORE_DIR):
+    """
+    Stores a day's transfers as an edge table in the graph store and registers
+    it in the in-memory manifest. The caller saves the manifest.
+    """
+    manifest['days'][date_str] = write_edge_table(build_edge_table(df_slice, manifest), date_str, store_dir)
+    return manifest['days'][date_str]
+
+def list_store_dates(store_dir=STORE_DIR):
+    """Returns the sorted dates available in the graph store."""
+    return sorted(load_manifest(store_dir)['days'])
+
+def load_edge_table(date_str, store_dir=STORE_DIR):
+    """Memory-maps a day's edge table; the numeric columns are zero-copy views of the file."""
+    path = os.path.join(store_dir, edge_filename(date_str))
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No stored graph for {date_str} in {store_dir}. Please run 'codes/construct.py' first.")
+    return ipc.open_file(pa.memory_map(path, 'r')).read_all()
+
+def load_edges(date_str, token=None, store_dir=STORE_DIR, manifest=None):
+    """
+    Returns a day's edges as numpy arrays {'src', 'dst', 'token', 'value', 'transfers'},
+    optionally restricted to one token name.
+    """
+    table = load_edge_table(date_str, store_dir)
+    edges = {name: table.column(name).to_numpy() for name in EDGE_SCHEMA.names}
+    if token is not None:
+        manifest = manifest or load_manifest(store_dir)
+        code = manifest['tokens'].index(token) if token in manifest['tokens'] else -1
+        mask = edges['token'] == code
+        edges = {name: values[mask] for name, values in edges.items()}
+    return edges
+
+def edges_to_graph(edges, token_names):
+    """Rebuilds the sparseGraph dict (day-local CSR matrices) from stored edge arrays."""
+    nodes, local = np.unique(np.concatenate([edges['src'], edges['dst']]), return_inverse=True)
+    n = len(nodes)
+    rows, cols = local[:len(edges['src'])], local[len(edges['src']):]
+
+    combined = sp.csr_matrix((edges['transfers'].astype(np.float64), (rows, cols)), shape=(n, n))
+    combined.sum_duplicates()
+
+    tokens = {}
+    for code in np.unique(edges['token']):
+        mask = edges['token'] == code
+        matrix = sp.csr_matrix((edges['value'][mask], (rows[mask], cols[mask])), shape=(n, n))
+        matrix.sum_duplicates()
+        tokens[token_names[code]] = matrix
+    return {'nodes': nodes.astype(np.int32), 'tokens': tokens, 'combined': combined}
+
+def load_graph(date_str, token=None, store_dir=STORE_DIR, manifest=None):
+    """Returns the sparse graph for a date, optionally restricted to one token."""
+    manifest = manifest or load_manifest(store_dir)
+    return edges_to_graph(load_edges(date_str, token, store_dir, manifest), manifest['tokens'])
+
+def export_gexf(date_str, output_path, token=None, store_dir=STORE_DIR, address_table=None):
+    """Exports a stored day as a rich GEXF graph with hex node ids, for Gephi."""
+    if address_table is None:
+        address_table = load_address_table()
+    G = to_networkx(load_graph(date_str, token, store_dir), address_table)
+    nx.write_gexf(G, output_path)
+    return G
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export stored daily graphs to GEXF for Gephi.")
+    parser.add_argument('dates', nargs='+', help="Dates (YYYY-MM-DD) to export.")
+    parser.add_argument('--token', default=None, help="Only export edges of this token.")
+    parser.add_argument('--output-dir', default=os.path.join('report', 'gephi_files'))
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    table = load_address_table()
+    for date_str in args.dates:
+        suffix = f"_{args.token}" if args.token else ''
+        path = os.path.join(args.output_dir, f"graph_{date_str}{suffix}.gexf")
+        G = export_gexf(date_str, path, args.token, address_table=table)
+        print(f"Saved {path} ({G.number_of_nodes()} nodes, {G.number_of_edges()} edges)")
@@ -1,15 +1,51 @@
 import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 import os
 import glob
 import time
+import shutil
+import argparse
+import json
+
+from dataset import (UNMAPPED_TOKEN, is_partitioned, is_compact, load_address_table, save_address_table,
+                     build_address_index, encode_addresses, decode_addresses, map_tokens)
+from profiling import add_profile_argument, enable_run_log, stage, timed_batches
+from validation import cached_stats, parsed_batches
 
 
 DATA_DIR = 'data'
 OUTPUT_DIR = 'data'
 OUTPUT_FILENAME = 'master_transfers.parquet'
+FINGERPRINT_FILENAME = 'master_fingerprints.npy'
+INGEST_LOG_FILENAME = 'master_ingested_files.json'
+ADDRESS_DICT_FILENAME = 'address_dictionary.parquet'
 
 TRANSACTION_FILES = glob.glob(os.path.join(DATA_DIR, 'token_transfers*.csv'))
 
+BATCH_SIZE = 1_000_000  # Rows per batch in streaming mode; bounds peak memory.
+MAX_SEEN_CHUNKS = 16  # Sorted fingerprint chunks kept before they are merged into one.
+ROW_GROUP_SIZE = 128_000  # Rows per row group inside each date/token partition file.
+
+FINGERPRINT_COLS = ['block_number', 'transaction_index', 'from_address', 'to_address', 'contract_address', 'value']
+
+# Compact master schema: addresses are int32 ids into the address dictionary,
+# time_stamp is epoch seconds and token_name is dictionary-encoded.
+MASTER_SCHEMA = pa.schema([
+    ('block_number', pa.int64()),
+    ('transaction_index', pa.int32()),
+    ('from_id', pa.int32()),
+    ('to_id', pa.int32()),
+    ('time_stamp', pa.int64()),
+    ('token_name', pa.dictionary(pa.int8(), pa.string())),
+    ('value', pa.float64()),
+])
+
+LEGACY_COLUMNS = ['block_number', 'transaction_index', 'from_address', 'to_address',
+                  'time_stamp', 'contract_address', 'value', 'token_name']
+
 TOKEN_MAP = {
     '0xdac17f958d2ee523a2206206994597c13d831ec7': 'USDT',
     '0xa0b86991c6218b36c1d19d4a2e9eb0ce3606eb48': 'USDC',
@@ -18,6 +54,7 @@ TOKEN_MAP = {
     '0xa47c8bf37f92abed4a126bda807a7b7498661acd': 'USTC',
     '0xd2877702675e6ceb975b4a1dff9fb7baf4c91ea9': 'WLUNA' 
 }
+TOKEN_NAMES = list(TOKEN_MAP.values())
 
 
 def load_and_combine_data(file_list):
@@ -27,7 +64,9 @@ def load_and_combine_data(file_list):
     for f in file_list:
         print(f"-> Loading {os.path.basename(f)}...")
         try:
-            df = pd.read_csv(f)
+            with stage('read_csv', file=os.path.basename(f)) as record:
+                df = pd.read_csv(f)
+                record['rows_out'] = len(df)
             dfs.append(df)
         except Exception as e:
             print(f"   Error loading {f}: {e}")
@@ -41,52 +80,402 @@ def load_and_combine_data(file_list):
     combined_df = pd.concat(dfs, ignore_index=True)
     return combined_df
 
-def clean_and_enrich_data(df, token_map):
-    """Performs cleaning and enrichment on the combined DataFrame."""
+def fingerprint_rows(df):
+    """
+    Returns a 64-bit fingerprint per row over the de-duplication key columns.
+    Key dtypes are normalised first so CSV and Parquet reads hash identically,
+    and contract addresses are lowercased, as they are for the token lookup
+    (the address dictionary keeps from/to addresses as they are).
+    """
+    key = pd.DataFrame({
+        'block_number': df['block_number'].astype('int64'),
+        'transaction_index': df['transaction_index'].astype('int64'),
+        'from_address': df['from_address'].astype(object),
+        'to_address': df['to_address'].astype(object),
+        'contract_address': df['contract_address'].astype(object).str.lower(),
+        'value': df['value'].astype('float64'),
+    })
+    return pd.util.hash_pandas_object(key, index=False).to_numpy()
+
+def is_seen(fingerprints, seen_chunks):
+    """Flags the fingerprints already present in any of the sorted seen chunks."""
+    seen = np.zeros(len(fingerprints), dtype=bool)
+    for chunk in seen_chunks:
+        if len(chunk) == 0:
+            continue
+        pos = np.minimum(np.searchsorted(chunk, fingerprints), len(chunk) - 1)
+        seen |= chunk[pos] == fingerprints
+    return seen
+
+def drop_duplicate_fingerprints(df, seen_chunks=()):
+    """
+    Drops rows whose fingerprint repeats within df or already appears in seen_chunks.
+    Returns the de-duplicated frame and the sorted fingerprints of the kept rows.
+    """
+    fingerprints = fingerprint_rows(df)
+    keep = ~pd.Series(fingerprints).duplicated().to_numpy()
+    keep &= ~is_seen(fingerprints, seen_chunks)
+    return df[keep].copy(), np.sort(fingerprints[keep])
+
+def load_fingerprints(fingerprint_path, master_path, batch_size=BATCH_SIZE):
+    """
+    Loads the persisted fingerprint set. If it is missing but a master dataset
+    exists, the set is rebuilt from the master's key columns batch by batch
+    (decoding ids and token names back to addresses for compact masters;
+    rows with unmapped contracts cannot be restored exactly).
+    """
+    if os.path.exists(fingerprint_path):
+        return np.load(fingerprint_path)
+    if not os.path.exists(master_path):
+        return np.array([], dtype='uint64')
+
+    print(f"Fingerprint set not found. Rebuilding it from {master_path}...")
+    compact = is_compact(master_path)
+    if compact:
+        columns = ['block_number', 'transaction_index', 'from_id', 'to_id', 'token_name', 'value']
+        address_table = load_address_table(os.path.join(os.path.dirname(master_path), ADDRESS_DICT_FILENAME))
+        contract_map = {name: address for address, name in TOKEN_MAP.items()}
+    else:
+        columns = FINGERPRINT_COLS
+
+    chunks = []
+    for batch in ds.dataset(master_path, format='parquet', partitioning='hive').to_batches(columns=columns, batch_size=batch_size):
+        df = batch.to_pandas()
+        if compact:
+            df['from_address'] = decode_addresses(df['from_id'], address_table)
+            df['to_address'] = decode_addresses(df['to_id'], address_table)
+            df['contract_address'] = df['token_name'].astype(object).map(contract_map)
+        chunks.append(fingerprint_rows(df))
+    if not chunks:
+        return np.array([], dtype='uint64')
+    return np.unique(np.concatenate(chunks))
+
+def save_fingerprints(fingerprint_chunks, fingerprint_path):
+    """Merges the sorted fingerprint chunks and persists them next to the master data."""
+    merged = np.unique(np.concatenate(fingerprint_chunks)) if fingerprint_chunks else np.array([], dtype='uint64')
+    np.save(fingerprint_path, merged)
+    print(f"Saved {len(merged)} row fingerprints to {fingerprint_path}")
+
+def load_ingest_log(log_path):
+    """Returns {filename: {'size', 'mtime'}} for every CSV already in the master data."""
+    if not os.path.exists(log_path):
+        return {}
+    with open(log_path) as f:
+        return json.load(f)
+
+def save_ingest_log(ingest_log, file_list, log_path):
+    """Records the given CSVs (by size and mtime) as ingested."""
+    for f in file_list:
+        stat = os.stat(f)
+        ingest_log[os.path.basename(f)] = {'size': stat.st_size, 'mtime': stat.st_mtime}
+    with open(log_path, 'w') as out:
+        json.dump(ingest_log, out, indent=2, sort_keys=True)
+
+def find_new_files(file_list, ingest_log):
+    """Returns the CSVs that are not in the ingest log or have changed since they were ingested."""
+    new_files = []
+    for f in file_list:
+        entry = ingest_log.get(os.path.basename(f))
+        stat = os.stat(f)
+        if entry is None or entry['size'] != stat.st_size or entry['mtime'] != stat.st_mtime:
+            new_files.append(f)
+    return new_files
+
+def encode_transfers(df, token_map, address_index):
+    """
+    Converts cleaned raw transfers to the compact master schema: int32 address
+    ids (new addresses are added to address_index), a categorical token_name
+    and int64 epoch-second timestamps.
+    """
+    if pd.api.types.is_datetime64_any_dtype(df['time_stamp']):
+        df['time_stamp'] = df['time_stamp'].astype('int64') // 10**9
+    else:
+        df['time_stamp'] = df['time_stamp'].astype('int64')
+    df['token_name'] = pd.Categorical(map_tokens(df['contract_address'], token_map), categories=TOKEN_NAMES)
+    df['from_id'] = encode_addresses(df['from_address'], address_index)
+    df['to_id'] = encode_addresses(df['to_address'], address_index)
+    return df[MASTER_SCHEMA.names]
+
+def clean_and_enrich_data(df, token_map, address_index):
+    """
+    Performs cleaning and enrichment on the combined DataFrame.
+    Returns the cleaned frame (compact schema) and the sorted fingerprints of its rows.
+    """
     print("\n--- Starting Data Cleaning and Enrichment ---")
     
     initial_rows = len(df)
-    subset_cols = ['block_number', 'transaction_index', 'from_address', 'to_address', 'contract_address', 'value']
-    df.drop_duplicates(subset=subset_cols, inplace=True)
-    final_rows = len(df)
+    with stage('dedup', rows_in=initial_rows) as record:
+        df, fingerprints = drop_duplicate_fingerprints(df)
+        record['rows_out'] = final_rows = len(df)
     print(f"Dropped {initial_rows - final_rows} duplicate rows. Final row count: {final_rows}")
 
-    print("Converting 'time_stamp' to datetime objects...")
-    df['time_stamp'] = pd.to_datetime(df['time_stamp'], unit='s')
-
-    print("Mapping 'contract_address' to 'token_name'...")
-    df['token_name'] = df['contract_address'].map(token_map)
+    print("Mapping 'contract_address' to 'token_name' and encoding addresses as integer ids...")
+    with stage('encode', rows_in=len(df)):
+        df = encode_transfers(df, token_map, address_index)
+    print(f"Address dictionary holds {len(address_index)} addresses.")
     
     unmapped_count = df['token_name'].isnull().sum()
     if unmapped_count > 0:
         print(f"Warning: Found {unmapped_count} rows with unmapped contract addresses.")
     
     print("Sorting data by timestamp...")
-    df.sort_values(by='time_stamp', inplace=True)
+    with stage('sort', rows_in=len(df)):
+        df = df.sort_values(by='time_stamp')
 
     print("\n--- Data Cleaning Complete ---")
     print("Data summary:")
-    print(f"Date range: {df['time_stamp'].min()} to {df['time_stamp'].max()}")
+    print(f"Date range: {pd.to_datetime(df['time_stamp'].min(), unit='s')} to {pd.to_datetime(df['time_stamp'].max(), unit='s')}")
     print("Token counts:")
     print(df['token_name'].value_counts(dropna=False)) 
     
-    return df
+    return df, fingerprints
+
+def clean_batch(df, token_map, seen_chunks, address_index):
+    """
+    Cleans and enriches a single batch of raw transfers.
+    Rows already seen in this or earlier batches (or in the existing master) are dropped.
+    Returns the cleaned batch (compact schema) and the sorted fingerprints of its rows.
+    """
+    with stage('dedup', rows_in=len(df)) as record:
+        df, fingerprints = drop_duplicate_fingerprints(df, seen_chunks)
+        record['rows_out'] = len(df)
+    with stage('encode', rows_in=len(df)):
+        df = encode_transfers(df, token_map, address_index)
+        df = df.sort_values(by='time_stamp')
+    return df, fingerprints
+
+def write_partitions(df, output_path, piece_name):
+    """
+    Writes a cleaned frame into the hive-partitioned master (date=YYYY-MM-DD/token=...),
+    one file named piece_name per touched partition. Returns the touched partition dirs.
+    """
+    days = df['time_stamp'] // 86400
+    tokens = df['token_name'].astype(object).fillna(UNMAPPED_TOKEN)
+    touched = []
+    for (day, token), part_df in df.groupby([days, tokens], sort=False):
+        date_str = pd.Timestamp(day * 86400, unit='s').strftime('%Y-%m-%d')
+        part_dir = os.path.join(output_path, f"date={date_str}", f"token={token}")
+        os.makedirs(part_dir, exist_ok=True)
+        table = pa.Table.from_pandas(part_df, schema=MASTER_SCHEMA, preserve_index=False)
+        pq.write_table(table, os.path.join(part_dir, f"{piece_name}.parquet"), row_group_size=ROW_GROUP_SIZE)
+        touched.append(part_dir)
+    return touched
+
+def publish_staged(staging_path, output_path):
+    """
+    Moves the pieces written under staging_path into the same date/token
+    partitions of the master and removes the staging directory. Returns the
+    touched partition dirs.
+    """
+    touched = []
+    for piece in sorted(glob.glob(os.path.join(staging_path, 'date=*', 'token=*', '*.parquet'))):
+        part_dir = os.path.join(output_path, os.path.relpath(os.path.dirname(piece), staging_path))
+        os.makedirs(part_dir, exist_ok=True)
+        os.replace(piece, os.path.join(part_dir, os.path.basename(piece)))
+        touched.append(part_dir)
+    shutil.rmtree(staging_path, ignore_errors=True)
+    return touched
+
+def compact_partitions(partition_dirs):
+    """
+    Merges the pieces of each partition into a single time-sorted part-0.parquet.
+    Only one date/token partition is held in memory at a time.
+    """
+    for part_dir in sorted(set(partition_dirs)):
+        pieces = sorted(glob.glob(os.path.join(part_dir, '*.parquet')))
+        if len(pieces) == 1 and os.path.basename(pieces[0]) == 'part-0.parquet':
+            continue
+        table = pa.concat_tables([pq.read_table(p, schema=MASTER_SCHEMA) for p in pieces])
+        table = table.sort_by('time_stamp')
+        tmp_path = os.path.join(part_dir, 'part-0.parquet.tmp')
+        pq.write_table(table, tmp_path, row_group_size=ROW_GROUP_SIZE)
+        for p in pieces:
+            os.remove(p)
+        os.rename(tmp_path, os.path.join(part_dir, 'part-0.parquet'))
+
+def migrate_to_partitioned(output_path, address_index, token_map=TOKEN_MAP, batch_size=BATCH_SIZE):
+    """
+    Rewrites a legacy master (single file, flat, or string-address partitions)
+    into the compact date/token partitioned layout, batch by batch.
+    """
+    if not os.path.exists(output_path) or (is_partitioned(output_path) and is_compact(output_path)):
+        return
+    print(f"Migrating legacy master at {output_path} to the compact date/token partitioned layout...")
+    legacy_path = output_path + '.legacy'
+    os.rename(output_path, legacy_path)
+    os.makedirs(output_path)
+
+    touched = []
+    legacy = ds.dataset(legacy_path, format='parquet', partitioning='hive')
+    for j, batch in enumerate(legacy.to_batches(columns=LEGACY_COLUMNS, batch_size=batch_size)):
+        df = encode_transfers(batch.to_pandas(), token_map, address_index)
+        touched += write_partitions(df, output_path, f"batch-legacy-{j:05d}")
+    compact_partitions(touched)
 
-def main():
+    if os.path.isdir(legacy_path):
+        shutil.rmtree(legacy_path)
+    else:
+        os.remove(legacy_path)
+
+def stream_ingest(file_list, token_map, output_path, batch_size=BATCH_SIZE, append=False):
+    """
+    Streams each CSV in fixed-size batches, cleans every batch and writes it
+    into the date/token partitioned master; the touched partitions are then
+    compacted into one time-sorted file each. Peak memory is bounded by
+    batch_size (or the largest single partition) rather than by the dataset
+    size; only the 8-byte row fingerprints are kept across batches.
+
+    Each file is written to a staging directory next to the master and its
+    pieces are moved into the partitions only once the whole file has been
+    read. A file that fails partway leaves no rows, fingerprints or address
+    ids behind and stays out of the ingest log, so a rerun ingests it again
+    from the start.
+
+    With append=True the existing master is kept, and only rows whose
+    fingerprint is not already in the persisted set are added.
+    """
+    print(f"Found {len(file_list)} transaction files to stream (batch size: {batch_size:,} rows).")
+
+    fingerprint_path = os.path.join(os.path.dirname(output_path), FINGERPRINT_FILENAME)
+    log_path = os.path.join(os.path.dirname(output_path), INGEST_LOG_FILENAME)
+    address_dict_path = os.path.join(os.path.dirname(output_path), ADDRESS_DICT_FILENAME)
+    staging_path = output_path + '.staging'
+    shutil.rmtree(staging_path, ignore_errors=True)  # Left over from an interrupted run.
+
+    if append:
+        seen_chunks = [load_fingerprints(fingerprint_path, output_path, batch_size)]
+        ingest_log = load_ingest_log(log_path)
+        address_index = build_address_index(load_address_table(address_dict_path))
+        migrate_to_partitioned(output_path, address_index, token_map, batch_size)
+        os.makedirs(output_path, exist_ok=True)
+        print(f"Appending to existing master with {len(seen_chunks[0])} known rows "
+              f"and {len(address_index)} known addresses.")
+    else:
+        seen_chunks = []
+        ingest_log = {}
+        address_index = {}
+        if os.path.isdir(output_path):
+            shutil.rmtree(output_path)
+        elif os.path.exists(output_path):
+            os.remove(output_path)
+        os.makedirs(output_path)
+
+    stats = {'rows_in': 0, 'rows_out': 0, 'unmapped': 0, 'min_ts': None, 'max_ts': None}
+    token_counts = pd.Series(dtype='int64')
+    touched = []
+    ingested_files = []
+
+    for i, f in enumerate(sorted(file_list)):
+        # Reuse the validation scan of an unchanged file: its warnings, and its parsed copy if one was kept.
+        scanned = cached_stats(f)
+        if scanned is not None and (sum(scanned['nulls'].values()) or sum(scanned['malformed'].values())):
+            print(f"   Warning: validation found {sum(scanned['nulls'].values())} null and "
+                  f"{sum(scanned['malformed'].values())} malformed values in {os.path.basename(f)}.")
+        if scanned is not None and scanned['parsed'] and os.path.exists(scanned['parsed']):
+            print(f"-> Streaming {os.path.basename(f)} (parsed copy from validation)...")
+            source = parsed_batches(scanned, batch_size)
+        else:
+            print(f"-> Streaming {os.path.basename(f)}...")
+            source = pd.read_csv(f, chunksize=batch_size)
+        saved = dict(stats), token_counts, len(address_index)
+        file_chunks = []
+        try:
+            batches = timed_batches(source, 'parse_csv', file=os.path.basename(f))
+            for j, batch in enumerate(batches):
+                stats['rows_in'] += len(batch)
+                batch, fingerprints = clean_batch(batch, token_map, seen_chunks + file_chunks, address_index)
+                if batch.empty:
+                    continue
+
+                file_chunks.append(fingerprints)
+                if len(file_chunks) > MAX_SEEN_CHUNKS:
+                    file_chunks = [np.concatenate(file_chunks)]
+                    file_chunks[0].sort()
+
+                with stage('write_partitions', rows_in=len(batch)):
+                    write_partitions(batch, staging_path, f"batch-{i:05d}-{j:05d}")
+
+                stats['rows_out'] += len(batch)
+                stats['unmapped'] += int(batch['token_name'].isnull().sum())
+                batch_min, batch_max = batch['time_stamp'].iloc[0], batch['time_stamp'].iloc[-1]
+                stats['min_ts'] = batch_min if stats['min_ts'] is None else min(stats['min_ts'], batch_min)
+                stats['max_ts'] = batch_max if stats['max_ts'] is None else max(stats['max_ts'], batch_max)
+                token_counts = token_counts.add(batch['token_name'].value_counts(dropna=False), fill_value=0)
+        except Exception as e:
+            print(f"   Error streaming {f}: {e}; its rows were discarded and it will be read again next run.")
+            shutil.rmtree(staging_path, ignore_errors=True)
+            stats, token_counts, n_addresses = saved
+            for address in list(address_index)[n_addresses:]:
+                del address_index[address]
+            continue
+
+        touched += publish_staged(staging_path, output_path)
+        seen_chunks += file_chunks
+        if len(seen_chunks) > MAX_SEEN_CHUNKS:
+            seen_chunks = [np.concatenate(seen_chunks)]
+            seen_chunks[0].sort()
+        ingested_files.append(f)
+
+    print(f"Compacting {len(set(touched))} date/token partitions...")
+    with stage('compact_partitions', partitions=len(set(touched))):
+        compact_partitions(touched)
+    save_address_table(list(address_index), address_dict_path)
+    save_fingerprints(seen_chunks, fingerprint_path)
+    save_ingest_log(ingest_log, ingested_files, log_path)
+
+    if stats['rows_out'] == 0:
+        print("No new rows were written.")
+        return None
+
+    print("\n--- Streaming Ingest Complete ---")
+    print(f"Rows read: {stats['rows_in']}, rows written: {stats['rows_out']} "
+          f"({stats['rows_in'] - stats['rows_out']} duplicates dropped)")
+    if stats['unmapped'] > 0:
+        print(f"Warning: Found {stats['unmapped']} rows with unmapped contract addresses.")
+    print(f"Address dictionary holds {len(address_index)} addresses.")
+    print(f"Date range: {pd.to_datetime(stats['min_ts'], unit='s')} to {pd.to_datetime(stats['max_ts'], unit='s')}")
+    print("Token counts:")
+    print(token_counts.astype('int64'))
+
+    return stats
+
+def main(stream=False, batch_size=BATCH_SIZE, append=False):
     """Main execution function."""
     start_time = time.time()
     print("===== Phase 1: Data Unification and Preprocessing =====")
 
-    raw_df = load_and_combine_data(TRANSACTION_FILES)
-    
-    if raw_df is None:
-        return
+    output_path = os.path.join(OUTPUT_DIR, OUTPUT_FILENAME)
 
-    master_df = clean_and_enrich_data(raw_df, TOKEN_MAP)
+    if append:
+        ingest_log = load_ingest_log(os.path.join(OUTPUT_DIR, INGEST_LOG_FILENAME))
+        new_files = find_new_files(TRANSACTION_FILES, ingest_log)
+        if not new_files:
+            print("No new or changed transaction files to append.")
+            return
+        if stream_ingest(new_files, TOKEN_MAP, output_path, batch_size, append=True) is None:
+            return
+    elif stream:
+        if stream_ingest(TRANSACTION_FILES, TOKEN_MAP, output_path, batch_size) is None:
+            return
+    else:
+        raw_df = load_and_combine_data(TRANSACTION_FILES)
 
-    output_path = os.path.join(OUTPUT_DIR, OUTPUT_FILENAME)
-    print(f"\nSaving cleaned master data to: {output_path}")
-    master_df.to_parquet(output_path, index=False)
+        if raw_df is None:
+            return
+
+        address_index = {}
+        master_df, fingerprints = clean_and_enrich_data(raw_df, TOKEN_MAP, address_index)
+
+        if os.path.isdir(output_path):
+            shutil.rmtree(output_path)
+        elif os.path.exists(output_path):
+            os.remove(output_path)
+        print(f"\nSaving cleaned master data to date/token partitions under: {output_path}")
+        with stage('write_partitions', rows_in=len(master_df)):
+            write_partitions(master_df, output_path, 'part-0')
+        save_address_table(list(address_index), os.path.join(OUTPUT_DIR, ADDRESS_DICT_FILENAME))
+        save_fingerprints([fingerprints], os.path.join(OUTPUT_DIR, FINGERPRINT_FILENAME))
+        save_ingest_log({}, TRANSACTION_FILES, os.path.join(OUTPUT_DIR, INGEST_LOG_FILENAME))
     
     end_time = time.time()
     print("\n===== Preprocessing Complete! =====")
@@ -95,5 +484,18 @@ def main():
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Unify and clean the raw token transfer CSVs.")
+    parser.add_argument('--stream', action='store_true',
+                        help="Stream the CSVs in bounded-memory batches into a Parquet dataset.")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                        help="Rows per batch in streaming mode.")
+    parser.add_argument('--append', action='store_true',
+                        help="Stream only new or changed CSVs and de-duplicate them against the existing master.")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    if args.profile:
+        enable_run_log()
+
     os.makedirs(OUTPUT_DIR, exist_ok=True)
-    main()
\ No newline at end of file
+    with stage('load', mode='append' if args.append else 'stream' if args.stream else 'full'):
+        main(stream=args.stream, batch_size=args.batch_size, append=args.append)
\ No newline at end of file
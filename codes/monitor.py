@@ -0,0 +1,384 @@
+import pandas as pd
+import numpy as np
+import os
+import io
+import glob
+import json
+import time
+import argparse
+from collections import deque
+
+from load import TOKEN_MAP, fingerprint_rows, is_seen
+from prices import PRICE_FILES, load_candles, value_buckets
+from dataset import stat_signature, map_tokens
+
+FEED_PATTERNS = [os.path.join('data', 'token_transfers*.csv')]
+MONITOR_DIR = os.path.join('report', 'monitor')
+SNAPSHOT_FILENAME = 'snapshot.json'
+SNAPSHOT_LOG_FILENAME = 'snapshots.jsonl'
+
+BUCKET_SECONDS = 60
+RETAIN_BUCKETS = 120  # Buckets kept per token; older ones are dropped, so memory does not grow with the feed.
+SNAPSHOT_SECONDS = 10
+POLL_SECONDS = 1.0
+READ_BYTES = 64 << 20  # Most bytes read from one file per poll.
+HLL_PRECISION = 12  # 2**12 registers per sketch: about 1.6% standard error on distinct counts.
+CMS_DEPTH, CMS_WIDTH = 4, 1024  # Count-Min rows and counters per row (a power of two).
+TOP_K = 10
+SPIKE_RATIO = 5.0  # A closed bucket is a spike when its USD volume is this many times the trailing median.
+SPIKE_MIN_BUCKETS = 10  # Trailing buckets needed before spikes are reported.
+DEDUP_WINDOW = 1_000_000  # Recent row fingerprints kept to drop rows exported twice.
+DEDUP_GENERATIONS = 4
+MAX_ALERTS = 100
+
+# Multiply-shift hashing: each Count-Min row mixes the 64-bit address hash
+# with its own odd multiplier.
+CMS_MULTIPLIERS = np.array([0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0xD6E8FEB86659FD93,
+                            0xFF51AFD7ED558CCD, 0xC4CEB9FE1A85EC53, 0x94D049BB133111EB, 0xBF58476D1CE4E5B9],
+                           dtype=np.uint64)
+
+
+def hash_addresses(addresses):
+    """Stable 64-bit hashes of hex addresses (case-insensitive)."""
+    return pd.util.hash_array(pd.Series(addresses, dtype=object).str.lower().to_numpy())
+
+def bit_length(values):
+    """Number of significant bits of each uint64 (0 for 0), exactly, by binary search over the shifts."""
+    values = values.copy()
+    length = np.zeros(len(values), dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        high = values >= np.uint64(1 << shift)
+        length[high] += shift
+        values[high] >>= np.uint64(shift)
+    return length + (values > 0)
+
+def hll_add(registers, hashes, precision=HLL_PRECISION):
+    """
+    HyperLogLog update: the top `precision` bits of a hash pick a register,
+    which keeps the largest position of the first 1-bit in the rest.
+    """
+    rest_bits = 64 - precision
+    index = (hashes >> np.uint64(rest_bits)).astype(np.int64)
+    rest = hashes & np.uint64((1 << rest_bits) - 1)
+    rank = (rest_bits - bit_length(rest) + 1).astype(np.uint8)
+    np.maximum.at(registers, index, rank)
+
+def hll_count(registers):
+    """HyperLogLog estimate of the distinct items added, with linear counting for small sets."""
+    m = len(registers)
+    estimate = 0.7213 / (1 + 1.079 / m) * m * m / np.sum(np.ldexp(1.0, -registers.astype(np.int64)))
+    zeros = int(np.count_nonzero(registers == 0))
+    if estimate <= 2.5 * m and zeros:
+        estimate = m * np.log(m / zeros)
+    return int(round(estimate))
+
+def cms_columns(hashes, depth=CMS_DEPTH, width=CMS_WIDTH):
+    """Counter of every hash in every Count-Min row, shape (depth, len(hashes))."""
+    shift = np.uint64(64 - int(np.log2(width)))
+    return np.stack([(hashes * CMS_MULTIPLIERS[row]) >> shift for row in range(depth)]).astype(np.int64)
+
+def cms_add(table, hashes, weights):
+    """Adds weights to the Count-Min counters of the hashes."""
+    columns = cms_columns(hashes, *table.shape)
+    for row in range(table.shape[0]):
+        np.add.at(table[row], columns[row], weights)
+
+def cms_estimate(table, hashes):
+    """Count-Min estimates: the smallest counter over the rows, never below the true total."""
+    columns = cms_columns(hashes, *table.shape)
+    return np.min([table[row][columns[row]] for row in range(table.shape[0])], axis=0)
+
+def new_sketch(precision=HLL_PRECISION, depth=CMS_DEPTH, width=CMS_WIDTH):
+    """Constant-size state of one (bucket, token): running sums, distinct addresses and top senders."""
+    return {'transfers': 0, 'value': 0.0, 'usd': 0.0,
+            'hll': np.zeros(1 << precision, dtype=np.uint8),
+            'cms': np.zeros((depth, width), dtype=np.float64),
+            'top': {}}  # hash -> address of the current heavy-hitter candidates
+
+def update_sketch(sketch, rows, top_k=TOP_K):
+    """
+    Adds a bucket's transfers of one token ({column: array}) to its sketch.
+    Senders are weighted by USD outflow in the Count-Min sketch; the top_k
+    candidates with the largest estimates are kept as the heavy hitters.
+    """
+    sketch['transfers'] += len(rows['usd_value'])
+    sketch['value'] += float(rows['value'].sum())
+    sketch['usd'] += float(rows['usd_value'].sum())
+    hll_add(sketch['hll'], np.concatenate([rows['from_hash'], rows['to_hash']]))
+
+    senders, first, inverse = np.unique(rows['from_hash'], return_index=True, return_inverse=True)
+    cms_add(sketch['cms'], senders, np.bincount(inverse, weights=rows['usd_value']))
+    addresses = dict(zip(senders.tolist(), rows['from_address'][first]))
+    addresses.update(sketch['top'])
+    candidates = np.array(list(addresses), dtype=np.uint64)
+    keep = np.argsort(-cms_estimate(sketch['cms'], candidates), kind='stable')[:top_k]
+    sketch['top'] = {h: addresses[h] for h in candidates[keep].tolist()}
+
+def top_senders(sketch):
+    """The heavy-hitter senders of a sketch with their estimated USD outflow, largest first."""
+    if not sketch['top']:
+        return []
+    estimates = cms_estimate(sketch['cms'], np.array(list(sketch['top']), dtype=np.uint64))
+    return sorted(zip(sketch['top'].values(), estimates.tolist()), key=lambda item: -item[1])
+
+def new_monitor(bucket_seconds=BUCKET_SECONDS, retain=RETAIN_BUCKETS):
+    """All the state of a monitor run; its size is bounded by retain, not by the rows read."""
+    return {'bucket_seconds': bucket_seconds, 'retain': retain,
+            'sketches': {},  # (bucket start, token) -> sketch
+            'newest': None, 'first': None, 'checked': None,
+            'offsets': {},  # path -> (bytes consumed, header line)
+            'seen': deque(maxlen=DEDUP_GENERATIONS), 'current_seen': np.array([], dtype=np.uint64),
+            'candles': None, 'price_signature': None,
+            'alerts': deque(maxlen=MAX_ALERTS),
+            'rows': 0, 'duplicates': 0, 'unmapped': 0, 'late': 0}
+
+def read_new_rows(path, offsets, max_bytes=READ_BYTES):
+    """
+    Reads the complete lines appended to a CSV file since the last call.
+    A file that shrank is assumed to have been replaced and is read again
+    from the start. Returns a raw DataFrame (possibly empty).
+    """
+    size = os.path.getsize(path)
+    offset, header = offsets.get(path, (0, None))
+    if size < offset:
+        offset, header = 0, None
+    if size == offset:
+        return pd.DataFrame()
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        data = f.read(max_bytes)
+    end = data.rfind(b'\n') + 1  # A partly written last line waits for the next poll.
+    if end == 0:
+        return pd.DataFrame()
+    data = data[:end]
+    if header is None:
+        header_end = data.find(b'\n') + 1
+        header, data = data[:header_end], data[header_end:]
+    offsets[path] = (offset + end, header)
+    if not data:
+        return pd.DataFrame()
+    return pd.read_csv(io.BytesIO(header + data))
+
+def skip_existing(paths, offsets):
+    """Starts tailing files at their current end: only rows appended from now on are read."""
+    for path in paths:
+        if path in offsets:
+            continue
+        with open(path, 'rb') as f:
+            header = f.readline()
+            f.seek(0, os.SEEK_END)
+            offsets[path] = (max(f.tell(), len(header)), header or None)
+
+def drop_recent_duplicates(df, monitor):
+    """
+    Drops rows already read within the last DEDUP_WINDOW rows, such as the
+    overlap between consecutive exports, keeping the fingerprints in a few
+    sorted generations so the oldest can be forgotten.
+    """
+    fingerprints = fingerprint_rows(df)
+    keep = ~pd.Series(fingerprints).duplicated().to_numpy()
+    keep &= ~is_seen(fingerprints, list(monitor['seen']) + [monitor['current_seen']])
+    monitor['current_seen'] = np.union1d(monitor['current_seen'], fingerprints[keep])
+    if len(monitor['current_seen']) >= DEDUP_WINDOW // DEDUP_GENERATIONS:
+        monitor['seen'].append(monitor['current_seen'])
+        monitor['current_seen'] = np.array([], dtype=np.uint64)
+    monitor['duplicates'] += int((~keep).sum())
+    return df[keep]
+
+def refresh_candles(monitor, price_files=PRICE_FILES):
+    """Reloads the price candles when a price file changed, so new candles reach the live valuation."""
+    files = [path for path in price_files.values() if os.path.exists(path)]
+    signature = stat_signature(files)
+    if signature != monitor['price_signature']:
+        monitor['candles'] = load_candles(price_files)
+        monitor['price_signature'] = signature
+    return monitor['candles']
+
+def prepare_rows(df, monitor, token_map=TOKEN_MAP):
+    """
+    Turns raw CSV rows into priced transfers of the mapped tokens:
+    (bucket, token_name, value, usd_value, from_address, from_hash, to_hash),
+    sorted by time.
+    """
+    df = drop_recent_duplicates(df, monitor)
+    token_names = map_tokens(df['contract_address'], token_map)
+    monitor['unmapped'] += int(token_names.isna().sum())
+    df = df.assign(token_name=token_names)[token_names.notna()]
+    if pd.api.types.is_numeric_dtype(df['time_stamp']):
+        time_stamps = df['time_stamp'].astype(np.int64)
+    else:
+        time_stamps = pd.to_datetime(df['time_stamp']).astype('datetime64[s]').astype(np.int64)
+    rows = pd.DataFrame({
+        'time': pd.to_datetime(time_stamps.to_numpy(), unit='s'),
+        'bucket': time_stamps.to_numpy() // monitor['bucket_seconds'] * monitor['bucket_seconds'],
+        'token_name': df['token_name'].to_numpy(),
+        'value': df['value'].to_numpy(dtype=np.float64),
+        'from_address': df['from_address'].str.lower().to_numpy(),
+        'from_hash': hash_addresses(df['from_address']),
+        'to_hash': hash_addresses(df['to_address']),
+    })
+    return value_buckets(rows, monitor['candles'])
+
+def bucket_usd(monitor, bucket, token):
+    """USD volume of a token in a held bucket (0 if it had no transfers)."""
+    sketch = monitor['sketches'].get((bucket, token))
+    return sketch['usd'] if sketch else 0.0
+
+def check_bucket(monitor, bucket, spike_ratio=SPIKE_RATIO, min_buckets=SPIKE_MIN_BUCKETS):
+    """
+    Compares a bucket that just closed with the trailing buckets still held
+    (empty buckets count as zero volume) and records an alert for every
+    token whose USD volume is at least spike_ratio times the trailing median.
+    """
+    step = monitor['bucket_seconds']
+    history = [b for b in range(bucket - step * (monitor['retain'] - 1), bucket, step) if b >= monitor['first']]
+    if len(history) < min_buckets:
+        return []
+    alerts = []
+    for (b, token), sketch in list(monitor['sketches'].items()):
+        if b != bucket:
+            continue
+        baseline = float(np.median([bucket_usd(monitor, h, token) for h in history]))
+        if baseline > 0 and sketch['usd'] >= spike_ratio * baseline:
+            alert = {'bucket': pd.to_datetime(bucket, unit='s').isoformat(), 'token': token,
+                     'usd': sketch['usd'], 'baseline_usd': baseline, 'ratio': sketch['usd'] / baseline,
+                     'transfers': sketch['transfers'], 'active_addresses': hll_count(sketch['hll']),
+                     'top_senders': top_senders(sketch)[:3]}
+            alerts.append(alert)
+            monitor['alerts'].append(alert)
+            print(f"[ALERT] {alert['bucket']} {token}: ${alert['usd']:,.0f} in {step} s, "
+                  f"{alert['ratio']:.1f}x the trailing median (${baseline:,.0f}); "
+                  f"top sender {alert['top_senders'][0][0] if alert['top_senders'] else '-'}")
+    return alerts
+
+def advance(monitor, bucket, spike_ratio=SPIKE_RATIO):
+    """
+    Moves the monitor to a newer bucket: checks the buckets that closed and
+    drops the ones that fell out of the retained window.
+    """
+    step = monitor['bucket_seconds']
+    if monitor['newest'] is None:
+        monitor['newest'] = monitor['first'] = monitor['checked'] = bucket
+        return
+    if bucket <= monitor['newest']:
+        return
+    closed = sorted(b for b, _ in monitor['sketches'] if monitor['checked'] <= b < bucket)
+    for b in dict.fromkeys(closed):
+        check_bucket(monitor, b, spike_ratio)
+    monitor['newest'], monitor['checked'] = bucket, bucket
+    oldest = bucket - step * (monitor['retain'] - 1)
+    for key in [key for key in monitor['sketches'] if key[0] < oldest]:
+        del monitor['sketches'][key]
+
+def process_rows(monitor, rows, spike_ratio=SPIKE_RATIO, top_k=TOP_K):
+    """Feeds priced transfers to the sketches one bucket at a time, in time order."""
+    monitor['rows'] += len(rows)
+    if len(rows) == 0:  # e.g. a poll of only duplicates or unmapped tokens
+        return
+    step = monitor['bucket_seconds']
+    token_codes, token_names = pd.factorize(rows['token_name'])
+    key = rows['bucket'].to_numpy() // step * len(token_names) + token_codes
+    order = np.argsort(key, kind='stable')
+    key = key[order]
+    columns = {name: rows[name].to_numpy()[order] for name in
+               ['bucket', 'value', 'usd_value', 'from_address', 'from_hash', 'to_hash']}
+    bounds = np.concatenate([[0], np.flatnonzero(np.diff(key)) + 1, [len(key)]])
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        bucket, token = int(columns['bucket'][start]), token_names[token_codes[order[start]]]
+        advance(monitor, bucket, spike_ratio)
+        if bucket < monitor['newest'] - step * (monitor['retain'] - 1):
+            monitor['late'] += int(end - start)  # Older than every bucket still held.
+            continue
+        sketch = monitor['sketches'].setdefault((bucket, token), new_sketch())
+        update_sketch(sketch, {name: values[start:end] for name, values in columns.items()}, top_k)
+
+def snapshot(monitor):
+    """The current state as plain data: per token, the newest bucket against its trailing median."""
+    snap = {'created': pd.Timestamp.now().isoformat(timespec='seconds'), 'rows': monitor['rows'],
+            'duplicates': monitor['duplicates'], 'unmapped': monitor['unmapped'], 'late': monitor['late'],
+            'bucket_seconds': monitor['bucket_seconds'], 'tokens': {}, 'alerts': list(monitor['alerts'])[-10:]}
+    if monitor['newest'] is None:
+        return snap
+    step, newest = monitor['bucket_seconds'], monitor['newest']
+    snap['newest_bucket'] = pd.to_datetime(newest, unit='s').isoformat()
+    history = [b for b in range(newest - step * (monitor['retain'] - 1), newest, step) if b >= monitor['first']]
+    registers = [s['hll'] for (b, _), s in monitor['sketches'].items() if b == newest]
+    snap['active_addresses'] = hll_count(np.maximum.reduce(registers)) if registers else 0
+    for token in sorted({t for _, t in monitor['sketches']}):
+        sketch = monitor['sketches'].get((newest, token)) or new_sketch()
+        baseline = float(np.median([bucket_usd(monitor, b, token) for b in history])) if history else 0.0
+        snap['tokens'][token] = {
+            'transfers': sketch['transfers'], 'value': sketch['value'], 'usd': sketch['usd'],
+            'baseline_usd': baseline, 'ratio': sketch['usd'] / baseline if baseline > 0 else None,
+            'active_addresses': hll_count(sketch['hll']), 'top_senders': top_senders(sketch)[:3]}
+    return snap
+
+def emit_snapshot(snap, output_dir=MONITOR_DIR):
+    """Replaces the latest snapshot file, appends it to the snapshot log and prints a summary."""
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, SNAPSHOT_FILENAME)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(snap, f, indent=2, default=str)
+    os.replace(path + '.tmp', path)
+    with open(os.path.join(output_dir, SNAPSHOT_LOG_FILENAME), 'a') as f:
+        f.write(json.dumps(snap, default=str) + '\n')
+
+    print(f"\n[{snap['created']}] bucket {snap.get('newest_bucket', '-')}: {snap['rows']:,} rows read, "
+          f"{snap.get('active_addresses', 0):,} active addresses")
+    if snap['tokens']:
+        table = pd.DataFrame.from_dict(snap['tokens'], orient='index')
+        table['top_sender'] = [s[0][0] if s else '' for s in table['top_senders']]
+        print(table[['transfers', 'usd', 'baseline_usd', 'ratio', 'active_addresses', 'top_sender']]
+              .to_string(float_format=lambda x: f"{x:,.1f}"))
+
+def run_monitor(patterns=FEED_PATTERNS, from_start=False, once=False, bucket_seconds=BUCKET_SECONDS,
+                retain=RETAIN_BUCKETS, snapshot_seconds=SNAPSHOT_SECONDS, spike_ratio=SPIKE_RATIO,
+                top_k=TOP_K, output_dir=MONITOR_DIR, poll_seconds=POLL_SECONDS):
+    """
+    Tails the CSV files matching the patterns (new files are picked up as
+    they appear) and emits a snapshot every snapshot_seconds. With once=True
+    it reads everything available, emits one snapshot and returns it.
+    """
+    monitor = new_monitor(bucket_seconds, retain)
+    if not from_start:
+        skip_existing(sorted({p for pattern in patterns for p in glob.glob(pattern)}), monitor['offsets'])
+    last_snapshot = time.time()
+    while True:
+        refresh_candles(monitor)
+        read_any = False
+        for path in sorted({p for pattern in patterns for p in glob.glob(pattern)}):
+            df = read_new_rows(path, monitor['offsets'])
+            if len(df):
+                read_any = True
+                process_rows(monitor, prepare_rows(df, monitor), spike_ratio, top_k)
+        if once and not read_any:
+            snap = snapshot(monitor)
+            emit_snapshot(snap, output_dir)
+            return snap
+        if time.time() - last_snapshot >= snapshot_seconds:
+            emit_snapshot(snapshot(monitor), output_dir)
+            last_snapshot = time.time()
+        if not read_any:
+            time.sleep(poll_seconds)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tail transfer CSVs and report live volume, activity and heavy hitters.")
+    parser.add_argument('--files', nargs='+', default=FEED_PATTERNS,
+                        help="CSV files or glob patterns to tail (export files or an append-only feed).")
+    parser.add_argument('--from-start', action='store_true', help="Read the files from the beginning instead of their end.")
+    parser.add_argument('--once', action='store_true', help="Read what is available, emit one snapshot and exit.")
+    parser.add_argument('--bucket-seconds', type=int, default=BUCKET_SECONDS)
+    parser.add_argument('--retain', type=int, default=RETAIN_BUCKETS, help="Buckets kept for the trailing baseline.")
+    parser.add_argument('--snapshot-seconds', type=float, default=SNAPSHOT_SECONDS)
+    parser.add_argument('--spike-ratio', type=float, default=SPIKE_RATIO)
+    parser.add_argument('--top-k', type=int, default=TOP_K)
+    parser.add_argument('--output-dir', default=MONITOR_DIR)
+    args = parser.parse_args()
+
+    print(f"Tailing {', '.join(args.files)} ({args.bucket_seconds} s buckets, snapshots every {args.snapshot_seconds} s)...")
+    try:
+        run_monitor(args.files, args.from_start, args.once, args.bucket_seconds, args.retain, args.snapshot_seconds,
+                    args.spike_ratio, args.top_k, args.output_dir)
+    except KeyboardInterrupt:
+        print("\nStopped.")
@@ -0,0 +1,245 @@
+import os
+import re
+import sys
+import json
+import glob
+import fnmatch
+import time
+import hashlib
+import subprocess
+import argparse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from dataset import content_hash
+from profiling import add_profile_argument, enable_run_log, run_id
+
+CODE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_PATH = os.path.join('data', 'processed', 'pipeline_state.json')
+LOG_DIR = os.path.join('report', 'pipeline_logs')
+JOBS = 2  # Stages run at the same time; each stage still uses its own worker pool.
+
+MASTER = os.path.join('data', 'master_transfers.parquet')
+ADDRESSES = os.path.join('data', 'address_dictionary.parquet')
+PRICES = os.path.join('data', 'price_data')
+GRAPHS = os.path.join('data', 'processed', 'daily_graphs')
+FLOW_INDEX = os.path.join('data', 'processed', 'flow_index.arrow')
+SCAN_CACHE = os.path.join('data', 'processed', 'validation_cache.json')
+DAILY_METRICS_CSV = os.path.join('report', 'daily_metrics.csv')
+CORRECTED_CSV = os.path.join('report', 'daily_network_metrics_corrected.csv')
+
+# Every stage runs one script (relative to codes/) from the project root. Its
+# inputs and outputs are files, directories or glob patterns; a stage depends
+# on the stages whose outputs it reads, and is skipped while the content of
+# its inputs and of its code is unchanged and its outputs exist.
+STAGES = {
+    # Ingest reuses the validation scan of an unchanged file (its warnings and
+    # parsed copy) when the cache already has it, but does not wait for it:
+    # the rows are the same either way, so validation runs alongside.
+    'load': {'command': ['load.py', '--stream'],
+             'inputs': [os.path.join('data', 'token_transfers*.csv')],
+             'outputs': [MASTER, ADDRESSES]},
+    'validation': {'command': ['validation.py', '--keep-parsed'],
+                   'inputs': [os.path.join('data', 'token_transfers*.csv')],
+                   'outputs': [SCAN_CACHE,
+                               os.path.join('report', 'data_validation_summary.csv'),
+                               os.path.join('report', 'data_validation_stats.csv')]},
+    'construct': {'command': ['construct.py'],
+                  'inputs': [MASTER],
+                  'outputs': [GRAPHS]},
+    'daily_metrics': {'command': ['dailyMetrics.py'],
+                      'inputs': [MASTER, PRICES],
+                      'outputs': [DAILY_METRICS_CSV, CORRECTED_CSV]},
+    'time_series': {'command': ['timeSeriesAnalysis.py'],
+                    'inputs': [DAILY_METRICS_CSV],
+                    'outputs': [os.path.join('report', 'figures', 'timeseries')]},
+    'time_series_corrected': {'command': ['timeSeriesAnalysis2.py'],
+                              'inputs': [CORRECTED_CSV],
+                              'outputs': [os.path.join('report', 'figures', 'timeseries_corrected')]},
+    'flow_index': {'command': ['flowIndex.py', 'build'],
+                   'inputs': [GRAPHS, PRICES],
+                   'outputs': [FLOW_INDEX]},
+    'comparison': {'command': ['comparasion.py'],
+                   'inputs': [GRAPHS, FLOW_INDEX, ADDRESSES],
+                   'outputs': [os.path.join('report', 'figures', 'deep_dive_corrected')]},
+    'visual': {'command': ['visual.py'],
+               'inputs': [GRAPHS, PRICES, ADDRESSES],
+               'outputs': [os.path.join('report', 'gephi_files')]},
+}
+
+
+def expand_files(pattern):
+    """The files behind an input: a file, every file under a directory, or the matches of a glob."""
+    files = []
+    for path in sorted(glob.glob(pattern)):
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                dirs.sort()
+                files += [os.path.join(root, name) for name in sorted(names) if not name.endswith('.tmp')]
+        else:
+            files.append(path)
+    return files
+
+def file_fingerprint(path, cache):
+    """
+    Content hash of one file, cached by (size, mtime): unchanged files are
+    only stat'ed, and a file rewritten with identical bytes keeps its hash.
+    """
+    stat = os.stat(path)
+    entry = cache.get(path)
+    if entry is None or entry['size'] != stat.st_size or entry['mtime_ns'] != stat.st_mtime_ns:
+        entry = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'hash': content_hash([path])}
+        cache[path] = entry
+    return entry['hash']
+
+def code_files(script):
+    """The stage script and the modules of codes/ it imports, directly or indirectly."""
+    local = {name[:-3] for name in os.listdir(CODE_DIR) if name.endswith('.py')}
+    found, todo = set(), [script[:-3]]
+    while todo:
+        module = todo.pop()
+        if module in found:
+            continue
+        found.add(module)
+        with open(os.path.join(CODE_DIR, module + '.py')) as f:
+            imports = re.findall(r'^\s*(?:from\s+(\w+)\s+import|import\s+(\w+))', f.read(), re.MULTILINE)
+        todo += [name for pair in imports for name in pair if name in local]
+    return [os.path.join(CODE_DIR, module + '.py') for module in sorted(found)]
+
+def stage_fingerprint(name, cache, stages=STAGES):
+    """Identity of a stage run: its command, and the content of its input files and code."""
+    spec = stages[name]
+    digest = hashlib.sha1(json.dumps(spec['command']).encode())
+    for pattern in spec['inputs']:
+        files = expand_files(pattern)
+        if not files:
+            return None
+        for path in files:
+            digest.update(f"{path}:{file_fingerprint(path, cache)};".encode())
+    for path in code_files(spec['command'][0]):
+        digest.update(f"{os.path.basename(path)}:{file_fingerprint(path, cache)};".encode())
+    return digest.hexdigest()
+
+def dependencies(stages=STAGES):
+    """{stage: stages producing any of its inputs}, from the declared paths."""
+    def covers(output, path):
+        return path == output or path.startswith(output + os.sep) or fnmatch.fnmatch(output, path)
+    return {name: {other for other, spec_other in stages.items() if other != name
+                   and any(covers(out, path) for out in spec_other['outputs'] for path in spec['inputs'])}
+            for name, spec in stages.items()}
+
+def load_state(state_path=STATE_PATH):
+    """The fingerprint of each stage's last successful run, and the file hash cache."""
+    if not os.path.exists(state_path):
+        return {'stages': {}, 'files': {}}
+    with open(state_path) as f:
+        return json.load(f)
+
+def save_state(state, state_path=STATE_PATH):
+    os.makedirs(os.path.dirname(state_path), exist_ok=True)
+    tmp_path = state_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, state_path)
+
+def run_stage(name, stages=STAGES, log_dir=LOG_DIR):
+    """Runs a stage script with its output in a log file. Returns (exit code, seconds)."""
+    os.makedirs(log_dir, exist_ok=True)
+    start_time = time.time()
+    with open(os.path.join(log_dir, f'{name}.log'), 'w') as log:
+        command = stages[name]['command']
+        result = subprocess.run([sys.executable, os.path.join(CODE_DIR, command[0])] + command[1:],
+                                stdout=log, stderr=subprocess.STDOUT)
+    return result.returncode, time.time() - start_time
+
+def run_pipeline(selected=None, force=False, jobs=JOBS, dry_run=False, stages=STAGES, state_path=STATE_PATH):
+    """
+    Runs the selected stages (default: all) in dependency order, up to `jobs`
+    at a time. A stage starts once the stages it depends on have finished,
+    and is skipped if its fingerprint matches its last successful run and
+    all its outputs exist. Stages downstream of a failure are not run.
+    Returns {stage: status}.
+    """
+    selected = [name for name in stages if selected is None or name in selected]
+    upstream = {name: deps & set(selected) for name, deps in dependencies(stages).items()}
+    state = load_state(state_path)
+    os.makedirs('report', exist_ok=True)
+    run_id()  # Shared by the run log records of every stage.
+
+    status, running = {}, {}
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        while len(status) < len(selected):
+            for name in selected:
+                if name in status or name in running.values() or not all(d in status for d in upstream[name]):
+                    continue
+                if any(status[d] in ('failed', 'blocked') for d in upstream[name]):
+                    status[name] = 'blocked'
+                    print(f"[blocked] {name}: an upstream stage failed")
+                    continue
+                fingerprint = stage_fingerprint(name, state['files'], stages)
+                upstream_changes = any(status[d] == 'would run' for d in upstream[name])
+                if fingerprint is None and not upstream_changes:
+                    status[name] = 'failed'
+                    print(f"[failed]  {name}: missing input {stages[name]['inputs']}")
+                    continue
+                outputs_exist = all(glob.glob(path) for path in stages[name]['outputs'])
+                if not force and not upstream_changes and fingerprint is not None and outputs_exist \
+                        and state['stages'].get(name) == fingerprint:
+                    status[name] = 'skipped'
+                    print(f"[skip]    {name}: inputs unchanged")
+                elif dry_run:
+                    status[name] = 'would run'
+                    print(f"[run]     {name} (dry run)")
+                else:
+                    print(f"[start]   {name}")
+                    running[executor.submit(run_stage, name, stages)] = name
+            if not running:
+                continue
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                code, seconds = future.result()
+                if code == 0:
+                    status[name] = 'done'
+                    # Inputs cannot change while their producers are done, so hash them again now.
+                    state['stages'][name] = stage_fingerprint(name, state['files'], stages)
+                    for path in list(state['files']):
+                        if not os.path.exists(path):
+                            del state['files'][path]
+                    save_state(state, state_path)
+                    print(f"[done]    {name} ({seconds:.1f} s)")
+                else:
+                    status[name] = 'failed'
+                    print(f"[failed]  {name} (exit code {code}); see {os.path.join(LOG_DIR, name + '.log')}")
+    if not dry_run:
+        save_state(state, state_path)
+    return status
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the analysis pipeline, skipping stages whose inputs are unchanged.")
+    parser.add_argument('stages', nargs='*', help=f"Stages to run (default: all): {', '.join(STAGES)}.")
+    parser.add_argument('--force', action='store_true', help="Run the selected stages even if they are up to date.")
+    parser.add_argument('--jobs', type=int, default=JOBS, help="Independent stages to run at the same time.")
+    parser.add_argument('--dry-run', action='store_true', help="Only report which stages would run.")
+    parser.add_argument('--list', action='store_true', help="List the stages and their dependencies.")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    if args.profile:
+        enable_run_log()  # Inherited by every stage script.
+    unknown = sorted(set(args.stages) - set(STAGES))
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(unknown)}")
+
+    if args.list:
+        for name, deps in dependencies().items():
+            print(f"{name:<22} <- {', '.join(sorted(deps)) or '(raw data)'}")
+        sys.exit(0)
+
+    start_time = time.time()
+    status = run_pipeline(args.stages or None, args.force, args.jobs, args.dry_run)
+    counts = {s: list(status.values()).count(s) for s in dict.fromkeys(status.values())}
+    print(f"\nPipeline finished in {time.time() - start_time:.2f} seconds: "
+          + ', '.join(f"{n} {s}" for s, n in counts.items()))
+    if any(s in ('failed', 'blocked') for s in status.values()):
+        sys.exit(1)
@@ -0,0 +1,115 @@
+import pandas as pd
+import numpy as np
+import os
+
+DATA_DIR = 'data'
+PRICE_DIR = os.path.join(DATA_DIR, 'price_data')
+
+PRICE_FILES = {
+    'WLUNA': os.path.join(PRICE_DIR, 'wluna_price_data.csv'),
+    'USDT': os.path.join(PRICE_DIR, 'usdt_price_data.csv'),
+    'USDC': os.path.join(PRICE_DIR, 'usdc_price_data.csv'),
+    'DAI': os.path.join(PRICE_DIR, 'dai_price_data.csv'),
+    'USTC': os.path.join(PRICE_DIR, 'ustc_price_data.csv'),
+    'PAX': os.path.join(PRICE_DIR, 'pax_price_data.csv'),
+}
+
+# Valuation granularities: transfers are summed per bucket of this many seconds
+# and each bucket is priced with the last candle that opened at or before it.
+FREQ_SECONDS = {'D': 86400, 'h': 3600, 'min': 60}
+FALLBACK_PRICE = 1.0
+
+
+def load_candles(price_files=PRICE_FILES):
+    """
+    Loads the price candles of every token into one long table
+    (time, token_name, price), sorted by time. 'time' is the candle's open
+    time and 'price' its close. Daily, hourly or minute candles all work.
+    """
+    all_prices = []
+    print("Loading all price data files...")
+    for token_name, file_path in price_files.items():
+        try:
+            price_df = pd.read_csv(file_path, usecols=['timestamp', 'close'])
+        except FileNotFoundError:
+            print(f"  -> Warning: Price file not found for {token_name} at {file_path}. Skipping.")
+            continue
+        price_df['token_name'] = token_name
+        all_prices.append(price_df)
+
+    if not all_prices:
+        return pd.DataFrame({'time': pd.Series(dtype='datetime64[ns]'), 'token_name': pd.Series(dtype=object),
+                             'price': pd.Series(dtype=np.float64)})
+    candles = pd.concat(all_prices, ignore_index=True)
+    candles['time'] = pd.to_datetime(candles['timestamp'], unit='s')
+    candles = candles.rename(columns={'close': 'price'})[['time', 'token_name', 'price']]
+    return candles.sort_values(['time', 'token_name'], kind='stable').reset_index(drop=True)
+
+def price_table(candles, freq='D', index=None):
+    """
+    The shared price table: one column per token on a regular time index
+    (every `freq` step from the first candle to the last, or the given
+    index), each row holding the latest known close of every token.
+    """
+    wide = candles.pivot_table(index='time', columns='token_name', values='price', aggfunc='last')
+    if index is None:
+        if wide.empty:
+            return wide
+        index = pd.date_range(wide.index[0].floor(freq), wide.index[-1], freq=freq)
+    index = pd.DatetimeIndex(index)
+    return wide.reindex(wide.index.union(index)).sort_index().ffill().reindex(index)
+
+def price_at(table, time, token, fallback=FALLBACK_PRICE):
+    """Latest price of a token at a given time in a price table (fallback if none is known)."""
+    if token not in table or table.empty:
+        return fallback
+    price = table[token].asof(pd.Timestamp(time))
+    return fallback if pd.isna(price) else float(price)
+
+def bucket_volumes(time_stamps, tokens, values, seconds=FREQ_SECONDS['D']):
+    """
+    Sums raw transfer values per (time bucket, token). time_stamps are epoch
+    seconds (or datetimes); the result (time, token_name, value) is small
+    however many transfers go in, so partial results can be concatenated
+    and summed again.
+    """
+    time_stamps = pd.Series(time_stamps)
+    if not pd.api.types.is_integer_dtype(time_stamps):
+        time_stamps = pd.to_datetime(time_stamps).astype('datetime64[s]').astype(np.int64)
+    frame = pd.DataFrame({'bucket': time_stamps.to_numpy() // seconds * seconds,
+                          'token_name': pd.Series(tokens).astype(object).to_numpy(),
+                          'value': np.asarray(values, dtype=np.float64)})
+    frame = frame.groupby(['bucket', 'token_name'], sort=False).agg(value=('value', 'sum')).reset_index()
+    frame['time'] = pd.to_datetime(frame.pop('bucket'), unit='s')
+    return frame[['time', 'token_name', 'value']]
+
+def combine_bucket_volumes(parts):
+    """Merges partial bucket_volumes results (e.g. one per batch or per day)."""
+    parts = [p for p in parts if len(p)]
+    if not parts:
+        return pd.DataFrame(columns=['time', 'token_name', 'value'])
+    combined = pd.concat(parts, ignore_index=True)
+    return combined.groupby(['time', 'token_name'], sort=False).agg(value=('value', 'sum')).reset_index()
+
+def value_buckets(volumes, candles, fallback=FALLBACK_PRICE):
+    """
+    Prices per-bucket raw volumes with an as-of join per token: each bucket
+    takes the close of the last candle of that token opened at or before the
+    bucket start. Buckets with no earlier candle use the fallback price.
+    """
+    volumes = volumes.sort_values('time', kind='stable').reset_index(drop=True)
+    volumes['token_name'] = volumes['token_name'].astype(object)
+    candles = candles.assign(token_name=candles['token_name'].astype(object))
+    priced = pd.merge_asof(volumes, candles, on='time', by='token_name', direction='backward')
+    priced['price'] = priced['price'].fillna(fallback)
+    priced['usd_value'] = priced['value'] * priced['price']
+    return priced
+
+def daily_usd_volumes(volumes, candles, fallback=FALLBACK_PRICE):
+    """USD volume per (day x token) from per-bucket raw volumes."""
+    priced = value_buckets(volumes, candles, fallback)
+    priced['date'] = priced['time'].dt.normalize()
+    daily = priced.groupby(['date', 'token_name'])['usd_value'].sum().unstack(fill_value=0)
+    daily.index.name = None
+    daily.columns.name = None
+    return daily
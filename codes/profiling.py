@@ -0,0 +1,228 @@
+import pandas as pd
+import os
+import sys
+import json
+import time
+import uuid
+import resource
+import threading
+import cProfile
+import argparse
+from collections import Counter
+from contextlib import contextmanager
+
+REPORT_DIR = 'report'
+RUN_LOG = os.path.join(REPORT_DIR, 'run_log.jsonl')
+PROFILE_DIR = os.path.join(REPORT_DIR, 'profiles')
+SAMPLE_INTERVAL = 0.005  # Seconds between stack samples in 'sample' profiling mode.
+
+# Configuration is read from the environment so that worker processes of a
+# pool inherit it. Logging is off unless PIPELINE_RUN_LOG is set or the
+# script is run with --profile (see add_profile_argument):
+#   PIPELINE_RUN_LOG      JSON-lines log to append stage records to
+#   PIPELINE_RUN_ID       id shared by all records of one run (set on first use)
+#   PIPELINE_PROFILE      comma-separated stage names and/or dates to profile
+#   PIPELINE_PROFILE_MODE 'cprofile' (deterministic, .prof files) or 'sample'
+#                         (stack sampling, .folded files for flame graphs)
+
+_stack = []  # Open stages of this process: (path, record).
+
+
+def run_id():
+    """The id of the current run, shared with worker processes through the environment."""
+    if 'PIPELINE_RUN_ID' not in os.environ:
+        os.environ['PIPELINE_RUN_ID'] = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    return os.environ['PIPELINE_RUN_ID']
+
+def current_rss_peak():
+    """
+    Peak resident set size of this process in bytes since the last reset:
+    VmHWM from /proc on Linux, else the lifetime peak from getrusage.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def reset_rss_peak():
+    """Resets VmHWM to the current RSS where the kernel allows it (Linux); a no-op elsewhere."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+def children_cpu():
+    """CPU seconds of the child processes (pool workers) reaped so far."""
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+def add_profile_argument(parser):
+    """Adds the --profile flag that turns on the run log (see enable_run_log) to a script's parser."""
+    parser.add_argument('--profile', action='store_true',
+                        help=f"Append per-stage timing records to $PIPELINE_RUN_LOG (default: {RUN_LOG}).")
+
+def enable_run_log(log_path=RUN_LOG):
+    """Turns on the run log for this process and the workers and scripts it starts, unless already set."""
+    if not os.environ.get('PIPELINE_RUN_LOG'):
+        os.environ['PIPELINE_RUN_LOG'] = log_path
+
+def run_log_enabled():
+    """True if stage records are being logged (PIPELINE_RUN_LOG set and non-empty)."""
+    return bool(os.environ.get('PIPELINE_RUN_LOG'))
+
+def write_record(record, log_path=None):
+    """Appends one record to the run log with a single write, so pool workers can share the file."""
+    log_path = os.environ.get('PIPELINE_RUN_LOG') if log_path is None else log_path
+    if not log_path:
+        return
+    os.makedirs(os.path.dirname(log_path) or '.', exist_ok=True)
+    fd = os.open(log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, (json.dumps(record, default=str) + '\n').encode())
+    finally:
+        os.close(fd)
+
+def should_profile(name, fields):
+    """Whether PIPELINE_PROFILE selects this stage, by stage name or by its 'date' field."""
+    targets = {t.strip() for t in os.environ.get('PIPELINE_PROFILE', '').split(',') if t.strip()}
+    return bool(targets) and (name in targets or str(fields.get('date')) in targets)
+
+class StackSampler:
+    """
+    A py-spy style sampling profiler: a background thread records the stack
+    of the profiled thread every `interval` seconds. Stacks are kept as
+    collapsed 'file:function;...' lines with counts, the input format of
+    flame graph tools.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.counts = Counter()
+        self.thread_id = threading.get_ident()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}")
+                frame = frame.f_back
+            self.counts[';'.join(reversed(stack))] += 1
+
+    def enable(self):
+        self.thread.start()
+
+    def disable(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def dump_stats(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+@contextmanager
+def stage(name, rows_in=None, **fields):
+    """
+    Times a pipeline stage or sub-step and appends a record to the run log:
+    wall and CPU time (including reaped worker processes), peak RSS, rows
+    in/out and any extra fields (such as date=...). Stages nest; a record's
+    'stage' is the path of the stages open around it. Set record['rows_out']
+    (or other fields) on the yielded dict inside the block. The RSS peak is
+    reset only when a top-level stage of the process starts, so a nested
+    stage reports the peak of its top-level stage up to its own end. With
+    the run log off and no profile selected, nothing is measured or written.
+    """
+    path = '/'.join([p for p, _ in _stack] + [name]) if _stack else name
+    record = {'run_id': run_id(), 'script': os.path.basename(sys.argv[0]), 'stage': path, 'pid': os.getpid(),
+              'started': time.strftime('%Y-%m-%dT%H:%M:%S'), 'rows_in': rows_in, 'rows_out': None}
+    record.update(fields)
+    profiled = should_profile(name, fields)
+    measured = profiled or run_log_enabled()
+    if measured and not _stack:
+        reset_rss_peak()
+    _stack.append((name, record))
+
+    profiler = None
+    if profiled:
+        profiler = StackSampler() if os.environ.get('PIPELINE_PROFILE_MODE') == 'sample' else cProfile.Profile()
+        profiler.enable()
+    if measured:
+        wall_start, cpu_start, children_start = time.perf_counter(), time.process_time(), children_cpu()
+    try:
+        yield record
+    finally:
+        _stack.pop()
+        if measured:
+            record['wall_s'] = time.perf_counter() - wall_start
+            record['cpu_s'] = time.process_time() - cpu_start + children_cpu() - children_start
+            record['peak_rss_mb'] = current_rss_peak() / 2**20
+
+        if profiler is not None:
+            profiler.disable()
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            suffix = '.folded' if isinstance(profiler, StackSampler) else '.prof'
+            label = '_'.join(str(part) for part in [path.replace('/', '.'), fields.get('date')] if part)
+            record['profile'] = os.path.join(PROFILE_DIR, f"{record['run_id']}_{label}{suffix}")
+            profiler.dump_stats(record['profile'])
+        if measured:
+            write_record(record)
+
+def timed_batches(batches, name, **fields):
+    """Yields from an iterator of frames (e.g. a chunked read_csv), timing each step as a stage with its row count."""
+    iterator = iter(batches)
+    for i in range(sys.maxsize):
+        with stage(name, batch=i, **fields) as record:
+            try:
+                batch = next(iterator)
+            except StopIteration:
+                record['rows_out'] = 0
+                return
+            record['rows_out'] = len(batch)
+        yield batch
+
+def load_run_log(log_path=RUN_LOG, run=None):
+    """The run log as a DataFrame; run='last' or a run id selects one run."""
+    records = pd.read_json(log_path, lines=True)
+    if run == 'last':
+        run = records['run_id'].iloc[-1]
+    return records[records['run_id'] == run] if run else records
+
+def summarize(records):
+    """Per-stage totals of a run log: calls, wall and CPU time, slowest call, peak RSS and rows."""
+    summary = records.groupby('stage').agg(
+        calls=('wall_s', 'size'),
+        wall_s=('wall_s', 'sum'),
+        max_wall_s=('wall_s', 'max'),
+        cpu_s=('cpu_s', 'sum'),
+        peak_rss_mb=('peak_rss_mb', 'max'),
+        rows_in=('rows_in', lambda rows: rows.sum(min_count=1)),
+        rows_out=('rows_out', lambda rows: rows.sum(min_count=1)),
+    )
+    summary[['rows_in', 'rows_out']] = summary[['rows_in', 'rows_out']].astype('Int64')
+    return summary.sort_values('wall_s', ascending=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize the per-stage records of the pipeline run log.")
+    parser.add_argument('--log', default=os.environ.get('PIPELINE_RUN_LOG') or RUN_LOG)
+    parser.add_argument('--run', default='last', help="Run id to summarize, 'last' (default) or 'all'.")
+    parser.add_argument('--days', action='store_true', help="Also list the slowest per-day records.")
+    args = parser.parse_args()
+
+    records = load_run_log(args.log, None if args.run == 'all' else args.run)
+    print(f"{len(records)} records from {records['run_id'].nunique()} run(s) in {args.log}\n")
+    print(summarize(records).to_string(float_format=lambda x: f"{x:,.2f}"))
+    if args.days and 'date' in records:
+        days = records.dropna(subset=['date']).sort_values('wall_s', ascending=False)
+        print("\nSlowest days:")
+        print(days[['stage', 'date', 'wall_s', 'cpu_s', 'peak_rss_mb', 'rows_in', 'rows_out']].head(20)
+              .to_string(index=False, float_format=lambda x: f"{x:,.2f}"))
@@ -0,0 +1,168 @@
+import duckdb
+import pandas as pd
+import os
+import io
+import contextlib
+import sys
+import time
+import argparse
+
+from dataset import MASTER_PATH, ADDRESS_DICT_PATH, is_partitioned, is_compact
+from graphStore import STORE_DIR, load_manifest, load_edge_table
+from prices import PRICE_FILES, FALLBACK_PRICE, load_candles
+
+REPORT_DIR = 'report'
+METRICS_CSV = os.path.join(REPORT_DIR, 'daily_metrics.csv')
+CORRECTED_METRICS_CSV = os.path.join(REPORT_DIR, 'daily_network_metrics_corrected.csv')
+TEMP_DIR = os.path.join('data', 'processed', 'duckdb_tmp')  # Where large joins and sorts spill to disk.
+MAX_ROWS = 50  # Result rows printed by the CLI; write larger results with --output.
+
+# Views of a connection, created for the inputs that exist:
+#   transfers        the master data (one row per transfer, 'time' as a timestamp, 'date' for pruning)
+#   addresses        (id, address) reverse lookup of the address dictionary
+#   prices           the price candles (time, token_name, price)
+#   transfers_usd    transfers with the last candle price at or before them and value_usd
+#   daily_edges      the graph store's per-day edge tables (date, src, dst, token_name, value, transfers)
+#   daily_metrics    report/daily_metrics.csv (and daily_metrics_corrected)
+# plus the macro address_id('0x...') for filtering on a hex address.
+
+
+def sql_string(value):
+    """Quotes a Python string as a SQL literal."""
+    return "'" + str(value).replace("'", "''") + "'"
+
+def transfers_sql(path=MASTER_PATH):
+    """The query behind the transfers view, for either master layout; filters on 'date' prune partitions."""
+    time_column = "make_timestamp(time_stamp * 1000000)" if is_compact(path) else "CAST(time_stamp AS TIMESTAMP)"
+    if is_partitioned(path):
+        return (f"SELECT * EXCLUDE (token), {time_column} AS time "
+                f"FROM read_parquet({sql_string(os.path.join(path, '*', '*', '*.parquet'))}, "
+                "hive_partitioning=true, hive_types={'date': DATE, 'token': VARCHAR})")
+    return f"SELECT *, {time_column} AS time, CAST({time_column} AS DATE) AS date FROM read_parquet({sql_string(path)})"
+
+def register_daily_edges(con, store_dir=STORE_DIR):
+    """
+    Registers every stored day's edge table (memory-mapped, not copied) and
+    creates the daily_edges view over them, with the day as a constant
+    'date' column so date filters skip whole days. Returns the day count.
+    """
+    manifest = load_manifest(store_dir)
+    tokens = '[' + ', '.join(sql_string(t) for t in manifest['tokens']) + ']'
+    parts = []
+    for date_str in sorted(manifest['days']):
+        name = f"edges_{date_str.replace('-', '_')}"
+        con.register(name, load_edge_table(date_str, store_dir))
+        parts.append(f"SELECT DATE {sql_string(date_str)} AS date, src, dst, {tokens}[token + 1] AS token_name, "
+                     f"value, transfers FROM {name}")
+    if parts:
+        con.execute("CREATE OR REPLACE VIEW daily_edges AS " + ' UNION ALL '.join(parts))
+    return len(parts)
+
+def load_metrics(path):
+    """A daily metrics CSV with its index as a 'date' column (of dates, so it compares with the other views)."""
+    metrics = pd.read_csv(path, index_col=0, parse_dates=True)
+    metrics.index = metrics.index.date
+    return metrics.rename_axis('date').reset_index()
+
+def connect(threads=None, memory_limit=None, temp_dir=TEMP_DIR, master_path=MASTER_PATH,
+            address_path=ADDRESS_DICT_PATH, price_files=PRICE_FILES, store_dir=STORE_DIR, verbose=False):
+    """
+    Opens an in-memory DuckDB connection with views over the pipeline's
+    datasets. Queries on it run vectorized and on `threads` threads
+    (default: all cores), reading only the columns and partitions they need;
+    operators that outgrow `memory_limit` (e.g. '4GB'; default: 80% of RAM)
+    spill to temp_dir instead of failing.
+    """
+    con = duckdb.connect()
+    if threads:
+        con.execute(f"SET threads = {int(threads)}")
+    if memory_limit:
+        con.execute(f"SET memory_limit = {sql_string(memory_limit)}")
+    os.makedirs(temp_dir, exist_ok=True)
+    con.execute(f"SET temp_directory = {sql_string(temp_dir)}")
+
+    created = []
+    if os.path.exists(master_path):
+        con.execute("CREATE VIEW transfers AS " + transfers_sql(master_path))
+        created.append('transfers')
+    if os.path.exists(address_path):
+        con.execute("CREATE VIEW addresses AS SELECT CAST(file_row_number AS INTEGER) AS id, address "
+                    f"FROM read_parquet({sql_string(address_path)}, file_row_number=true)")
+        con.execute("CREATE MACRO address_id(a) AS (SELECT id FROM addresses WHERE address = lower(a))")
+        created.append('addresses')
+    # The candle and metrics files are small: they are read with the pipeline's
+    # own loaders and registered as in-memory tables.
+    with contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO()):
+        candles = load_candles(price_files)
+    if len(candles):
+        con.register('prices', candles)
+        created.append('prices')
+        if 'transfers' in created:
+            con.execute(f"""CREATE VIEW transfers_usd AS
+                SELECT t.*, coalesce(p.price, {FALLBACK_PRICE}) AS price, t.value * coalesce(p.price, {FALLBACK_PRICE}) AS value_usd
+                FROM transfers t ASOF LEFT JOIN prices p ON t.token_name = p.token_name AND t.time >= p.time""")
+            created.append('transfers_usd')
+    if register_daily_edges(con, store_dir):
+        created.append('daily_edges')
+    for view, path in [('daily_metrics', METRICS_CSV), ('daily_metrics_corrected', CORRECTED_METRICS_CSV)]:
+        if os.path.exists(path):
+            con.register(view, load_metrics(path))
+            created.append(view)
+    if verbose:
+        print(f"Views: {', '.join(created) or '(none; run the pipeline first)'}")
+    return con
+
+def query(sql, con=None, params=None):
+    """Runs a query and returns the result as a pandas DataFrame."""
+    con = con or connect()
+    return con.execute(sql, params).df()
+
+def export(sql, output_path, con=None):
+    """
+    Streams a query result to a Parquet or CSV file (by extension) without
+    materializing it in Python. Returns the number of rows written.
+    """
+    con = con or connect()
+    fmt = 'parquet' if output_path.endswith('.parquet') else 'csv'
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    return con.execute(f"COPY ({sql}) TO {sql_string(output_path)} (FORMAT {fmt})").fetchone()[0]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run SQL over the transfers, prices, daily edges and daily metrics.")
+    parser.add_argument('sql', nargs='?', help="Query to run; read from --file or stdin if omitted.")
+    parser.add_argument('--file', help="File containing the query.")
+    parser.add_argument('--output', help="Write the full result to this .parquet or .csv file.")
+    parser.add_argument('--max-rows', type=int, default=MAX_ROWS, help="Result rows to print.")
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument('--memory-limit', default=None, help="e.g. '4GB'; larger operators spill to disk.")
+    parser.add_argument('--explain', action='store_true', help="Print the query plan instead of the result.")
+    parser.add_argument('--views', action='store_true', help="List the views and their columns.")
+    args = parser.parse_args()
+
+    con = connect(args.threads, args.memory_limit, verbose=True)
+    if args.views:
+        print(con.sql("SELECT table_name AS view, string_agg(column_name || ' ' || data_type, ', ' ORDER BY ordinal_position) "
+                      "AS columns FROM information_schema.columns WHERE table_name NOT LIKE 'edges\\_%' ESCAPE '\\' "
+                      "GROUP BY table_name ORDER BY table_name"
+                      ).df().to_string(index=False))
+        sys.exit(0)
+
+    if args.file:
+        with open(args.file) as f:
+            sql = f.read()
+    else:
+        sql = args.sql or sys.stdin.read()
+    sql = sql.strip().rstrip(';')
+
+    start_time = time.time()
+    if args.explain:
+        print(con.execute("EXPLAIN " + sql).fetchall()[0][1])
+    elif args.output:
+        rows = export(sql, args.output, con)
+        print(f"Wrote {rows:,} rows to {args.output} ({time.time() - start_time:.2f} seconds)")
+    else:
+        result = con.sql(sql)
+        df = result.limit(args.max_rows).df()
+        print(df.to_string(index=False))
+        print(f"\n({len(df)} rows shown, {time.time() - start_time:.2f} seconds)")
@@ -0,0 +1,71 @@
+import pandas as pd
+import numpy as np
+import networkx as nx
+import scipy.sparse as sp
+
+# A daily graph is a plain dict:
+#   'nodes'    -> sorted int32 address ids; matrix row/column i is address nodes[i]
+#   'tokens'   -> {token_name: CSR matrix of summed raw values, shape (n, n)}
+#   'combined' -> CSR matrix of transfer counts across all tokens (the edge set)
+
+
+def build_daily_graph(df_slice):
+    """
+    Builds a day's network straight from the transfer columns (from_id, to_id,
+    token_name, value) as one CSR adjacency matrix per token plus a combined
+    matrix, without any Python-level loop over transfers or edges. Transfers
+    of unmapped tokens are dropped, as in graphStore.build_edge_table, so a
+    day has the same nodes and edges whether built here or loaded from the store.
+    """
+    df_slice = df_slice[df_slice['token_name'].notna()]
+    if df_slice.empty:
+        empty = sp.csr_matrix((0, 0))
+        return {'nodes': np.array([], dtype=np.int32), 'tokens': {}, 'combined': empty}
+
+    src = df_slice['from_id'].to_numpy()
+    dst = df_slice['to_id'].to_numpy()
+    values = df_slice['value'].to_numpy(dtype=np.float64)
+    token_codes, token_names = pd.factorize(df_slice['token_name'], sort=True)
+
+    nodes, local = np.unique(np.concatenate([src, dst]), return_inverse=True)
+    n = len(nodes)
+    rows, cols = local[:len(src)], local[len(src):]
+
+    combined = sp.csr_matrix((np.ones(len(src)), (rows, cols)), shape=(n, n))
+    combined.sum_duplicates()
+
+    tokens = {}
+    for code, token in enumerate(token_names):
+        mask = token_codes == code
+        matrix = sp.csr_matrix((values[mask], (rows[mask], cols[mask])), shape=(n, n))
+        matrix.sum_duplicates()
+        tokens[str(token)] = matrix
+
+    return {'nodes': nodes.astype(np.int32), 'tokens': tokens, 'combined': combined}
+
+def edge_arrays(matrix):
+    """Returns the (row, col, value) arrays of a CSR matrix without densifying it."""
+    coo = matrix.tocoo()
+    return coo.row, coo.col, coo.data
+
+def degree_arrays(graph):
+    """Returns (in_degree, out_degree) per node, counting distinct neighbours as NetworkX does."""
+    combined = graph['combined']
+    return combined.getnnz(axis=0), combined.getnnz(axis=1)
+
+def to_networkx(graph, address_table=None):
+    """
+    Converts a daily graph into the rich NetworkX DiGraph used by the GEXF
+    exporters: edge attributes are {token: summed value}. Nodes are address
+    ids, or hex addresses when address_table is given. NetworkX keeps a dict
+    per edge, so this loops over the edges in Python; only callers that
+    really need NetworkX (e.g. for GEXF output) should pay for it.
+    """
+    labels = graph['nodes'] if address_table is None else address_table[graph['nodes']]
+    labels = labels.tolist()
+
+    G = nx.DiGraph()
+    for token, matrix in graph['tokens'].items():
+        rows, cols, values = edge_arrays(matrix)
+        G.add_edges_from((labels[u], labels[v], {token: w}) for u, v, w in zip(rows.tolist(), cols.tolist(), values.tolist()))
+    return G
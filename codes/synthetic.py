@@ -0,0 +1,164 @@
+import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pv
+import os
+import json
+import time
+import argparse
+
+from load import TOKEN_MAP
+
+START_DATE = '2022-04-01'
+END_DATE = '2022-06-01'  # Exclusive.
+CRISIS_START = '2022-05-07'
+CRISIS_DAYS = 7
+CRISIS_MULTIPLIER = 8.0  # Daily transfer rate inside the crisis window, relative to a normal day.
+CRISIS_TOKEN_BOOST = 4.0  # Extra weight of USTC and WLUNA transfers inside the crisis window.
+HUB_EXPONENT = 1.1  # Zipf exponent of address activity; larger means fewer, bigger hubs.
+ROWS_PER_ADDRESS = 8
+DUPLICATE_FRACTION = 0.001  # Rows repeated in the next file, like the overlapping real exports.
+UNMAPPED_FRACTION = 0.001  # Rows of contracts outside TOKEN_MAP.
+CHUNK_ROWS = 2_000_000
+FILE_NAMES = ['token_transfers.csv', 'token_transfers_V2.0.0.csv']
+
+TOKEN_WEIGHTS = {'USDT': 0.35, 'USDC': 0.28, 'DAI': 0.1, 'PAX': 0.02, 'USTC': 0.15, 'WLUNA': 0.1}
+VALUE_SCALE = {'USDT': 7.0, 'USDC': 7.0, 'DAI': 6.5, 'PAX': 6.0, 'USTC': 6.5, 'WLUNA': 3.0}  # Log-mean of amounts.
+UNMAPPED_CONTRACT = '0x' + 'ee' * 20
+BLOCK_ZERO, BLOCK_SECONDS = 14_490_000, 13  # Block at START_DATE and seconds per block.
+
+
+def synthetic_addresses(n, rng):
+    """n distinct random 20-byte hex addresses."""
+    ids = rng.choice(2**62, size=n, replace=False)
+    return np.array([f'0x{i:040x}' for i in ids.tolist()])
+
+def day_weights(days, crisis_start=CRISIS_START, crisis_days=CRISIS_DAYS, crisis_multiplier=CRISIS_MULTIPLIER):
+    """Relative transfer rate of every day: 1 on normal days and crisis_multiplier inside the crisis window."""
+    crisis = (days >= pd.Timestamp(crisis_start)) & (days < pd.Timestamp(crisis_start) + pd.Timedelta(days=crisis_days))
+    weights = np.where(crisis, crisis_multiplier, 1.0)
+    return weights / weights.sum(), crisis
+
+def generate_chunk(n, rng, addresses, address_cdf, days, day_p, crisis, token_p, crisis_token_p):
+    """One chunk of raw transfers in the schema of the real CSV exports."""
+    day = rng.choice(len(days), size=n, p=day_p)
+    times = (days[day].astype('int64') // 10**9 + rng.integers(0, 86400, n)).astype(np.int64)
+    tokens = np.array(list(TOKEN_WEIGHTS))
+
+    # Token mix shifts toward USTC and WLUNA on crisis days.
+    in_crisis = crisis[day]
+    token = np.empty(n, dtype=np.int64)
+    token[~in_crisis] = rng.choice(len(tokens), size=int((~in_crisis).sum()), p=token_p)
+    token[in_crisis] = rng.choice(len(tokens), size=int(in_crisis.sum()), p=crisis_token_p)
+    contract_of = {name: address for address, name in TOKEN_MAP.items()}
+    contracts = np.array([contract_of[t] for t in tokens])[token]
+    contracts[rng.random(n) < UNMAPPED_FRACTION] = UNMAPPED_CONTRACT
+
+    # Heavy-tailed activity: both endpoints are drawn from a Zipf law over address ranks.
+    from_rank = np.searchsorted(address_cdf, rng.random(n))
+    to_rank = np.searchsorted(address_cdf, rng.random(n))
+    scales = np.array([VALUE_SCALE[t] for t in tokens])[token]
+    order = np.argsort(times, kind='stable')
+    return pa.table({
+        'block_number': (BLOCK_ZERO + (times - days[0].value // 10**9) // BLOCK_SECONDS)[order],
+        'transaction_index': rng.integers(0, 300, n)[order],
+        'from_address': addresses[from_rank][order],
+        'to_address': addresses[to_rank][order],
+        'time_stamp': times[order],
+        'contract_address': contracts[order],
+        'value': rng.lognormal(scales, 2.0)[order],
+    })
+
+def write_price_files(output_dir, start_date=START_DATE, end_date=END_DATE, crisis_start=CRISIS_START,
+                      crisis_days=CRISIS_DAYS, seed=0):
+    """Daily candles for every token: stables near $1, USTC depegging and WLUNA collapsing in the crisis."""
+    rng = np.random.default_rng(seed)
+    price_dir = os.path.join(output_dir, 'data', 'price_data')
+    os.makedirs(price_dir, exist_ok=True)
+    days = pd.date_range(start_date, end_date, freq='D')
+    elapsed = np.clip((days - pd.Timestamp(crisis_start)).days.to_numpy(), 0, None)
+    collapse = np.exp(-elapsed * 8.0 / crisis_days)
+    closes = {
+        'WLUNA': 85 * collapse + 1e-4,
+        'USTC': 0.02 + 0.98 * np.exp(-elapsed * 3.0 / crisis_days),
+    }
+    for token in TOKEN_WEIGHTS:
+        close = closes.get(token, 1 + rng.normal(0, 0.001, len(days)))
+        pd.DataFrame({'timestamp': days.astype('int64') // 10**9, 'open': close, 'high': close,
+                      'low': close, 'close': close}).to_csv(
+            os.path.join(price_dir, f'{token.lower()}_price_data.csv'), index=False)
+
+def write_synthetic_dataset(output_dir, rows, seed=0, start_date=START_DATE, end_date=END_DATE,
+                            crisis_start=CRISIS_START, crisis_days=CRISIS_DAYS,
+                            crisis_multiplier=CRISIS_MULTIPLIER, crisis_token_boost=CRISIS_TOKEN_BOOST,
+                            hub_exponent=HUB_EXPONENT, addresses=None, chunk_rows=CHUNK_ROWS):
+    """
+    Writes a synthetic copy of the raw inputs under output_dir/data: the
+    token transfer CSVs (split over FILE_NAMES, with a small overlap between
+    consecutive files) and the price candles. Rows are generated and written
+    chunk by chunk, so memory does not grow with `rows`. Returns the
+    generation parameters, which are also saved next to the data.
+    """
+    rng = np.random.default_rng(seed)
+    params = {'rows': rows, 'seed': seed, 'start_date': start_date, 'end_date': end_date,
+              'crisis_start': crisis_start, 'crisis_days': crisis_days, 'crisis_multiplier': crisis_multiplier,
+              'crisis_token_boost': crisis_token_boost, 'hub_exponent': hub_exponent,
+              'addresses': addresses or max(1000, rows // ROWS_PER_ADDRESS)}
+
+    address_table = synthetic_addresses(params['addresses'], rng)
+    address_cdf = np.cumsum(np.arange(1, len(address_table) + 1, dtype=np.float64) ** -hub_exponent)
+    address_cdf /= address_cdf[-1]
+    days = pd.date_range(start_date, end_date, freq='D', inclusive='left')
+    day_p, crisis = day_weights(days, crisis_start, crisis_days, crisis_multiplier)
+    token_p = np.array(list(TOKEN_WEIGHTS.values()))
+    crisis_token_p = token_p * np.array([crisis_token_boost if t in ('USTC', 'WLUNA') else 1.0 for t in TOKEN_WEIGHTS])
+    token_p, crisis_token_p = token_p / token_p.sum(), crisis_token_p / crisis_token_p.sum()
+
+    data_dir = os.path.join(output_dir, 'data')
+    os.makedirs(data_dir, exist_ok=True)
+    file_rows = np.diff(np.linspace(0, rows, len(FILE_NAMES) + 1).astype(np.int64))
+    carry = None
+    for file_name, n_file in zip(FILE_NAMES, file_rows):
+        with pv.CSVWriter(os.path.join(data_dir, file_name), pa.schema([
+                ('block_number', pa.int64()), ('transaction_index', pa.int64()), ('from_address', pa.string()),
+                ('to_address', pa.string()), ('time_stamp', pa.int64()), ('contract_address', pa.string()),
+                ('value', pa.float64())])) as writer:
+            if carry is not None:
+                writer.write_table(carry)
+            for start in range(0, n_file, chunk_rows):
+                chunk = generate_chunk(min(chunk_rows, n_file - start), rng, address_table, address_cdf,
+                                       days, day_p, crisis, token_p, crisis_token_p)
+                writer.write_table(chunk)
+            # The tail of this file is exported again at the start of the next one.
+            n_carry = int(n_file * DUPLICATE_FRACTION)
+            carry = chunk.slice(chunk.num_rows - n_carry) if n_carry else None
+
+    write_price_files(output_dir, start_date, end_date, crisis_start, crisis_days, seed)
+    with open(os.path.join(data_dir, 'synthetic_params.json'), 'w') as f:
+        json.dump(params, f, indent=2)
+    return params
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic ERC-20 transfer CSVs and price candles.")
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--output-dir', default=os.path.join('data', 'synthetic'),
+                        help="Directory that receives data/token_transfers*.csv and data/price_data/.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--start', default=START_DATE, help="First day (inclusive).")
+    parser.add_argument('--end', default=END_DATE, help="Last day (exclusive).")
+    parser.add_argument('--crisis-start', default=CRISIS_START)
+    parser.add_argument('--crisis-days', type=int, default=CRISIS_DAYS)
+    parser.add_argument('--crisis-multiplier', type=float, default=CRISIS_MULTIPLIER)
+    parser.add_argument('--crisis-token-boost', type=float, default=CRISIS_TOKEN_BOOST)
+    parser.add_argument('--hub-exponent', type=float, default=HUB_EXPONENT)
+    parser.add_argument('--addresses', type=int, default=None,
+                        help=f"Distinct addresses (default: rows / {ROWS_PER_ADDRESS}).")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    params = write_synthetic_dataset(args.output_dir, args.rows, args.seed, args.start, args.end,
+                                     args.crisis_start, args.crisis_days, args.crisis_multiplier,
+                                     args.crisis_token_boost, args.hub_exponent, args.addresses)
+    print(f"Wrote {params['rows']:,} synthetic transfers over {params['addresses']:,} addresses "
+          f"to {os.path.join(args.output_dir, 'data')} ({time.time() - start_time:.2f} seconds)")
@@ -0,0 +1,249 @@
+import pandas as pd
+import numpy as np
+import os
+import time
+import argparse
+from tqdm import tqdm
+
+from dataset import MASTER_PATH, is_partitioned, list_dates, read_transfers
+from construct import split_by_day
+from load import TOKEN_NAMES
+
+OUTPUT_DIR = 'report'
+STREAM_COLUMNS = ['time_stamp', 'from_id', 'to_id', 'token_name', 'value']
+
+# A sliding window is a plain dict of arrays, updated in place:
+#   buffer ('times', 'src', 'dst', 'token', 'value') from 'head' to 'tail' -> transfers inside the window, time-sorted
+#                 (the arrays have spare capacity after 'tail'; see add_transfers)
+#   'node_count'  -> per address id, transfer endpoints inside the window (node active if > 0)
+#   'edge_keys'   -> sorted (src << 32 | dst) keys, with 'edge_count' transfers each (edge active if > 0)
+#   'in_degree' / 'out_degree' -> distinct active neighbours per address id
+#   'in_hist' / 'out_hist'     -> number of nodes per degree value, for the max degree
+#   'nodes', 'edges', 'transfers', 'volume' (per token code) -> running totals
+
+
+def new_window_state(token_names=TOKEN_NAMES):
+    """Returns an empty sliding-window state."""
+    return {
+        'tokens': list(token_names),
+        'times': np.zeros(0, dtype=np.int64),
+        'src': np.zeros(0, dtype=np.int32),
+        'dst': np.zeros(0, dtype=np.int32),
+        'token': np.zeros(0, dtype=np.int8),
+        'value': np.zeros(0, dtype=np.float64),
+        'head': 0,
+        'tail': 0,
+        'node_count': np.zeros(0, dtype=np.int32),
+        'in_degree': np.zeros(0, dtype=np.int32),
+        'out_degree': np.zeros(0, dtype=np.int32),
+        'in_hist': np.zeros(1, dtype=np.int64),
+        'out_hist': np.zeros(1, dtype=np.int64),
+        'edge_keys': np.zeros(0, dtype=np.int64),
+        'edge_count': np.zeros(0, dtype=np.int32),
+        'nodes': 0,
+        'edges': 0,
+        'transfers': 0,
+        'volume': np.zeros(len(token_names)),
+    }
+
+def grow_address_arrays(state, size):
+    """Extends the per-address arrays so ids below size can be indexed."""
+    if size <= len(state['node_count']):
+        return
+    size = max(size, 2 * len(state['node_count']))
+    for name in ('node_count', 'in_degree', 'out_degree'):
+        grown = np.zeros(size, dtype=np.int32)
+        grown[:len(state[name])] = state[name]
+        state[name] = grown
+
+def update_nodes(state, ids, sign):
+    """Adds (sign=1) or removes (sign=-1) transfer endpoints and tracks the active node count."""
+    ids, counts = np.unique(ids, return_counts=True)
+    before = state['node_count'][ids]
+    after = before + sign * counts
+    state['node_count'][ids] = after
+    state['nodes'] += int(np.count_nonzero((before == 0) & (after > 0)) - np.count_nonzero((before > 0) & (after == 0)))
+
+def change_degrees(state, side, ids, delta):
+    """Moves nodes between degree histogram bins after their degree changed by delta per occurrence in ids."""
+    degree, hist_name = state[f'{side}_degree'], f'{side}_hist'
+    ids, counts = np.unique(ids, return_counts=True)
+    old = degree[ids]
+    new = old + delta * counts
+    degree[ids] = new
+    if new.max(initial=0) >= len(state[hist_name]):
+        grown = np.zeros(2 * int(new.max()) + 1, dtype=np.int64)
+        grown[:len(state[hist_name])] = state[hist_name]
+        state[hist_name] = grown
+    np.subtract.at(state[hist_name], old[old > 0], 1)
+    np.add.at(state[hist_name], new[new > 0], 1)
+
+def update_edges(state, keys, sign):
+    """
+    Adds or removes transfers on their (src, dst) edges by a merge into the
+    sorted key array, and updates degrees for edges that appear or disappear.
+    """
+    keys, counts = np.unique(keys, return_counts=True)
+    pos = np.searchsorted(state['edge_keys'], keys)
+    found = pos < len(state['edge_keys'])
+    found[found] = state['edge_keys'][pos[found]] == keys[found]
+
+    before = state['edge_count'][pos[found]]
+    state['edge_count'][pos[found]] = before + sign * counts[found]
+    if sign > 0:
+        changed = np.concatenate([keys[found][before == 0], keys[~found]])
+        state['edge_keys'] = np.insert(state['edge_keys'], pos[~found], keys[~found])
+        state['edge_count'] = np.insert(state['edge_count'], pos[~found], counts[~found].astype(np.int32))
+    else:
+        changed = keys[found][before == counts[found]]
+        # Drop retired keys once they make up half of the array.
+        if 2 * np.count_nonzero(state['edge_count'] == 0) > len(state['edge_count']):
+            live = state['edge_count'] > 0
+            state['edge_keys'], state['edge_count'] = state['edge_keys'][live], state['edge_count'][live]
+
+    state['edges'] += sign * len(changed)
+    change_degrees(state, 'out', (changed >> 32).astype(np.int64), sign)
+    change_degrees(state, 'in', (changed & 0xFFFFFFFF).astype(np.int64), sign)
+
+def apply_transfers(state, src, dst, token, value, sign):
+    """Applies a block of transfers to the node, edge and volume counters."""
+    if len(src) == 0:
+        return
+    update_nodes(state, np.concatenate([src, dst]), sign)
+    update_edges(state, src.astype(np.int64) << 32 | dst.astype(np.int64), sign)
+    state['transfers'] += sign * len(src)
+    state['volume'] += sign * np.bincount(token, weights=value, minlength=len(state['tokens']))
+
+def add_transfers(state, times, src, dst, token, value):
+    """Appends time-sorted transfers (not earlier than those already in the window) to the window."""
+    n = len(times)
+    if n == 0:
+        return
+    grow_address_arrays(state, int(max(src.max(), dst.max())) + 1)
+    head, tail = state['head'], state['tail']
+    columns = (('times', times), ('src', src), ('dst', dst), ('token', token), ('value', value))
+    if tail + n > len(state['times']):
+        # Move the live transfers to the front, into a buffer at least twice
+        # their size: the copy is then paid for by as many appends, so each
+        # transfer is copied O(1) times on average whatever the window/stride.
+        live = tail - head
+        capacity = max(len(state['times']), 2 * (live + n))
+        for name, _ in columns:
+            buffer = state[name] if capacity == len(state[name]) else np.empty(capacity, dtype=state[name].dtype)
+            buffer[:live] = state[name][head:tail]
+            state[name] = buffer
+        head, tail = 0, live
+    for name, values in columns:
+        state[name][tail:tail + n] = values
+    state['head'], state['tail'] = head, tail + n
+    apply_transfers(state, src, dst, token, value, 1)
+
+def retire_before(state, cutoff):
+    """Removes the transfers that happened before cutoff (epoch seconds) from the window."""
+    head = state['head']
+    stop = head + np.searchsorted(state['times'][head:state['tail']], cutoff, side='left')
+    if stop > head:
+        apply_transfers(state, state['src'][head:stop], state['dst'][head:stop],
+                        state['token'][head:stop], state['value'][head:stop], -1)
+        state['head'] = stop
+
+def max_degree(hist):
+    """Largest degree present in a degree histogram."""
+    nonzero = np.flatnonzero(hist[1:])
+    return int(nonzero[-1]) + 1 if len(nonzero) else 0
+
+def window_metrics(state):
+    """Metrics of the current window."""
+    metrics = {
+        'nodes': state['nodes'],
+        'edges': state['edges'],
+        'transfers': state['transfers'],
+        'mean_degree': state['edges'] / state['nodes'] if state['nodes'] else 0.0,
+        'max_in_degree': max_degree(state['in_hist']),
+        'max_out_degree': max_degree(state['out_hist']),
+    }
+    for i, token in enumerate(state['tokens']):
+        metrics[f'volume_{token.lower()}'] = state['volume'][i] if state['transfers'] else 0.0
+    return metrics
+
+def transfer_chunks(start_date=None, end_date=None, path=MASTER_PATH):
+    """Yields the transfers of the master data one day at a time, in date order."""
+    if is_partitioned(path):
+        for date_str in list_dates(path):
+            if (start_date is not None and date_str < pd.Timestamp(start_date).strftime('%Y-%m-%d')) or \
+               (end_date is not None and date_str > pd.Timestamp(end_date).strftime('%Y-%m-%d')):
+                continue
+            yield read_transfers(date_str, date_str, columns=STREAM_COLUMNS, path=path)
+    else:
+        df = read_transfers(start_date, end_date, columns=STREAM_COLUMNS, path=path)
+        for _, daily_df in split_by_day(df, STREAM_COLUMNS):
+            yield daily_df
+
+def encode_chunk(df, token_names):
+    """Turns a transfer chunk into time-sorted arrays; transfers of unmapped tokens are dropped."""
+    times = df['time_stamp']
+    if not pd.api.types.is_integer_dtype(times):
+        times = pd.to_datetime(times).astype('datetime64[s]').astype(np.int64)
+    times = times.to_numpy(dtype=np.int64)
+    token = pd.Categorical(df['token_name'], categories=token_names).codes
+    keep = np.flatnonzero(token >= 0)
+    keep = keep[np.argsort(times[keep], kind='stable')]
+    return (times[keep], df['from_id'].to_numpy()[keep], df['to_id'].to_numpy()[keep],
+            token[keep].astype(np.int8), df['value'].to_numpy(dtype=np.float64)[keep])
+
+def sliding_window_metrics(chunks, window, stride, token_names=TOKEN_NAMES):
+    """
+    Runs a sliding window of `window` seconds over a time-sorted stream of
+    transfer chunks, emitting metrics every `stride` seconds (window ends are
+    multiples of the stride). Transfers enter and leave the window
+    incrementally; no window is rebuilt from scratch. Returns a DataFrame
+    indexed by window end.
+    """
+    state = new_window_state(token_names)
+    rows, ends = [], []
+    window_end = None
+    for chunk in chunks:
+        times, src, dst, token, value = encode_chunk(chunk, token_names)
+        if len(times) == 0:
+            continue
+        if window_end is None:
+            window_end = (times[0] // stride + 1) * stride
+        i = 0
+        while True:
+            j = np.searchsorted(times, window_end, side='left')
+            add_transfers(state, times[i:j], src[i:j], dst[i:j], token[i:j], value[i:j])
+            i = j
+            if j == len(times):
+                break
+            retire_before(state, window_end - window)
+            rows.append(window_metrics(state))
+            ends.append(window_end)
+            window_end += stride
+
+    if window_end is not None:
+        retire_before(state, window_end - window)
+        rows.append(window_metrics(state))
+        ends.append(window_end)
+    result = pd.DataFrame(rows, index=pd.to_datetime(np.array(ends, dtype=np.int64), unit='s'))
+    result.index.name = 'window_end'
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sliding-window network metrics over the transfer stream.")
+    parser.add_argument('--window', default='24h', help="Window length as a pandas timedelta, e.g. '1h', '6h', '24h'.")
+    parser.add_argument('--stride', default='1h', help="Step between windows, e.g. '15min' or '1h'.")
+    parser.add_argument('--start', default=None, help="First date (inclusive).")
+    parser.add_argument('--end', default=None, help="Last date (inclusive).")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    window = int(pd.Timedelta(args.window).total_seconds())
+    stride = int(pd.Timedelta(args.stride).total_seconds())
+    chunks = tqdm(transfer_chunks(args.start, args.end), desc="Streaming days")
+    metrics_df = sliding_window_metrics(chunks, window, stride)
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    output_path = os.path.join(OUTPUT_DIR, f"window_metrics_{args.window}_{args.stride}.csv")
+    metrics_df.to_csv(output_path)
+    print(f"Saved {len(metrics_df)} windows to {output_path} ({time.time() - start_time:.2f} seconds)")
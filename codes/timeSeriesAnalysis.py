@@ -1,52 +1,18 @@
 import pandas as pd
-import networkx as nx
 import os
-import glob
-from tqdm import tqdm
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import time
+import argparse
+
+from dailyMetrics import DAILY_METRICS_CSV
+from profiling import add_profile_argument, enable_run_log, stage
 
-GRAPH_DIR = os.path.join('data', 'processed', 'daily_graphs')
 OUTPUT_DIR = 'report'
 FIGURES_DIR = os.path.join(OUTPUT_DIR, 'figures', 'timeseries')
+METRICS_CSV = DAILY_METRICS_CSV  # The unified daily metrics table, written by dailyMetrics.py.
 
 
-def analyze_graph(graph):
-    """Calculates a dictionary of metrics for a single graph."""
-    metrics = {
-        'nodes': graph.number_of_nodes(),
-        'edges': graph.number_of_edges(),
-        'avg_clustering': 0, 
-        'volume_wluna': 0,
-        'volume_ustc': 0,
-        'volume_usdc': 0,
-        'volume_usdt': 0,
-        'volume_total': 0
-    }
-
-    if metrics['nodes'] == 0:
-        return metrics
-
-    try:
-        metrics['avg_clustering'] = nx.average_clustering(graph)
-    except Exception:
-        pass
-
-    for _, _, data in graph.edges(data=True):
-        wluna_val = data.get('WLUNA', 0)
-        ustc_val = data.get('USTC', 0)
-        usdc_val = data.get('USDC', 0)
-        usdt_val = data.get('USDT', 0)
-        
-        metrics['volume_wluna'] += wluna_val
-        metrics['volume_ustc'] += ustc_val
-        metrics['volume_usdc'] += usdc_val
-        metrics['volume_usdt'] += usdt_val
-        metrics['volume_total'] += wluna_val + ustc_val + usdc_val + usdt_val
-        
-    return metrics
-
 def plot_time_series(df, columns, title, ylabel, filename):
     """Generic function to plot time series data."""
     plt.style.use('seaborn-v0_8-whitegrid')
@@ -68,7 +34,8 @@ def plot_time_series(df, columns, title, ylabel, filename):
     ax.legend()
     fig.autofmt_xdate()
     
-    plt.savefig(filename, dpi=300, bbox_inches='tight')
+    with stage('save_plot', figure=os.path.basename(filename)):
+        plt.savefig(filename, dpi=300, bbox_inches='tight')
     plt.close(fig)
     print(f"Saved plot: {filename}")
 
@@ -76,34 +43,12 @@ def plot_time_series(df, columns, title, ylabel, filename):
 def main():
     start_time = time.time()
     print("===== Phase 3: Time-Series Metric Analysis =====")
-    
-    os.makedirs(FIGURES_DIR, exist_ok=True)
-    
-    graph_files = sorted(glob.glob(os.path.join(GRAPH_DIR, 'graph_*.gexf')))
-    
-    if not graph_files:
-        print(f"Error: No graph files found in {GRAPH_DIR}")
-        return
-
-    daily_metrics = []
-    dates = []
-
-    for g_file in tqdm(graph_files, desc="Analyzing daily graphs"):
-        date_str = os.path.basename(g_file).replace('graph_', '').replace('.gexf', '')
-        dates.append(pd.to_datetime(date_str))
-        
-        G = nx.read_gexf(g_file)
-        
-        metrics = analyze_graph(G)
-        daily_metrics.append(metrics)
 
-    metrics_df = pd.DataFrame(daily_metrics, index=dates)
-    
-    metrics_df['volume_safe_stables'] = metrics_df['volume_usdc'] + metrics_df['volume_usdt']
-    
-    output_csv_path = os.path.join(OUTPUT_DIR, 'daily_network_metrics.csv')
-    metrics_df.to_csv(output_csv_path)
-    print(f"\nDaily metrics saved to {output_csv_path}")
+    if not os.path.exists(METRICS_CSV):
+        print(f"Error: {METRICS_CSV} not found. Please run 'codes/dailyMetrics.py' first.")
+        return
+    metrics_df = pd.read_csv(METRICS_CSV, index_col=0, parse_dates=True)
+    os.makedirs(FIGURES_DIR, exist_ok=True)
 
     print("\nGenerating time-series plots...")
     
@@ -112,24 +57,30 @@ def main():
                      'Daily Network Activity', 'Count',
                      os.path.join(FIGURES_DIR, 'daily_activity.png'))
 
-    # Plot 2: LUNA/USTC Transaction Volume
-    plot_time_series(metrics_df, ['volume_wluna', 'volume_ustc'], 
-                     'Daily Transaction Volume of Terra Ecosystem Tokens', 'Volume (in USD)',
+    # Plot 2: LUNA/USTC Transaction Volume (raw amounts; the USD series are in timeSeriesAnalysis2.py)
+    plot_time_series(metrics_df, ['raw_volume_wluna', 'raw_volume_ustc'], 
+                     'Daily Transaction Volume of Terra Ecosystem Tokens', 'Volume (token units)',
                      os.path.join(FIGURES_DIR, 'daily_volume_terra.png'))
 
     # Plot 3: "Flight to Safety" Volume
-    plot_time_series(metrics_df, ['volume_safe_stables'], 
-                     'Daily Transaction Volume of "Safe" Stablecoins (USDC+USDT)', 'Volume (in USD)',
+    metrics_df['raw_volume_safe_stables'] = metrics_df['raw_volume_usdc'] + metrics_df['raw_volume_usdt']
+    plot_time_series(metrics_df, ['raw_volume_safe_stables'], 
+                     'Daily Transaction Volume of "Safe" Stablecoins (USDC+USDT)', 'Volume (token units)',
                      os.path.join(FIGURES_DIR, 'daily_volume_safe_stables.png'))
                      
     # Plot 4: Average Clustering Coefficient
-    plot_time_series(metrics_df, ['avg_clustering'], 
-                     'Daily Average Clustering Coefficient', 'Clustering Coefficient',
-                     os.path.join(FIGURES_DIR, 'daily_avg_clustering.png'))
+    if 'avg_clustering' in metrics_df:
+        plot_time_series(metrics_df, ['avg_clustering'], 
+                         'Daily Average Clustering Coefficient', 'Clustering Coefficient',
+                         os.path.join(FIGURES_DIR, 'daily_avg_clustering.png'))
 
-    end_time = time.time()
     print("\n===== Time-Series Analysis Complete! =====")
     print(f"Total execution time: {time.time() - start_time:.2f} seconds.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Plot the daily network metrics computed by dailyMetrics.py.")
+    add_profile_argument(parser)
+    if parser.parse_args().profile:
+        enable_run_log()
+    with stage('time_series_analysis'):
+        main()
@@ -1,10 +1,23 @@
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc as ipc
 import os
 import glob
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from dataset import map_tokens
 
 DATA_DIR = 'data'
+REPORT_DIR = 'report'
 
 TRANSACTION_FILES = sorted(glob.glob(os.path.join(DATA_DIR, 'token_transfers*.csv')))
+SCAN_CACHE_PATH = os.path.join(DATA_DIR, 'processed', 'validation_cache.json')
+PARSED_DIR = os.path.join(DATA_DIR, 'processed', 'raw_parsed')
+SCAN_ROWS = 1_000_000  # Rows per chunk of the streaming scan; bounds each worker's memory.
 
 TOKEN_MAP = {
     '0xdac17f958d2ee523a2206206994597c13d831ec7': 'USDT',
@@ -15,55 +28,256 @@ TOKEN_MAP = {
     '0xd2877702675e6ceb975b4a1dff9fb7baf4c91ea9': 'WLUNA'
 }
 
+REQUIRED_COLUMNS = ['block_number', 'transaction_index', 'from_address', 'to_address',
+                    'time_stamp', 'contract_address', 'value']
+NUMERIC_COLUMNS = ['block_number', 'transaction_index', 'value']
+ADDRESS_COLUMNS = ['from_address', 'to_address', 'contract_address']
+ADDRESS_PATTERN = r'^0x[0-9a-fA-F]{40}$'
+
+
+def empty_stats(file_path):
+    """Statistics of a file before its first chunk, keyed by its size and mtime."""
+    stat = os.stat(file_path)
+    return {'file': os.path.basename(file_path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+            'rows': 0, 'token_counts': {}, 'min_block': None, 'max_block': None,
+            'min_time': None, 'max_time': None, 'nulls': {}, 'malformed': {},
+            'parsed': None, 'error': None, 'scan_seconds': 0.0}
+
+def add_counts(counts, new):
+    """Adds {key: count} (or a Series) into a running count dict."""
+    for key, n in new.items():
+        counts[key] = counts.get(key, 0) + int(n)
+
+def scan_chunk(stats, chunk, token_map):
+    """Adds one chunk of a raw CSV to the file's statistics."""
+    stats['rows'] += len(chunk)
+    add_counts(stats['nulls'], chunk[REQUIRED_COLUMNS].isna().sum())
+
+    malformed = {}
+    for column in NUMERIC_COLUMNS:
+        parsed = pd.to_numeric(chunk[column], errors='coerce')
+        malformed[column] = parsed.isna().sum() - chunk[column].isna().sum()
+    for column in ADDRESS_COLUMNS:
+        values = pa.array(chunk[column].dropna().astype(str), type=pa.string())
+        malformed[column] = len(values) - pc.sum(pc.match_substring_regex(values, ADDRESS_PATTERN)).as_py() if len(values) else 0
+    # Epoch seconds, or date strings; a column with one bad value is read as strings.
+    epoch = pd.to_numeric(chunk['time_stamp'], errors='coerce')
+    time_stamps = pd.to_datetime(epoch, unit='s', errors='coerce')
+    text = epoch.isna() & chunk['time_stamp'].notna()
+    if text.any():
+        time_stamps[text] = pd.to_datetime(chunk.loc[text, 'time_stamp'], errors='coerce')
+    malformed['time_stamp'] = time_stamps.isna().sum() - chunk['time_stamp'].isna().sum()
+    add_counts(stats['malformed'], malformed)
+
+    tokens = map_tokens(chunk['contract_address'], token_map).fillna('unmapped')
+    add_counts(stats['token_counts'], tokens.value_counts())
+
+    blocks = pd.to_numeric(chunk['block_number'], errors='coerce').dropna()
+    if len(blocks):
+        stats['min_block'] = int(blocks.min()) if stats['min_block'] is None else min(stats['min_block'], int(blocks.min()))
+        stats['max_block'] = int(blocks.max()) if stats['max_block'] is None else max(stats['max_block'], int(blocks.max()))
+    time_stamps = time_stamps.dropna()
+    if len(time_stamps):
+        low, high = time_stamps.min().isoformat(), time_stamps.max().isoformat()
+        stats['min_time'] = low if stats['min_time'] is None else min(stats['min_time'], low)
+        stats['max_time'] = high if stats['max_time'] is None else max(stats['max_time'], high)
+
+def scan_file(file_path, token_map=TOKEN_MAP, chunk_rows=SCAN_ROWS, parsed_dir=None):
+    """
+    Validates one raw CSV in a single streaming pass (worker task). With a
+    parsed_dir, the parsed chunks are also kept as an Arrow IPC file that
+    ingest can read instead of parsing the CSV again; the copy is dropped
+    if the chunks do not share one schema. Returns the file's statistics.
+    """
+    start_time = time.time()
+    stats = empty_stats(file_path)
+    parsed_path = os.path.join(parsed_dir, os.path.basename(file_path) + '.arrow') if parsed_dir else None
+    writer, schema = None, None
+    try:
+        for chunk in pd.read_csv(file_path, chunksize=chunk_rows):
+            missing = [c for c in REQUIRED_COLUMNS if c not in chunk.columns]
+            if missing:
+                raise ValueError(f"missing columns {missing}")
+            scan_chunk(stats, chunk, token_map)
+            if parsed_path is None:
+                continue
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                os.makedirs(parsed_dir, exist_ok=True)
+                writer, schema = ipc.new_file(parsed_path + '.tmp', table.schema), table.schema
+            if table.schema.equals(schema):
+                writer.write_table(table)
+            else:  # e.g. a column read as float in one chunk because of nulls
+                writer.close()
+                os.remove(parsed_path + '.tmp')
+                writer, parsed_path = None, None
+        if writer is not None:
+            writer.close()
+            os.replace(parsed_path + '.tmp', parsed_path)
+            stats['parsed'] = parsed_path
+    except Exception as e:
+        stats['error'] = str(e)
+        if writer is not None:
+            writer.close()
+            os.remove(parsed_path + '.tmp')
+    stats['scan_seconds'] = time.time() - start_time
+    return stats
+
+def load_scan_cache(cache_path=SCAN_CACHE_PATH):
+    """{file name: statistics} of the files scanned so far."""
+    if not os.path.exists(cache_path):
+        return {}
+    with open(cache_path) as f:
+        return json.load(f)
+
+def save_scan_cache(cache, cache_path=SCAN_CACHE_PATH):
+    """Atomically writes the scan cache."""
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    with open(cache_path + '.tmp', 'w') as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+    os.replace(cache_path + '.tmp', cache_path)
+
+def cached_stats(file_path, cache=None, cache_path=SCAN_CACHE_PATH):
+    """The cached statistics of a file if it is unchanged (same size and mtime) since its scan, else None."""
+    cache = load_scan_cache(cache_path) if cache is None else cache
+    stats = cache.get(os.path.basename(file_path))
+    stat = os.stat(file_path)
+    if stats is None or stats['size'] != stat.st_size or stats['mtime_ns'] != stat.st_mtime_ns:
+        return None
+    return stats
+
+def parsed_batches(stats, batch_size=SCAN_ROWS):
+    """
+    Yields a scanned file's rows from its parsed copy as DataFrames of
+    batch_size rows, with the dtypes pd.read_csv gives the CSV chunks.
+    """
+    table = ipc.open_file(pa.memory_map(stats['parsed'], 'r')).read_all()
+    for start in range(0, table.num_rows, batch_size):
+        yield table.slice(start, batch_size).to_pandas()
+
+def run_scans(args_list, workers):
+    """Runs the file scans on a process pool (or inline with one worker) and yields the results in order."""
+    if workers <= 1:
+        for args in args_list:
+            yield scan_file(*args)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(scan_file, *zip(*args_list), chunksize=1)
+
+def scan_files(file_list, token_map=TOKEN_MAP, workers=None, keep_parsed=False, force=False,
+               cache_path=SCAN_CACHE_PATH, parsed_dir=PARSED_DIR):
+    """
+    Returns the statistics of every file, scanning the new or changed ones
+    on a pool of worker processes (one file per task) and reusing the cache
+    for the rest. With keep_parsed, files are rescanned until they have a
+    parsed copy for ingest.
+    """
+    cache = load_scan_cache(cache_path)
+    todo = []
+    for f in file_list:
+        stats = None if force else cached_stats(f, cache)
+        if stats is None or stats['error'] or (keep_parsed and not (stats['parsed'] and os.path.exists(stats['parsed']))):
+            todo.append(f)
+        else:
+            print(f"-> {os.path.basename(f)}: unchanged since its last scan")
+
+    args = [(f, token_map, SCAN_ROWS, parsed_dir if keep_parsed else None) for f in todo]
+    for stats in run_scans(args, min(workers or os.cpu_count(), len(todo))):
+        print(f"-> Scanned {stats['file']}: {stats['rows']:,} rows in {stats['scan_seconds']:.1f} s"
+              + (f" (error: {stats['error']})" if stats['error'] else ""))
+        previous = cache.get(stats['file'], {}).get('parsed')
+        if previous and previous != stats['parsed'] and os.path.exists(previous):
+            os.remove(previous)  # A parsed copy of the file's old contents.
+        cache[stats['file']] = stats
+        save_scan_cache(cache, cache_path)
+    return [cache[os.path.basename(f)] for f in file_list]
+
+def block_coverage(all_stats):
+    """
+    Gaps and overlaps between the block ranges of the files, taken in order
+    of their first block: an overlap is a range covered by two files (rows
+    that may be exported twice), a gap a range covered by none.
+    """
+    ranges = sorted((s['min_block'], s['max_block'], s['file']) for s in all_stats if s['min_block'] is not None)
+    rows = []
+    for (lo_a, hi_a, file_a), (lo_b, hi_b, file_b) in zip(ranges, ranges[1:]):
+        if lo_b <= hi_a:
+            rows.append({'kind': 'overlap', 'first_file': file_a, 'second_file': file_b,
+                         'from_block': lo_b, 'to_block': min(hi_a, hi_b), 'blocks': min(hi_a, hi_b) - lo_b + 1})
+        elif lo_b > hi_a + 1:
+            rows.append({'kind': 'gap', 'first_file': file_a, 'second_file': file_b,
+                         'from_block': hi_a + 1, 'to_block': lo_b - 1, 'blocks': lo_b - hi_a - 1})
+    return pd.DataFrame(rows, columns=['kind', 'first_file', 'second_file', 'from_block', 'to_block', 'blocks'])
+
+def stats_table(all_stats, token_map=TOKEN_MAP):
+    """One row per file: rows, per-token counts, block and time ranges, null and malformed counts."""
+    rows = []
+    for s in all_stats:
+        row = {'file': s['file'], 'rows': s['rows'], 'error': s['error'],
+               'min_block': s['min_block'], 'max_block': s['max_block'],
+               'min_time': s['min_time'], 'max_time': s['max_time']}
+        row.update({name: s['token_counts'].get(name, 0) for name in list(token_map.values()) + ['unmapped']})
+        row['nulls'] = sum(s['nulls'].values())
+        row['malformed'] = sum(s['malformed'].values())
+        row.update({f'malformed_{column}': s['malformed'].get(column, 0) for column in REQUIRED_COLUMNS})
+        rows.append(row)
+    table = pd.DataFrame(rows).set_index('file')
+    table[['min_block', 'max_block']] = table[['min_block', 'max_block']].astype('Int64')
+    return table.loc[:, (table != 0).any() | ~table.columns.str.startswith('malformed_')]
+
+def presence_table(all_stats, token_map=TOKEN_MAP):
+    """Whether each token occurs in each file ('Error' for files that could not be read)."""
+    token_names = list(token_map.values())
+    summary_df = pd.DataFrame({s['file']: {name: 'Error' if s['error'] else s['token_counts'].get(name, 0) > 0
+                                           for name in token_names} for s in all_stats}).T
+    return summary_df[token_names]
 
-def analyze_file_contents(file_list, token_map):
+def analyze_file_contents(file_list, token_map, workers=None):
     """
     Checks each CSV file for the presence of specific tokens and returns a summary DataFrame.
     """
     print("Analyzing token presence in each raw data file...")
-    
-    token_addresses = list(token_map.keys())
-    token_names = list(token_map.values())
-    
-    results = {}
-
-    for file_path in file_list:
-        filename = os.path.basename(file_path)
-        print(f"-> Processing {filename}...")
-        
-        try:
-            df = pd.read_csv(file_path, usecols=['contract_address'])
-            present_addresses = set(df['contract_address'].unique())
-            
-            token_presence = {}
-            for addr, name in token_map.items():
-                token_presence[name] = addr in present_addresses
-            
-            results[filename] = token_presence
-            
-        except Exception as e:
-            print(f"   Could not process {filename}: {e}")
-            results[filename] = {name: 'Error' for name in token_names}
-
-    summary_df = pd.DataFrame(results).T 
-    summary_df = summary_df[token_names] 
-    
-    return summary_df
-
-def main():
+    return presence_table(scan_files(file_list, token_map, workers), token_map)
+
+def main(workers=None, keep_parsed=False, force=False):
     """Main execution function."""
-    summary_table = analyze_file_contents(TRANSACTION_FILES, TOKEN_MAP)
-    
+    start_time = time.time()
+    print(f"Scanning {len(TRANSACTION_FILES)} raw data files...")
+    all_stats = scan_files(TRANSACTION_FILES, TOKEN_MAP, workers, keep_parsed, force)
+    summary_table = presence_table(all_stats)
+    details = stats_table(all_stats)
+    coverage = block_coverage(all_stats)
+
     print("\n" + "="*50)
     print("      Summary of Token Presence in Raw CSV Files")
     print("="*50)
     print(summary_table)
     print("="*50)
-    print("\nTo briefly check if all the data are not damaged: All ture -> Go ahead!")
-    
-    summary_table.to_csv('report/data_validation_summary.csv')
+    print("\nPer-file statistics:")
+    print(details.T.to_string())
+    if len(coverage):
+        print("\nBlock-range gaps and overlaps between files:")
+        print(coverage.to_string(index=False))
+    else:
+        print("\nThe files cover one contiguous block range without overlaps.")
+    problems = details['error'].notna().sum() + (details[['nulls', 'malformed']].sum(axis=1) > 0).sum()
+    print("\nTo briefly check if all the data are not damaged: All ture -> Go ahead!"
+          if not problems else f"\nWarning: {problems} file(s) have errors, null or malformed values; see above.")
+
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    summary_table.to_csv(os.path.join(REPORT_DIR, 'data_validation_summary.csv'))
+    details.to_csv(os.path.join(REPORT_DIR, 'data_validation_stats.csv'))
+    coverage.to_csv(os.path.join(REPORT_DIR, 'data_validation_blocks.csv'), index=False)
     print("\nSummary table saved to 'report/data_validation_summary.csv'")
+    print("Per-file statistics saved to 'report/data_validation_stats.csv' and 'report/data_validation_blocks.csv'")
+    print(f"Total execution time: {time.time() - start_time:.2f} seconds.")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Validate the raw token transfer CSVs in one parallel pass.")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: all cores).")
+    parser.add_argument('--keep-parsed', action='store_true',
+                        help="Keep a parsed Arrow copy of each file for 'codes/load.py --stream' to reuse.")
+    parser.add_argument('--force', action='store_true', help="Rescan files even if they are unchanged.")
+    args = parser.parse_args()
+    main(workers=args.workers, keep_parsed=args.keep_parsed, force=args.force)
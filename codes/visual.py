@@ -1,49 +1,141 @@
 import networkx as nx
+import numpy as np
 import pandas as pd
 import os
+import time
+import argparse
 
-GRAPH_DIR = os.path.join('data', 'processed', 'daily_graphs')
+from dataset import load_address_table
+from graphStore import STORE_DIR, list_store_dates, load_manifest, load_edges
+from construct import run_tasks
+from prices import PRICE_FILES, load_candles, price_table, price_at
+from profiling import add_profile_argument, enable_run_log, stage
+
+GRAPH_DIR = STORE_DIR
 GEPHI_DIR = os.path.join('report', 'gephi_files')
-os.makedirs(GEPHI_DIR, exist_ok=True)
 
 DATES = ['2022-05-04', '2022-05-09']
-TOP_N_EDGES = 2000 
+TOP_N_EDGES = 2000
+RANK_BY = 'raw'  # 'raw' (summed token amounts), 'usd', or a token name such as 'WLUNA'
+
+_address_table = None
+
+
+def worker_address_table():
+    """The address dictionary, loaded once per process."""
+    global _address_table
+    if _address_table is None:
+        _address_table = load_address_table()
+    return _address_table
+
+def pair_weights(edges, token_names, rank_by=RANK_BY, token_prices=None):
+    """
+    Collapses a day's (src, dst, token) edge rows into one weight per (src, dst)
+    pair: the raw amounts summed over tokens, their USD value, or the amount
+    of a single token. Returns (src, dst, weight) arrays.
+    """
+    values = edges['value']
+    if rank_by == 'usd':
+        prices = np.array([token_prices.get(token, 1.0) for token in token_names])
+        values = values * prices[edges['token']]
+    elif rank_by != 'raw':
+        code = token_names.index(rank_by) if rank_by in token_names else -1
+        values = np.where(edges['token'] == code, values, 0.0)
+
+    # Edge rows are sorted by (src, dst, token), so each pair is a contiguous run.
+    src, dst = edges['src'], edges['dst']
+    if len(src) == 0:
+        return src, dst, values
+    starts = np.flatnonzero(np.r_[True, (src[1:] != src[:-1]) | (dst[1:] != dst[:-1])])
+    return src[starts], dst[starts], np.add.reduceat(values, starts)
+
+def top_n_edges(weights, n):
+    """
+    Positions of the n heaviest positive edges, heaviest first. A partial
+    selection (argpartition) keeps this linear in the number of edges; only
+    the n selected weights are sorted.
+    """
+    candidates = np.flatnonzero(weights > 0)
+    n = min(n, len(candidates))
+    if n == 0:
+        return candidates[:0]
+    if n < len(candidates):
+        candidates = candidates[np.argpartition(-weights[candidates], n - 1)[:n]]
+    return candidates[np.lexsort((candidates, -weights[candidates]))]
 
-def create_top_n_edge_graph(g_rich, n):
+def create_top_n_edge_graph(src, dst, weights, n, address_table=None):
     """
-    Creates a new graph containing only the top N edges by weight.
+    Creates a graph containing only the top N edges by weight, with hex
+    address node ids when address_table is given.
     """
-    if g_rich.number_of_edges() == 0:
-        return nx.DiGraph()
-
-    edge_weights = []
-    for u, v, data in g_rich.edges(data=True):
-        total_weight = sum(w for w in data.values() if isinstance(w, (int, float)))
-        if total_weight > 0:
-            edge_weights.append((u, v, total_weight))
-            
-    n = min(n, len(edge_weights))
-
-    top_edges = sorted(edge_weights, key=lambda x: x[2], reverse=True)[:n]
-    
+    top = top_n_edges(weights, n)
+    u, v = src[top], dst[top]
+    if address_table is not None:
+        u, v = address_table[u], address_table[v]
+
     g_top = nx.DiGraph()
-    for u, v, weight in top_edges:
-        g_top.add_edge(u, v, weight=weight)
-        
+    g_top.add_weighted_edges_from(zip(u.tolist(), v.tolist(), weights[top].tolist()))
     return g_top
 
-for date_str in DATES:
-    print(f"--- Processing graph for {date_str} ---")
-    
-    g_rich_path = os.path.join(GRAPH_DIR, f"graph_{date_str}.gexf")
-    g_rich = nx.read_gexf(g_rich_path)
-    
-    g_filtered = create_top_n_edge_graph(g_rich, TOP_N_EDGES)
-    
-    print(f"  -> Created filtered graph with {g_filtered.number_of_nodes()} nodes and {g_filtered.number_of_edges()} edges.")
-    
-    output_path = os.path.join(GEPHI_DIR, f"gephi_top_{TOP_N_EDGES}_edges_{date_str}.gexf")
-    nx.write_gexf(g_filtered, output_path)
-    print(f"  -> Saved to {output_path}")
-
-print("\nGephi preparation complete.")
\ No newline at end of file
+def export_path(date_str, n, rank_by, output_dir=GEPHI_DIR):
+    """File name of one day's Gephi export; the default raw ranking keeps the historical name."""
+    suffix = '' if rank_by == 'raw' else f"_{rank_by}"
+    return os.path.join(output_dir, f"gephi_top_{n}_edges_{date_str}{suffix}.gexf")
+
+def export_day(date_str, n, rank_by, token_names, token_prices, output_dir=GEPHI_DIR, store_dir=GRAPH_DIR):
+    """Worker task: writes the top-N edge GEXF of one stored day. Returns (date, nodes, edges, path)."""
+    edges = load_edges(date_str, store_dir=store_dir)
+    src, dst, weights = pair_weights(edges, token_names, rank_by, token_prices)
+    g_filtered = create_top_n_edge_graph(src, dst, weights, n, worker_address_table())
+    output_path = export_path(date_str, n, rank_by, output_dir)
+    with stage('write_gexf', rows_in=g_filtered.number_of_edges(), date=date_str):
+        nx.write_gexf(g_filtered, output_path)
+    return date_str, g_filtered.number_of_nodes(), g_filtered.number_of_edges(), output_path
+
+def select_dates(dates=None, start_date=None, end_date=None, store_dir=GRAPH_DIR):
+    """Stored dates matching an explicit list and/or an inclusive date range."""
+    available = list_store_dates(store_dir)
+    selected = [d for d in available if (not dates or d in dates)
+                and (start_date is None or d >= pd.Timestamp(start_date).strftime('%Y-%m-%d'))
+                and (end_date is None or d <= pd.Timestamp(end_date).strftime('%Y-%m-%d'))]
+    missing = sorted(set(dates or []) - set(available))
+    if missing:
+        print(f"Warning: no stored graph for {', '.join(missing)}. Skipping.")
+    return selected
+
+def main(dates=None, start_date=None, end_date=None, n=TOP_N_EDGES, rank_by=RANK_BY,
+         workers=None, output_dir=GEPHI_DIR):
+    start_time = time.time()
+    if not dates and start_date is None and end_date is None:
+        dates = DATES
+    dates = select_dates(dates, start_date, end_date)
+    os.makedirs(output_dir, exist_ok=True)
+
+    token_names = load_manifest(GRAPH_DIR)['tokens']
+    prices = price_table(load_candles(PRICE_FILES), 'D') if rank_by == 'usd' else None
+    tasks = [(date_str, n, rank_by, token_names,
+              {t: price_at(prices, date_str, t) for t in token_names} if prices is not None else {},
+              output_dir) for date_str in dates]
+
+    print(f"Exporting the top {n} edges (ranked by {rank_by}) of {len(tasks)} days...")
+    for date_str, nodes, edges, output_path in run_tasks(export_day, tasks, workers or os.cpu_count()):
+        print(f"--- {date_str}: {nodes} nodes and {edges} edges saved to {output_path}")
+
+    print(f"\nGephi preparation complete ({time.time() - start_time:.2f} seconds).")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the top-N edges of daily graphs to GEXF for Gephi.")
+    parser.add_argument('dates', nargs='*', help=f"Dates (YYYY-MM-DD) to export (default: {' '.join(DATES)}).")
+    parser.add_argument('--start', default=None, help="First date of a range to export (inclusive).")
+    parser.add_argument('--end', default=None, help="Last date of a range to export (inclusive).")
+    parser.add_argument('--top-n', type=int, default=TOP_N_EDGES)
+    parser.add_argument('--rank-by', default=RANK_BY,
+                        help="Edge ranking: 'raw' summed amounts, 'usd' value, or a single token name.")
+    parser.add_argument('--workers', type=int, default=None, help="Parallel exports (default: all cores).")
+    parser.add_argument('--output-dir', default=GEPHI_DIR)
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    if args.profile:
+        enable_run_log()
+    main(args.dates, args.start, args.end, args.top_n, args.rank_by, args.workers, args.output_dir)